@@ -0,0 +1,286 @@
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import hashlib
+import platform
+import argparse
+import tempfile
+import subprocess
+import contextlib
+import statistics
+import numpy
+import pandas
+import fastparquet
+
+# run from a source checkout without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import deltaflow
+import deltaflow.fs as fs
+from deltaflow.tree import Tree
+from deltaflow.node import make_node
+
+# Synthetic benchmarks of field operations. Each benchmark generates its own
+# field in a temporary directory and records timings of repeated runs as
+# JSON, so results of different commits can be compared:
+#
+#   python benchmarks/run.py --output results.json [--quick] [--only commit]
+
+SIZES = {
+    'full': {
+        'ingest_rows': (10**4, 10**5, 10**6),
+        'ingest_cols': (4, 16),
+        'commit_rows': 10**6,
+        'commit_changes': (1, 100, 10**4, 10**5),
+        'depths': (10, 100, 1000),
+        'depth_rows': 10**4,
+        'block_rows': 10**5,
+        'node_counts': (100, 1000, 10000),
+        'repeat': 5
+    },
+    'quick': {
+        'ingest_rows': (10**4, 10**5),
+        'ingest_cols': (4,),
+        'commit_rows': 10**5,
+        'commit_changes': (1, 100, 10**4),
+        'depths': (10, 100),
+        'depth_rows': 10**3,
+        'block_rows': 10**4,
+        'node_counts': (100, 1000),
+        'repeat': 3
+    }
+}
+
+# DataFrame of float columns 'c0', 'c1', ...
+def make_frame(rows: int, cols: int, seed: int = 0) -> pandas.DataFrame:
+    state = numpy.random.RandomState(seed)
+    data = {'c{0}'.format(j): state.rand(rows) for j in range(cols)}
+    return pandas.DataFrame(data)
+
+# new field in a fresh directory under root
+def make_field(root: str, name: str) -> deltaflow.Field:
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    deltaflow.touch(path)
+    return deltaflow.Field(path)
+
+# Return durations of repeated calls of func in seconds. setup (if given)
+# is called before each run and its result passed to func.
+def measure(func, repeat: int, setup=None) -> list:
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+
+    return times
+
+def result(name: str, params: dict, times: list, **extra) -> dict:
+    obj = {
+        'benchmark': name,
+        'params': params,
+        'repeat': len(times),
+        'min': min(times),
+        'median': statistics.median(times),
+        'times': times
+    }
+    obj.update(extra)
+    return obj
+
+# add_origin throughput by rows and columns
+def bench_ingest(root: str, sizes: dict) -> list:
+    results = []
+    for rows in sizes['ingest_rows']:
+        for cols in sizes['ingest_cols']:
+            data = make_frame(rows, cols)
+            field = make_field(root, 'ingest-{0}-{1}'.format(rows, cols))
+            names = iter(range(sizes['repeat']))
+            # (data differs by one cell per run so origins are distinct)
+            def setup():
+                k = next(names)
+                data.iat[0, 0] = k
+                return k
+            times = measure(lambda k: field.add_origin(data, 'o{0}'.format(k)),
+                sizes['repeat'], setup)
+            median = statistics.median(times)
+            results.append(result('ingest', {'rows': rows, 'cols': cols}, times,
+                rows_per_second=rows / median))
+
+    return results
+
+# commit latency by number of changed cells
+def bench_commit(root: str, sizes: dict) -> list:
+    results = []
+    rows = sizes['commit_rows']
+    field = make_field(root, 'commit')
+    field.add_origin(make_frame(rows, 8), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    counter = iter(range(10**9))
+    for changes in sizes['commit_changes']:
+        def setup():
+            k = next(counter)
+            data = arrow.proxy()
+            data.iloc[:changes, k % 8] = -k - 1.0
+            arrow.put(data)
+        times = measure(lambda _: arrow.commit(), sizes['repeat'], setup)
+        results.append(result('commit', {'rows': rows, 'changed_cells': changes}, times))
+
+    return results
+
+# Arrow open time (cache cleared) by lineage depth
+def bench_open(root: str, sizes: dict) -> list:
+    results = []
+    rows = sizes['depth_rows']
+    for depth in sizes['depths']:
+        field = make_field(root, 'open-{0}'.format(depth))
+        field.add_origin(make_frame(rows, 8), 'o')
+        field.add_arrow(field.tree.origins['o'], 'w')
+        arrow = field.arrow('w')
+        for k in range(depth):
+            data = arrow.proxy()
+            data.iat[k % rows, k % 8] = -k - 1.0
+            arrow.put(data)
+            arrow.commit()
+
+        times = measure(lambda _: field.arrow('w'), sizes['repeat'],
+            lambda: field.cache.clear())
+        results.append(result('open', {'rows': rows, 'depth': depth}, times))
+
+    return results
+
+# DeltaFile.read_block decode time by block type
+def bench_read_block(root: str, sizes: dict) -> list:
+    rows = sizes['block_rows']
+    field = make_field(root, 'blocks')
+    field.add_origin(make_frame(rows, 8), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+
+    # dense region of changed cells (put)
+    data = arrow.proxy()
+    data.iloc[:rows // 2, :4] = -1.0
+    arrow.put(data)
+    arrow.commit()
+    # one changed cell per row (sparse)
+    data = arrow.proxy()
+    for j in range(8):
+        data.iloc[j::8, j] = -2.0
+    arrow.put(data)
+    arrow.commit()
+    # dropped rows (axis)
+    data = arrow.proxy()
+    arrow.drop(data.iloc[::2])
+    arrow.commit()
+    # extended columns (extend)
+    data = arrow.proxy()
+    arrow.extend(make_frame(data.shape[0], 4, seed=1).set_axis(data.index, axis=0)
+        .rename(columns=lambda col: 'x' + col), axis=1)
+    arrow.commit()
+
+    results = []
+    lineage = [arrow.head.id] + arrow.head.lineage
+    for node_id in reversed(lineage[:-1]):
+        delta_file = fs.DeltaFile(field.tree.path, node_id)
+        size = os.path.getsize(delta_file.path)
+        for i, key in enumerate(delta_file.meta):
+            kind = delta_file.meta[key]['class']
+            times = measure(lambda _: delta_file.read_block(i), sizes['repeat'] * 4)
+            results.append(result('read_block', {'block': kind, 'rows': rows}, times,
+                delta_bytes=size))
+
+    return results
+
+# Tree construction time by node count, with (warm) and without (cold) a
+# node index file
+def bench_tree(root: str, sizes: dict) -> list:
+    results = []
+    for count in sizes['node_counts']:
+        field = make_field(root, 'tree-{0}'.format(count))
+        field.add_origin(make_frame(10, 2), 'o')
+        origin_id = field.tree.origins['o']
+        origin_hash = field.tree.nodes[origin_id]['origin']
+        nodes_dir = os.path.join(field.tree.path, 'nodes')
+        for k in range(count):
+            node_str = make_node(origin_hash, [origin_id], 2)
+            node_id = hashlib.sha1('{0}{1}'.format(node_str, k).encode('utf-8')).hexdigest()
+            with open(os.path.join(nodes_dir, node_id), 'w') as f:
+                f.write(node_str)
+
+        index_path = os.path.join(field.tree.path, 'index')
+        def cold():
+            if os.path.isfile(index_path):
+                os.remove(index_path)
+        times = measure(lambda _: Tree(field.path), sizes['repeat'], cold)
+        results.append(result('tree', {'nodes': count, 'index': 'cold'}, times))
+        times = measure(lambda _: Tree(field.path), sizes['repeat'])
+        results.append(result('tree', {'nodes': count, 'index': 'warm'}, times))
+
+    return results
+
+BENCHMARKS = {
+    'ingest': bench_ingest,
+    'commit': bench_commit,
+    'open': bench_open,
+    'read_block': bench_read_block,
+    'tree': bench_tree
+}
+
+# git revision of checkout (None outside of a git repository)
+def revision() -> str:
+    try:
+        out = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return out.decode('utf-8').strip()
+
+def main(argv: list = None) -> dict:
+    parser = argparse.ArgumentParser(description='Run deltaflow benchmarks')
+    parser.add_argument('--output', help='JSON results path (default: stdout)')
+    parser.add_argument('--quick', action='store_true', help='smaller sizes')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+        help='benchmarks to run (default: all)')
+    args = parser.parse_args(argv)
+
+    sizes = SIZES['quick' if args.quick else 'full']
+    names = args.only if args.only else list(BENCHMARKS)
+    report = {
+        'revision': revision(),
+        'timestamp': time.time(),
+        'sizes': 'quick' if args.quick else 'full',
+        'versions': {
+            'python': platform.python_version(),
+            'numpy': numpy.__version__,
+            'pandas': pandas.__version__,
+            'fastparquet': fastparquet.__version__
+        },
+        'options': dict(deltaflow.api.__OPTIONS__),
+        'results': []
+    }
+
+    root = tempfile.mkdtemp(prefix='deltaflow-bench-')
+    try:
+        for name in names:
+            print("running '{0}'".format(name), file=sys.stderr)
+            # (commits and options print progress to stdout)
+            with contextlib.redirect_stdout(io.StringIO()):
+                report['results'] += BENCHMARKS[name](root, sizes)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+    return report
+
+if __name__ == '__main__':
+    main()
@@ -83,7 +83,7 @@ class DirectoryMap(ABC):
             yield key
 
     def __contains__(self, key):
-        return key in self.dir
+        return os.path.isfile(os.path.join(self.__path, key))
 
     def __str__(self):
         out = self.__name.upper() + ': {\n'
@@ -0,0 +1,93 @@
+import os
+import asyncio
+import functools
+import pandas
+from concurrent.futures import Executor
+from typing import Union, Callable, Iterable
+from deltaflow.api import Field
+from deltaflow.arrow import Arrow
+from deltaflow.resolve import replay
+
+DataFrame = pandas.DataFrame
+
+# running loop of calling coroutine (get_event_loop before Python 3.7)
+get_running_loop = getattr(asyncio, 'get_running_loop', asyncio.get_event_loop)
+
+# Asynchronous facade of a Field for use in an event loop. File reads and
+# writes, block parsing and hashing run on an executor (the loop's default
+# executor if none is given), so independent resolves and commits overlap
+# (deltas of a single resolve are read ahead with the 'prefetch' option).
+class AsyncField:
+    def __init__(self, path: str = os.getcwd(), executor: Executor = None):
+        self.field = Field(path)
+        self.executor = executor
+        self._pending = {} # head node id -> future of in-flight resolve
+
+    @property # tree of wrapped field
+    def tree(self) -> 'Tree':
+        return self.field.tree
+
+    # run blocking function on executor
+    async def _run(self, func: Callable, *args, **kwargs):
+        loop = get_running_loop()
+        return await loop.run_in_executor(self.executor,
+            functools.partial(func, *args, **kwargs))
+
+    # Load arrow. Concurrent opens of arrows with the same head share one
+    # in-flight resolve (full resolves only; projected or sliced arrows
+    # are resolved on their own).
+    async def open_arrow(self, name: str, columns: list = None,
+            rows: Union[tuple, Callable] = None) -> 'AsyncArrow':
+        if columns is not None or rows is not None:
+            arrow = await self._run(Arrow, self.tree, name, columns, rows)
+            return AsyncArrow(self, arrow)
+
+        node_id = await self._run(self.tree.arrow_head, name)
+        future = self._pending.get(node_id)
+        if future is None:
+            resolve = lambda: replay(self.tree, self.tree.node(node_id))
+            future = asyncio.ensure_future(self._run(resolve))
+            self._pending[node_id] = future
+            future.add_done_callback(lambda _: self._pending.pop(node_id, None))
+        data, digest = await asyncio.shield(future)
+
+        arrow = await self._run(Arrow, self.tree, name,
+            resolved=(node_id, data, digest))
+        return AsyncArrow(self, arrow)
+
+    async def add_origin(self, data: DataFrame, name: str) -> None:
+        await self._run(self.field.add_origin, data, name)
+
+    async def add_origin_stream(self, source: Union[str, Iterable[DataFrame]],
+            name: str, **kwargs) -> None:
+        await self._run(self.field.add_origin_stream, source, name, **kwargs)
+
+    async def add_arrow(self, node_id: str, name: str) -> None:
+        await self._run(self.field.add_arrow, node_id, name)
+
+    async def resolve_many(self, names: Iterable[str], processes: int = None) -> dict:
+        return await self._run(self.field.resolve_many, list(names), processes)
+
+# Asynchronous facade of an Arrow. Edits of live data are in memory and
+# stay synchronous (attributes are those of the wrapped arrow), commits run
+# on the executor of the field one at a time.
+class AsyncArrow:
+    def __init__(self, field: AsyncField, arrow: Arrow):
+        self.__dict__['field'] = field
+        self.__dict__['arrow'] = arrow
+        self.__dict__['_lock'] = asyncio.Lock()
+
+    async def commit(self) -> None:
+        async with self._lock:
+            await self.field._run(self.arrow.commit)
+
+    def __getattr__(self, attr: str):
+        return getattr(self.arrow, attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self.arrow, attr, value)
+
+    def __str__(self):
+        return self.arrow.__str__()
+
+    __repr__ = __str__
@@ -3,18 +3,55 @@ import pandas
 import json
 import hashlib
 from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Union, Callable, Iterable
 from deltaflow.errors import (FieldPathError, NameExistsError, 
-    InformationError, IdLookupError)
+    InformationError, IdLookupError, LineageError, IntegrityError,
+    NameLookupError, HeadMovedError)
 from deltaflow import fs
-from deltaflow.hash import hash_data, hash_node
+from deltaflow.hash import hash_data, hash_node, hash_pair, node_scheme, Digest, StreamHash
 from deltaflow.tree import Tree
-from deltaflow.arrow import Arrow
+from deltaflow.arrow import Arrow, Stage, Layer
+from deltaflow.resolve import (resolve, verify, apply_delta, verify_node,
+    replay, outline_trie, replay_trie, replay_branch, subtree)
 from deltaflow.node import make_origin
+from deltaflow.delta import build
+from deltaflow.codec import frame_codecs
+from deltaflow.pack import get_store, write_pack
+from deltaflow.gc import collect
 
-__OPTIONS__ = {'raise_integrity_error': True}
+__OPTIONS__ = {
+    'raise_integrity_error': True,
+    'hash_scheme': 2, # data hash scheme of new nodes (1: flat, 2: merkle)
+    'hash_workers': 1, # threads used to hash data blocks
+    'codec': None, # codec of delta frame payloads (None: choose by size)
+    'codec_threshold': 2**16, # payload bytes below which raw buffers are used
+    'verify': 'every', # integrity verification policy on resolve
+    'verify_sample': 10, # verify every k-th node in 'sampled' mode
+    'checkpoint_interval': None, # commits between automatic checkpoints
+    'checkpoint_retention': None, # maximum number of checkpoints kept
+    'cache_size': 2**28, # memory budget of resolved frame cache in bytes
+    'copy_on_write': False, # share arrow data until written, read-only proxies
+    'sparse_density': 0.25, # changed cell ratio up to which puts are stored sparse
+    'delta_build': 'incremental', # delta construction at commit (from operation log or full diff)
+    'row_group_size': 2**16, # rows per parquet row group of origins & checkpoints
+    'prefetch': 0, # delta files read & parsed ahead of the one applied on resolve
+    'lock_timeout': 10 # seconds to wait for lock files held by other commits
+}
+
+__CHOICES__ = {
+    'verify': ('every', 'head-only', 'sampled', 'off'),
+    'hash_scheme': (1, 2),
+    'codec': (None,) + tuple(frame_codecs),
+    'delta_build': ('incremental', 'full', 'verify')
+}
 
 def set_option(option, value):
     global __OPTIONS__
+    if option in __CHOICES__ and value not in __CHOICES__[option]:
+        err_msg = "option '{0}' must be one of {1}, got {2}"
+        raise ValueError(err_msg.format(option, __CHOICES__[option], value))
     if option in __OPTIONS__:
         __OPTIONS__[option] = value
         print("set option '{0}' to {1}".format(option, value))
@@ -46,6 +83,11 @@ def touch(path: str = os.getcwd()) -> None:
     os.mkdir(os.path.join(core_path, 'arrows'))
     os.mkdir(os.path.join(core_path, 'deltas'))
     os.mkdir(os.path.join(core_path, 'nodes'))
+    os.mkdir(os.path.join(core_path, 'checkpoints'))
+    os.mkdir(os.path.join(core_path, 'packs'))
+    os.mkdir(os.path.join(core_path, 'digests'))
+    os.mkdir(os.path.join(core_path, 'locks'))
+    os.mkdir(os.path.join(core_path, 'tmp'))
 
 class Field:
     immutable = ('path', 'tree')
@@ -57,53 +99,293 @@ class Field:
         self.__dict__['path'] = path
         self.__dict__['tree'] = Tree(path)
     
-    # load field Arrow instance
-    def arrow(self, name: str) -> Arrow:
-        arrow = Arrow(self.tree, name)
+    @property # LRU cache of resolved frames shared by field arrows
+    def cache(self) -> 'FrameCache':
+        return self.tree.cache
+
+    # load field Arrow instance (read-only if resolved for given columns only,
+    # or rows in a (lower, upper) index range / matching an index predicate).
+    # Index ranges skip parquet row groups of origins and checkpoints, except
+    # for those with a range index (which is not stored as a column).
+    def arrow(self, name: str, columns: list = None, 
+            rows: Union[tuple, Callable] = None) -> Arrow:
+        arrow = Arrow(self.tree, name, columns, rows)
         return arrow
         
+    # Resolve data of many arrows at once. Lineages are merged into a trie so
+    # every node is resolved once (trunks shared by all lineages of an origin
+    # from cache or checkpoints) and data is copied only where lineages fork.
+    # Subtrees below the first fork are resolved in a pool of given number of
+    # processes if any. Returns map of arrow names to their data.
+    def resolve_many(self, names: Iterable[str], processes: int = None) -> OrderedDict:
+        heads = OrderedDict((name, self.tree.node(self.tree.arrow_head(name))) 
+            for name in names)
+        roots, children, hashes = outline_trie(
+            self.tree.outline(node) for node in heads.values())
+        targets = {}
+        for name, node in heads.items():
+            targets.setdefault(node.id, []).append(name)
+
+        frames = {}
+        branches = []
+        for root in roots:
+            # follow trunk to first fork or target
+            trunk, depth = root, 0
+            while len(children[trunk]) == 1 and trunk not in targets:
+                trunk, depth = children[trunk][0], depth + 1
+            data, digest = replay(self.tree, self.tree.node(trunk))
+            # (replayed data and digest are cached)
+            data = data.copy()
+            digest = digest.copy() if digest is not None else None
+
+            if processes is None or len(children[trunk]) < 2:
+                frames.update(replay_trie(self.tree, trunk, depth, data, digest, 
+                    children, hashes, targets))
+            else:
+                for name in targets.get(trunk, []):
+                    frames[name] = data.copy()
+                branches += [(child, depth + 1, data, digest) for child in children[trunk]]
+
+        if len(branches) > 0:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                futures = []
+                for child, depth, data, digest in branches:
+                    nodes = subtree(children, child)
+                    futures.append(pool.submit(replay_branch, self.path, 
+                        dict(__OPTIONS__), child, depth, data, digest,
+                        {node_id: children[node_id] for node_id in nodes},
+                        {node_id: hashes[node_id] for node_id in nodes},
+                        {node_id: targets[node_id] for node_id in nodes if node_id in targets}))
+                for future in futures:
+                    frames.update(future.result())
+
+        return OrderedDict((name, frames[name]) for name in heads)
+
     # add pandas dataframe as new origin with given name
     def add_origin(self, data: pandas.DataFrame, name: str) -> None:
         # create origin
-        origin_hash = hash_data(data)
-        node_str = make_origin(origin_hash, data)
+        scheme = get_option('hash_scheme')
+        digest = Digest(data) if scheme == 2 else None
+        origin_hash = digest.hexdigest() if scheme == 2 else hash_data(data)
+        node_str = make_origin(origin_hash, data, scheme)
         node_id = hash_node(node_str)
 
-        origins = self.tree.origins
-        if name in origins:
+        self._register_origin(name, node_id, node_str, digest, data.columns,
+            lambda: fs.write_origin(self.path, name, data))
+
+    # Create origin from an iterable of DataFrame chunks or a path to a CSV or
+    # parquet file, holding one chunk in memory at a time. Chunks are written
+    # as row groups of at most 'row_group_size' rows (CSV files are read by
+    # chunks of that size). Keyword arguments are passed to the file reader.
+    def add_origin_stream(self, source: Union[str, Iterable[pandas.DataFrame]], 
+            name: str, **kwargs) -> None:
+        if name in self.tree.origins:
             raise NameExistsError('origin', name)
-        for key in origins:
-            if origins[key] == node_id:
-                raise InformationError(key)
-        
-        fs.write_origin(self.path, name, data)
+        if isinstance(source, str):
+            source = fs.iter_file_chunks(source, get_option('row_group_size'), **kwargs)
 
-        path = os.path.join(self.tree.path, 'nodes', node_id)
-        with open(path, 'w') as f:
-            f.write(node_str)
+        scheme = get_option('hash_scheme')
+        stream = StreamHash(scheme)
+        tmp_path = fs.write_origin_stream(self.path, name, source, stream.update)
+        digest = stream.finalize() if scheme == 2 else None
+        origin_hash = stream.hexdigest()
+        node_str = make_origin(origin_hash, None, scheme)
+        node_id = hash_node(node_str)
 
-        origins = origins
-        origins[name] = node_id
-        with open(os.path.join(self.tree.path, 'origins'), 'w') as f:
-            json.dump(origins, f)
-        
-        arrow_path = os.path.join(self.tree.path, 'arrows', '.' + name)
-        with open(arrow_path, 'w') as f:
-            f.write(node_id)
+        origin_path = os.path.join(self.path, name + '.origin')
+        try:
+            self._register_origin(name, node_id, node_str, digest, stream.columns,
+                lambda: os.replace(tmp_path, origin_path))
+        finally:
+            if os.path.isfile(tmp_path):
+                os.remove(tmp_path)
 
-    def add_arrow(self, node_id: str, name: str) -> None:
-        if name in self.tree.arrows:
-            raise NameExistsError('arrow', name)
+    # Record new origin node while holding locks of its master arrow, field
+    # objects and origins map. place puts origin data file in place once
+    # name and node are known to be new.
+    def _register_origin(self, name: str, node_id: str, node_str: str, 
+            digest: Union[Digest, None], columns: pandas.Index, place: Callable) -> None:
+        with fs.lock(self.tree.path, 'arrow-.' + name), \
+                fs.lock(self.tree.path, 'objects', shared=True), \
+                fs.lock(self.tree.path, 'origins'):
+            origins = self.tree.origins
+            if name in origins:
+                raise NameExistsError('origin', name)
+            for key in origins:
+                if origins[key] == node_id:
+                    raise InformationError('origin', key)
+
+            place()
+
+            path = os.path.join(self.tree.path, 'nodes', node_id)
+            fs.write_atomic(self.tree.path, path, node_str)
+            self.tree.nodes.add(node_id, node_str)
+            if digest is not None:
+                fs.write_digest(self.tree.path, node_id, digest, columns)
 
+            origins[name] = node_id
+            self.tree.write_origins(origins)
+            self.tree.write_arrow_head('.' + name, node_id)
+
+    def add_arrow(self, node_id: str, name: str) -> None:
         if node_id not in self.tree.nodes:
             raise IdLookupError(node_id)
 
         if name[0] == '.':
             raise NameError("'.' prefix is reserved for master arrows")
 
-        arrow_path = os.path.join(self.tree.path, 'arrows', name)
-        with open(arrow_path, 'w') as f:
-            f.write(node_id)
+        with fs.lock(self.tree.path, 'arrow-' + name), \
+                fs.lock(self.tree.path, 'objects', shared=True):
+            if name in self.tree.arrows:
+                raise NameExistsError('arrow', name)
+            if node_id not in self.tree.nodes: # (collected meanwhile)
+                raise IdLookupError(node_id)
+            self.tree.write_arrow_head(name, node_id)
+
+    # remove arrow pointer (nodes it referenced are kept until collected by gc)
+    def remove_arrow(self, name: str) -> None:
+        with fs.lock(self.tree.path, 'arrow-' + name):
+            if name not in self.tree.arrows:
+                raise NameLookupError('arrow', name)
+
+            os.remove(os.path.join(self.tree.path, 'arrows', name))
+
+    # materialize data of node so arrows can resolve from it
+    def checkpoint(self, node_id: str) -> None:
+        node = self.tree.node(node_id)
+        if node.type == 'origin':
+            print("WARNING: no checkpoint created (origins are materialized)")
+            return
+
+        data = resolve(self.tree, node)
+        fs.write_checkpoint(self.tree.path, node_id, data)
+
+        retain = get_option('checkpoint_retention')
+        if retain is not None:
+            fs.prune_checkpoints(self.tree.path, retain)
+
+    # fully replay and verify lineage of node regardless of 'verify' option
+    def verify(self, node_id: str) -> bool:
+        return verify(self.tree, self.tree.node(node_id))
+
+    # write a single delta equivalent to the history of arrow between from_node
+    # (default: origin) and to_node (default: head) which resolves skip through
+    # (nodes of squashed history remain addressable), return its key
+    def squash(self, arrow: str, from_node: str = None, to_node: str = None) -> str:
+        head = self.tree.node(self.tree.arrow_head(arrow))
+        timeline = list(self.tree.outline(head))
+        from_node = timeline[0] if from_node is None else from_node
+        to_node = head.id if to_node is None else to_node
+        for node_id in (from_node, to_node):
+            if node_id not in timeline:
+                raise LineageError(node_id, head.id)
+        start, end = timeline.index(from_node), timeline.index(to_node)
+        if start >= end:
+            raise LineageError(from_node, to_node)
+
+        # replay operations of squashed deltas on a stage of from_node data
+        data = resolve(self.tree, self.tree.node(from_node)).copy()
+        stage = Stage(data)
+        for node_id in timeline[start + 1:end + 1]:
+            with fs.DeltaFile(self.tree.path, node_id) as delta_file:
+                for block, meta, obj in delta_file.parse_blocks():
+                    layer = Layer()
+                    layer.batch.extend(block.operations(meta, obj, stage.live))
+                    stage.live = block.apply(meta, obj, stage.writable())
+                    stage.add(layer)
+
+        key = hash_pair(from_node, to_node)
+        delta = build(stage)
+        outline = self.tree.outline(self.tree.node(to_node))
+        scheme = node_scheme(self.tree.nodes[to_node])
+        # (gc holds objects lock, so the delta is recorded before it is swept)
+        with fs.lock(self.tree.path, 'objects', shared=True):
+            fs.write_delta(self.tree.path, key, delta)
+            # squash delta must reproduce data of to_node
+            try:
+                verify_node(apply_delta(self.tree, key, data.copy()), to_node, 
+                    outline[to_node], scheme, strict=True)
+            except IntegrityError:
+                os.remove(os.path.join(self.tree.path, 'deltas', key + '.delta'))
+                raise
+
+            self.tree.add_squash(key, from_node, to_node)
+
+        return key
+
+    # add data of arrow head as new origin and point arrow to it
+    def rebase(self, arrow: str, new_origin_name: str) -> str:
+        head = self.tree.node(self.tree.arrow_head(arrow))
+        data = resolve(self.tree, head)
+        self.add_origin(data, new_origin_name)
+        node_id = self.tree.origins[new_origin_name]
+
+        with fs.lock(self.tree.path, 'arrow-' + arrow), \
+                fs.lock(self.tree.path, 'objects', shared=True):
+            found = self.tree.arrow_head(arrow)
+            if found != head.id:
+                raise HeadMovedError(arrow, head.id, found)
+            self.tree.write_arrow_head(arrow, node_id)
+
+        return node_id
+
+    # move loose nodes and deltas into a new pack (with consolidate, merge
+    # existing packs into it as well), return path of the new pack. Holds
+    # objects lock of field exclusively (like gc) against concurrent commits.
+    def repack(self, consolidate: bool = False) -> str:
+        with fs.lock(self.tree.path, 'objects'):
+            return self._repack(consolidate)
+
+    def _repack(self, consolidate: bool) -> str:
+        store = get_store(self.tree.path)
+        store.refresh()
+        loose, seen = [], set()
+
+        def iter_objects():
+            for kind, folder, suffix in (('node', 'nodes', ''), ('delta', 'deltas', '.delta')):
+                folder = os.path.join(self.tree.path, folder)
+                for fname in sorted(os.listdir(folder)):
+                    if not fname.endswith(suffix):
+                        continue
+                    key = fname[:len(fname) - len(suffix)]
+                    with open(os.path.join(folder, fname), 'rb') as f:
+                        content = f.read()
+                    loose.append(os.path.join(folder, fname))
+                    seen.add((kind, key))
+                    yield kind, key, content
+            if consolidate:
+                for pack in store.packs:
+                    for kind in ('node', 'delta'):
+                        for key in pack.keys(kind):
+                            if (kind, key) not in seen:
+                                seen.add((kind, key))
+                                yield kind, key, pack.read(kind, key)
+
+        old_packs = [pack.path for pack in store.packs] if consolidate else []
+        pack_path = write_pack(self.tree.path, iter_objects())
+        if len(seen) == 0:
+            os.remove(pack_path + '.idx')
+            os.remove(pack_path + '.pack')
+            return None
+        # objects are now packed, remove their previous copies
+        for path in loose:
+            os.remove(path)
+        for path in old_packs:
+            if path != pack_path:
+                os.remove(path + '.idx')
+                os.remove(path + '.pack')
+        store.refresh()
+        self.tree.nodes.rebuild()
+
+        return pack_path
+
+    # delete (or move to archive directory) nodes, deltas, origins, checkpoints
+    # and digests not reachable from any arrow, keeping objects modified within
+    # 'grace' seconds; return counts and bytes of garbage (dry_run: only report).
+    # Holds objects lock of field, so concurrent commits wait for it.
+    def gc(self, dry_run: bool = False, grace: float = None, 
+            archive: str = None) -> dict:
+        return collect(self.tree, dry_run, grace, archive)
 
     def __setattr__(self, key, val):
         if key in Field.immutable:
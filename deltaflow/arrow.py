@@ -1,20 +1,23 @@
 import os
 import pandas
 from collections import OrderedDict
-from typing import TypeVar, Union, Iterable, Any, Tuple
+from contextlib import contextmanager
+from typing import TypeVar, Union, Iterable, Any, Tuple, Callable
 import deltaflow
 import deltaflow.fs as fs
 import deltaflow.operation as op
-from deltaflow.hash import hash_data, hash_pair, hash_node
+from deltaflow.hash import hash_data, hash_pair, hash_node, Digest
 from deltaflow.delta import build
+from deltaflow.resolve import replay, replay_slice, RowSlice
 from deltaflow.node import make_node
 from deltaflow.errors import (
-    UndoError, IndexerError, IntegrityError, 
+    UndoError, IndexerError, 
     AxisLabelError, InsertionError, 
     ExtensionError, ObjectTypeError,
     AxisOverlapError, DataTypeError, 
     DifferenceError, IntersectionError,
-    PutError
+    PutError, ReadOnlyError, BatchError,
+    HeadMovedError
 )
 
 DataFrame = pandas.DataFrame
@@ -28,24 +31,69 @@ class Layer:
     def __init__(self):
         self.batch = []
     
-    def push(self, data: DataFrame, oper: 'Operation') -> DataFrame:
+    def push(self, data: DataFrame, oper: 'Operation', copy: bool = True) -> DataFrame:
         self.batch.append(oper)
-        queue = oper.execute(data)
+        queue = oper.execute(data, copy)
         return queue
 
+# Base and live data of an arrow. In copy-on-write mode live data shares
+# base until first written to; each put then copies only the columns it
+# writes (the first time), and modifies them in place.
 class Stage:
     def __init__(self, data: DataFrame):
         self.base = data
-        self.live = data.copy()
+        self.cow = deltaflow.get_option('copy_on_write')
+        self.live = data if self.cow else data.copy()
+        # labels of columns private to live data (True if all are)
+        self._owned = set() if self.cow else True
         self.stack = []
 
+    # Return read-only view of live data. Live data is shared with the view
+    # from then on, so its columns are copied before they are next modified
+    # in place.
+    def view(self) -> DataFrame:
+        self._owned = set()
+        return op.readonly(self.live)
+
+    # return live data that may be modified in place at given columns (all
+    # if None), copying those still shared
+    def writable(self, columns: Iterable = None) -> DataFrame:
+        if self._owned is True:
+            return self.live
+        if columns is None or not self.live.columns.is_unique:
+            self.live = self.live.copy()
+            self._owned = True
+            return self.live
+
+        shared = [col for col in columns if col not in self._owned]
+        if shared:
+            self.live = op.copy_columns(self.live, shared)
+            self._owned.update(shared)
+
+        return self.live
+
+    # execute operation of layer on live data (in place if not copy and
+    # live data is not shared)
+    def push(self, layer: Layer, oper: 'Operation', copy: bool = True) -> None:
+        if not self.cow:
+            self.live = layer.push(self.live, oper, copy)
+        elif oper.id == 'put':
+            self.live = layer.push(self.writable(oper.y.columns), oper, copy=False)
+        else:
+            self.live = layer.push(self.live, oper, copy=False)
+            if oper.id != 'relabel':
+                self._owned = True
+            elif oper.axis == 1 and self._owned is not True:
+                # (relabeled data shares values of previous live data)
+                self._owned = set()
+
     def add(self, layer: Layer) -> None:
         self.stack.append(layer)
     
     def revert(self) -> None:
-        data = self.live.copy()
         try:
             layer = self.stack[-1]
+            data = self._undo_target(layer)
             for oper in reversed(layer.batch):
                 data = oper.undo(data)
             
@@ -54,6 +102,19 @@ class Stage:
             raise UndoError
 
         self.live = data
+
+    # live data that operations of layer may be undone on in place (puts
+    # only restore the columns they wrote)
+    def _undo_target(self, layer: Layer) -> DataFrame:
+        if not self.cow:
+            return self.live.copy()
+        if any(oper.id != 'put' for oper in layer.batch):
+            return self.writable()
+
+        columns = set()
+        for oper in layer.batch:
+            columns.update(oper.x.columns)
+        return self.writable(columns)
     
     # iterate through stack layers as flat sequence of operations
     def iter_operations(self):
@@ -78,21 +139,45 @@ class Stage:
     
     __repr__ = __str__
 
-        
+# Operations queued into a single layer by Arrow.batch; data is proxy of
+# live data once the batch is closed
+class Batch:
+    def __init__(self):
+        self.layer = Layer()
+        self.data = None
+
 class Arrow:
-    def __init__(self, tree: 'Tree', name: str):
+    # (resolved: node id, data and digest of a full resolve shared by caller,
+    # used if node is still head of arrow)
+    def __init__(self, tree: 'Tree', name: str, columns: Iterable = None, 
+            rows: Union[tuple, Callable] = None, resolved: tuple = None):
         node_id = tree.arrow_head(name)
         self.name = name
         self.head = tree.node(node_id)
+        self.columns = list(columns) if columns is not None else None
+        self.rows = RowSlice(rows) if rows is not None else None
         self._tree = tree
 
         outline = tree.outline(self.head)
-        self.stage = Stage(self._resolve(outline))
+        self._digest = None
+        self._batch = None
+        if resolved is not None and resolved[0] == node_id and columns is None and rows is None:
+            data, digest = resolved[1:]
+            self._digest = digest.copy() if digest is not None else None
+        else:
+            data = self._resolve(outline)
+        self.stage = Stage(data)
 
+    # copy of live data (read-only snapshot view in copy-on-write mode)
     def proxy(self) -> DataFrame:
+        if self.stage.cow:
+            return self.stage.view()
+
         return self.stage.live.copy()
 
     def undo(self) -> DataFrame:
+        if self._batch is not None:
+            raise BatchError('undo')
         try:
             self.stage.revert()
         except UndoError:
@@ -101,8 +186,14 @@ class Arrow:
 
         return self.proxy()
 
+    # raise if arrow was resolved for a subset of columns or rows
+    def _writable(self) -> None:
+        if self.columns is not None or self.rows is not None:
+            raise ReadOnlyError(self.name)
+
     # take difference between stage and proxy at shared indices, put difference in stage
     def put(self, data: PandasObject) -> DataFrame:
+        self._writable()
         if type(data) is Series:
             data = DataFrame(data)
         # determine columns that intersect with stage
@@ -116,21 +207,16 @@ class Arrow:
         data_select = data.loc[update_rows, update_cols]
         # data type preservation
         dt_pres = data_select.dtypes
-        # shrink modifications in both directions
-        x = op.shrink(data_select, stage_select)
-        y = op.shrink(stage_select, data_select)
+        # changed cells with original (x) and new (y) values
+        mask, x, y = op.diff(stage_select, data_select)
         # if layer is empty, return proxy as is
-        if y.shape[0] == 0:
-            return self.proxy()
+        if not mask.any():
+            return self.proxy() if self._batch is None else None
             
-        layer = Layer()
-        self.stage.live = layer.push(self.stage.live, 
-            op.Put(x, y, dt_pres))
-
-        self.stage.add(layer)
-        return self.proxy()
+        return self._apply(op.Put(x, y, dt_pres, mask))
   
     def drop(self, index: IndexLike, axis: int = 0, method: str = 'intersection') -> DataFrame:
+        self._writable()
         if axis not in (0, 1):
             err_msg = "axis must be 0 or 1, got {0}"
             raise TypeError(err_msg.format(axis))
@@ -160,22 +246,19 @@ class Arrow:
             else:
                 raise DifferenceError
 
-        layer = Layer()
         drop_slice = [slice(None), slice(None)]
         drop_slice[axis] = ix
         drop_data = self.stage.live.loc[drop_slice[0], drop_slice[1]]
-        self.stage.live = layer.push(
-            self.stage.live,
+        return self._apply(
             op.Drop(
                 drop_data, 
                 self.stage.live._get_axis(axis), 
                 axis
             )
         )
-        self.stage.add(layer)
-        return self.proxy()
         
     def extend(self, data: PandasObject, axis: int = 0) -> DataFrame:
+        self._writable()
         if axis == 0: # extend rows
             if type(data) is not DataFrame:
                 err_msg = "expected DataFrame object, got '{0}'"
@@ -189,7 +272,7 @@ class Arrow:
             if col_match.shape[0] != self.stage.live.shape[1]:
                 raise ExtensionError(0)
 
-            ext = data[col_match, ext_rows]
+            ext = data.loc[ext_rows, col_match]
         elif axis == 1: # extend columns
             data_type = type(data)
             if data_type not in (DataFrame, Series):
@@ -216,93 +299,140 @@ class Arrow:
             err_msg = "axis must be 0 or 1, got {0}"
             raise TypeError(err_msg.format(axis))
             
-        layer = Layer()
-        self.stage.live = layer.push(
-            self.stage.live,
-            op.Extend(ext, axis=axis)
-        )
-        self.stage.add(layer)
-
-        return self.proxy()
+        return self._apply(op.Extend(ext, axis=axis))
     
     def relabel(self, data: IndexLike, axis: int = 0) -> DataFrame:
+        self._writable()
         if data.shape[0] != self.stage.live.shape[0]:
             raise SetIndexError(self.stage.live.shape[0], data.shape[0])
 
         if data.shape[axis] != self.stage.live.shape[axis]:
             raise IndexError('axis length does not match live data')
 
-        layer = Layer()
-        self.stage.live = layer.push(
-            self.stage.live, 
+        return self._apply(
             op.Relabel(self.stage.live.index, data.index, axis=axis)
         )
-        self.stage.add(layer)
 
-        return self.proxy()
+    # Execute operation in a layer of its own and return proxy, or queue it
+    # into layer of open batch (merged with a preceding put) and return None
+    def _apply(self, oper: 'Operation') -> Union[DataFrame, None]:
+        if self._batch is None:
+            layer = Layer()
+            self.stage.push(layer, oper)
+            self.stage.add(layer)
+            return self.proxy()
+
+        layer = self._batch.layer
+        self.stage.push(layer, oper, copy=False)
+        if oper.id == 'put' and len(layer.batch) > 1 and layer.batch[-2].id == 'put':
+            merged = layer.batch[-2].merge(oper, self.stage.live)
+            if merged is not None:
+                layer.batch[-2:] = [merged]
+
+        return None
+
+    # Group operations into one layer (reverted by a single undo). Methods
+    # return None within the batch; the proxy is set to batch.data on exit.
+    # Operations of a batch which raised are reverted.
+    @contextmanager
+    def batch(self):
+        self._writable()
+        if self._batch is not None:
+            raise BatchError('open a batch')
+
+        batch = Batch()
+        self._batch = batch
+        try:
+            yield batch
+        except BaseException:
+            self._batch = None
+            if len(batch.layer.batch) > 0:
+                self.stage.add(batch.layer)
+                self.stage.revert()
+            raise
+
+        self._batch = None
+        if len(batch.layer.batch) > 0:
+            self.stage.add(batch.layer)
+        batch.data = self.proxy()
 
     def commit(self) -> None:
+        self._writable()
+        if self._batch is not None:
+            raise BatchError('commit')
         if self.head.type == 'delta':
             lineage = [self.head.id] + self.head.lineage
         else:
             lineage = [self.head.id]
 
         origin_hash = self.head.origin
-        data_hash = hash_data(self.stage.live)
+        scheme = deltaflow.get_option('hash_scheme')
 
         delta = build(self.stage)
+        data_hash = self._hash(delta, scheme)
 
-        node_str = make_node(origin_hash, lineage)
+        node_str = make_node(origin_hash, lineage, scheme)
         node_id = hash_pair(hash_node(node_str), data_hash)
 
-        node_path = os.path.join(self._tree.path, 'nodes', node_id)
-        with open(node_path, 'w') as f:
-            f.write(node_str)
-
-        fs.write_delta(self._tree.path, node_id, delta)
-
-        arrow_path = os.path.join(self._tree.path, 'arrows', self.name)
-        with open(arrow_path, 'w') as f:
-            f.write(node_id)
+        # objects are written atomically before the head is moved to them,
+        # holding lock of this arrow and (against gc) a shared objects lock
+        # of field, so commits of other arrows proceed in parallel
+        with fs.lock(self._tree.path, 'arrow-' + self.name), \
+                fs.lock(self._tree.path, 'objects', shared=True):
+            found = self._tree.arrow_head(self.name)
+            if found != self.head.id:
+                raise HeadMovedError(self.name, self.head.id, found)
+
+            fs.write_delta(self._tree.path, node_id, delta)
+            if scheme == 2:
+                fs.write_digest(self._tree.path, node_id, 
+                    self._digest, self.stage.live.columns)
+            node_path = os.path.join(self._tree.path, 'nodes', node_id)
+            fs.write_atomic(self._tree.path, node_path, node_str)
+            self._tree.nodes.add(node_id, node_str)
+
+            self._tree.write_arrow_head(self.name, node_id)
         
         self.head = self._tree.node(node_id)
-        self.stage.stack = []
+        # live data becomes base of a fresh stage for the new head
+        self.stage = Stage(self.stage.live)
+        self._tree.cache.put(node_id, self.stage.base, 
+            self._digest.copy() if scheme == 2 else None)
+
+        # materialize snapshot every 'checkpoint_interval' commits
+        interval = deltaflow.get_option('checkpoint_interval')
+        if interval and len(lineage) % interval == 0:
+            fs.write_checkpoint(self._tree.path, node_id, self.stage.base)
+            retain = deltaflow.get_option('checkpoint_retention')
+            if retain is not None:
+                fs.prune_checkpoints(self._tree.path, retain)
 
         print(self)
 
     def _resolve(self, outline) -> DataFrame:
-        path = self._tree.path
-
-        if self.head.type == 'delta':
-            origin_id = self.head.lineage[-1]
-        else:
-            origin_id = self.head.id
-
-        origin_name = self._tree.name_origin(origin_id)
-        origin_hash = self.head.origin
-        # load origin data and verify hash == origin_hash
-        data = fs.load_origin(self._tree.path, origin_name)
-        if hash_data(data) != origin_hash:
-            if deltaflow.get_option('raise_integrity_error'):
-                raise IntegrityError(origin_name, 'origin')
-            else:
-                print('WARNING:', IntegrityError(origin_name, 'origin'))
-        # apply deltas in timeline (excluding origin node)
-        for node_id in list(outline)[1:]:
-            node_hash = outline[node_id]
-            delta_file = fs.DeltaFile(path, node_id)
-            for modifier in delta_file.iter_blocks():
-                data = modifier(data)
-            
-            # assure reconstructed node_id matches true node_id
-            data_hash = hash_data(data)
-            if hash_pair(node_hash, data_hash) != node_id:
-                if deltaflow.get_option('raise_integrity_error'):
-                    raise IntegrityError(node_id, 'delta')
-                else:
-                    print('WARNING:', IntegrityError(node_id, 'delta'))
+        if self.columns is not None or self.rows is not None:
+            return replay_slice(self._tree, self.head, 
+                self.columns, self.rows, outline)
 
+        data, self._digest = replay(self._tree, self.head, outline)
         return data
+
+    # hash live data, updating digest of head with delta if scheme allows
+    def _hash(self, delta: OrderedDict, scheme: int) -> str:
+        if scheme == 1:
+            self._digest = None
+            return hash_data(self.stage.live)
+
+        if self._digest is None:
+            self._digest = Digest(self.stage.base)
+        digest = self._digest.copy()
+        axes = [self.stage.base.index, self.stage.base.columns]
+        for key in delta:
+            block = delta[key]
+            axes = block.touch(block.meta, block.content, axes, digest)
+
+        self._digest = digest.refresh(self.stage.live)
+        return digest.hexdigest()
     
     def __str__(self):
         out = "{0} -> {1}"
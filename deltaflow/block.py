@@ -1,13 +1,15 @@
 import numpy
-import fastparquet
 import pandas
 from collections import OrderedDict
 from pandas import DataFrame, Series, Int64Index, Index, RangeIndex
 from typing import Union, Tuple, List, TypeVar, Iterable, Callable
 from deltaflow.abstract import Selection
+import deltaflow.operation as op
 from deltaflow.errors import BlockError
+from deltaflow.hash import Digest
+from deltaflow.codec import read_codec, choose_frame_codec, choose_array_codec
 
-DeltaReader = TypeVar('DeltaReader')
+PartitionReader = TypeVar('PartitionReader')
 DeltaWriter = TypeVar('DeltaWriter')
 Index = pandas.Index
 
@@ -18,20 +20,54 @@ type_map = {
     type(None): None
 }
 
+# return column labels as a list if they can be recorded in block meta
+def label_list(columns: Index) -> Union[List, None]:
+    labels = columns.tolist()
+    if all(type(label) in (str, int) for label in labels):
+        return labels
+
+    return None
+
+# return (min, max) labels of index if they can be recorded in block meta
+def index_bounds(index: Index) -> Union[List, None]:
+    if len(index) == 0:
+        return None
+    if index.dtype.kind in 'iu':
+        return [int(index.min()), int(index.max())]
+    if index.dtype.kind == 'f':
+        bounds = [float(index.min()), float(index.max())]
+        return None if numpy.isnan(bounds).any() else bounds
+    if index.inferred_type == 'string':
+        return [str(index.min()), str(index.max())]
+
+    return None
+
 class Block:
     @staticmethod
-    def parse(meta: dict, reader: DeltaReader) -> Tuple[DataFrame]:
-        obj = fastparquet.ParquetFile('null', open_with=lambda *ignore: reader)
-        reader.seek(0)
-        obj = obj.to_pandas()
-        # convert None values back to numpy.nan
-        obj = obj.fillna(value=numpy.nan)
-        # set index name back to None if index name is default
-        if obj.index.name == 'index':
-            obj.index.name = None
-
+    def parse(meta: dict, reader: PartitionReader, columns: set = None) -> Tuple[DataFrame]:
+        obj = read_codec(meta, 'frame').read(reader, columns)
         return (obj,)
 
+    # whether block can be skipped when resolving given columns/rows only
+    @staticmethod
+    def skip(meta: dict, columns: set = None, rows: 'RowSlice' = None) -> bool:
+        return False
+
+    # restrict parsed block to given rows
+    @staticmethod
+    def select(meta: dict, obj: object, rows: 'RowSlice') -> object:
+        return obj
+
+    # return stage operations equivalent to applying block to data
+    @staticmethod
+    def operations(meta: dict, obj: object, data: DataFrame) -> List['Operation']:
+        return []
+
+    # mark digest leaves changed by block, return axes after block
+    @staticmethod
+    def touch(meta: dict, obj: Tuple, axes: List[Index], digest: Digest) -> List[Index]:
+        return axes
+
 class AxisBlock(Block):
     __slots__ = ['drop', 'relabel', 'meta']
     def __init__(self, drop: Union[List, None], relabel: Union[List, None]):
@@ -85,13 +121,15 @@ class AxisBlock(Block):
                 if obj is not None:
                     payload['relabel' + suffix] = obj
 
-        numpy.savez_compressed(writer, **payload)
+        codec = choose_array_codec(payload)
+        codec.write(payload, writer)
         writer.next()
+        self.meta['codec'] = codec.name
         self.meta['chunk'] = writer.push()
         
     @staticmethod
-    def parse(meta: dict, reader: DeltaReader) -> OrderedDict:
-        payload = numpy.load(reader, allow_pickle=True)
+    def parse(meta: dict, reader: PartitionReader, columns: set = None) -> OrderedDict:
+        payload = read_codec(meta, 'array').read(reader)
         obj = OrderedDict()
 
         structure = meta['structure']
@@ -122,8 +160,24 @@ class AxisBlock(Block):
             if structure['relabel'][0] is not None:
                 if structure['relabel'][0]['name'] is not None:
                     obj['relabel'][0].name = structure['relabel'][0]['name']
+
+        # only drop resolved columns
+        if columns is not None and 'drop' in obj and obj['drop'][1] is not None:
+            obj['drop'][1] = [col for col in obj['drop'][1] if col in columns]
+            if len(obj['drop'][1]) == 0:
+                obj['drop'][1] = None
         
         return obj
+
+    # only drop resolved rows (row relabels are resolved in full)
+    @staticmethod
+    def select(meta: dict, obj: dict, rows: 'RowSlice') -> dict:
+        if 'drop' in obj and obj['drop'][0] is not None:
+            labels = pandas.Index(obj['drop'][0])
+            labels = labels[rows.mask(labels)]
+            obj['drop'][0] = labels if len(labels) > 0 else None
+
+        return obj
     
     @staticmethod
     def apply(meta: dict, obj: dict, data: DataFrame) -> DataFrame:
@@ -138,6 +192,57 @@ class AxisBlock(Block):
 
         return data
 
+    @staticmethod
+    def operations(meta: dict, obj: dict, data: DataFrame) -> List['Operation']:
+        opers = []
+        if 'drop' in obj:
+            for axis in (0, 1):
+                if obj['drop'][axis] is not None:
+                    drop_slice = [slice(None), slice(None)]
+                    drop_slice[axis] = obj['drop'][axis]
+                    oper = op.Drop(data.loc[drop_slice[0], drop_slice[1]], 
+                        data._get_axis(axis), axis)
+                    data = oper.execute(data)
+                    opers.append(oper)
+        if 'relabel' in obj:
+            for axis in (0, 1):
+                if obj['relabel'][axis] is not None:
+                    oper = op.Relabel(data._get_axis(axis), 
+                        pandas.Index(obj['relabel'][axis]), axis)
+                    data = oper.execute(data)
+                    opers.append(oper)
+
+        return opers
+
+    @staticmethod
+    def touch(meta: dict, obj: dict, axes: List[Index], digest: Digest) -> List[Index]:
+        axes = list(axes)
+        if 'drop' in obj:
+            if obj['drop'][0] is not None:
+                digest.drop_rows(axes[0].get_indexer(obj['drop'][0]))
+                axes[0] = axes[0].drop(obj['drop'][0])
+            if obj['drop'][1] is not None:
+                digest.drop_columns(axes[1].get_indexer(obj['drop'][1]))
+                axes[1] = axes[1].drop(obj['drop'][1])
+        if 'relabel' in obj:
+            if obj['relabel'][0] is not None:
+                digest.mark_index()
+                axes[0] = pandas.Index(obj['relabel'][0])
+            if obj['relabel'][1] is not None:
+                axes[1] = pandas.Index(obj['relabel'][1])
+
+        return axes
+
+    @property # block contents in parsed form
+    def content(self) -> OrderedDict:
+        obj = OrderedDict()
+        if self.drop is not None:
+            obj['drop'] = self.drop
+        if self.relabel is not None:
+            obj['relabel'] = self.relabel
+
+        return obj
+
     @staticmethod
     def stringify(entry: dict) -> List[str]:
         structure = entry['structure']
@@ -173,30 +278,215 @@ class PutBlock(Block):
             'method': 'put',
             'dtypes': dt,
             'shape': data.shape,
-            'count': int(data.count().sum())
+            'count': int(data.count().sum()),
+            'columns': label_list(data.columns),
+            'bounds': index_bounds(data.index)
         }
     
     def write(self, writer: DeltaWriter) -> None:
-        fastparquet.write('null', self.data, open_with=lambda *ignore: writer)
+        codec = choose_frame_codec(self.data)
+        codec.write(self.data, writer)
         writer.next()
-    
+
+        self.meta['codec'] = codec.name
         self.meta['chunk'] = writer.push()
 
 
+    @staticmethod
+    def skip(meta: dict, columns: set = None, rows: 'RowSlice' = None) -> bool:
+        if rows is not None and not rows.overlaps(meta.get('bounds')):
+            return True
+        if columns is None or meta.get('columns') is None:
+            return False
+
+        return not any(col in columns for col in meta['columns'])
+
+    @staticmethod
+    def select(meta: dict, obj: Tuple[DataFrame], rows: 'RowSlice') -> Tuple[DataFrame]:
+        return (rows.select(obj[0]),)
+
     @staticmethod
     def apply(meta: dict, obj: Tuple[DataFrame], data: DataFrame) -> DataFrame:
         obj = obj[0].copy()
         data.update(obj)
         if meta['dtypes'] is not None:
-            data = data.astype(meta['dtypes'])
+            # (payload may have been read for a subset of columns)
+            dtypes = meta['dtypes']
+            dtypes = {col: dtypes[col] for col in dtypes if col in obj.columns}
+            data = data.astype(dtypes)
         
         return data
+
+    @staticmethod
+    def operations(meta: dict, obj: Tuple[DataFrame], data: DataFrame) -> List['Operation']:
+        y = obj[0]
+        x = data.loc[y.index, y.columns]
+        dtypes = data.dtypes.copy()
+        if meta['dtypes'] is not None:
+            for col in y.columns:
+                if col in meta['dtypes']:
+                    dtypes[col] = pandas.api.types.pandas_dtype(meta['dtypes'][col])
+
+        return [op.Put(x, y, dtypes)]
+
+    @staticmethod
+    def touch(meta: dict, obj: Tuple[DataFrame], axes: List[Index], digest: Digest) -> List[Index]:
+        rows = axes[0].get_indexer(obj[0].index)
+        cols = axes[1].get_indexer(obj[0].columns)
+        digest.mark_cells(cols, rows)
+
+        return axes
+
+    @property # block contents in parsed form
+    def content(self) -> Tuple[DataFrame]:
+        return (self.data,)
     
     @staticmethod
     def stringify(entry):
         out = "PUT: {0} values".format(entry['count'])
         return [out]
 
+# return smallest integer array type holding given positions
+def position_array(positions: numpy.ndarray) -> numpy.ndarray:
+    if positions.size == 0 or positions.max() < 2**31:
+        return positions.astype(numpy.int32)
+
+    return positions.astype(numpy.int64)
+
+# Put block storing changed cells as coordinates: labels of changed rows,
+# and per data type group, column positions (into meta 'columns'), row
+# positions (into changed row labels) and values of changed cells
+class SparsePutBlock(PutBlock):
+    __slots__ = ['rows', 'groups', 'meta']
+    def __init__(self, data: DataFrame, mask: numpy.ndarray, dtypes: Union[Series, None]):
+        cast = dtypes.to_dict() if dtypes is not None else {}
+        rows, cols = numpy.nonzero(mask)
+        labels, inverse = numpy.unique(rows, return_inverse=True)
+        self.rows = data.index[labels]
+
+        groups = OrderedDict()
+        for j in numpy.unique(cols):
+            sel = cols == j
+            values = data.iloc[:, j].to_numpy()[rows[sel]]
+            label = data.columns[j]
+            # store values in preserved data type if possible
+            if label in cast and not pandas.isna(values).any():
+                values = values.astype(cast[label])
+
+            group = groups.setdefault(str(values.dtype), ([], [], []))
+            group[0].append(numpy.full(values.shape[0], j))
+            group[1].append(inverse[sel])
+            group[2].append(values)
+
+        self.groups = [tuple(numpy.concatenate(arrs) for arrs in group) 
+            for group in groups.values()]
+        self.groups = [(position_array(col_pos), position_array(row_pos), values)
+            for col_pos, row_pos, values in self.groups]
+
+        self.meta = {
+            'class': 'sparse',
+            'method': 'put',
+            'columns': label_list(data.columns),
+            'dtypes': [str(cast[col]) if col in cast else None for col in data.columns],
+            'groups': list(groups),
+            'shape': [len(self.rows), data.shape[1]],
+            'count': int(rows.shape[0]),
+            'bounds': index_bounds(self.rows)
+        }
+
+    def write(self, writer: DeltaWriter) -> None:
+        payload = {'rows': self.rows.to_numpy()}
+        for k, (col_pos, row_pos, values) in enumerate(self.groups):
+            payload['cols_' + str(k)] = col_pos
+            payload['rows_' + str(k)] = row_pos
+            payload['values_' + str(k)] = values
+
+        codec = choose_array_codec(payload)
+        codec.write(payload, writer)
+        writer.next()
+        self.meta['codec'] = codec.name
+        self.meta['chunk'] = writer.push()
+
+    @staticmethod
+    def parse(meta: dict, reader: PartitionReader, columns: set = None) -> OrderedDict:
+        payload = read_codec(meta, 'array').read(reader)
+        obj = OrderedDict()
+        obj['rows'] = pandas.Index(payload['rows'])
+        obj['groups'] = []
+        for k in range(len(meta['groups'])):
+            obj['groups'].append((payload['cols_' + str(k)], 
+                payload['rows_' + str(k)], payload['values_' + str(k)]))
+
+        # only keep cells of resolved columns
+        if columns is not None:
+            keep = numpy.array([col in columns for col in meta['columns']], dtype=bool)
+            obj['groups'] = [(col_pos[keep[col_pos]], row_pos[keep[col_pos]], 
+                values[keep[col_pos]]) for col_pos, row_pos, values in obj['groups']]
+
+        return obj
+
+    @staticmethod
+    def select(meta: dict, obj: OrderedDict, rows: 'RowSlice') -> OrderedDict:
+        keep = rows.mask(obj['rows'])
+        obj['groups'] = [(col_pos[keep[row_pos]], row_pos[keep[row_pos]], 
+            values[keep[row_pos]]) for col_pos, row_pos, values in obj['groups']]
+
+        return obj
+
+    # yield (data column position, data row positions, values) of each changed column
+    @staticmethod
+    def iter_cells(meta: dict, obj: OrderedDict, axes: List[Index]) -> Iterable[Tuple]:
+        rows = axes[0].get_indexer(obj['rows'])
+        cols = axes[1].get_indexer(pandas.Index(meta['columns']))
+        for col_pos, row_pos, values in obj['groups']:
+            for c in numpy.unique(col_pos):
+                sel = col_pos == c
+                row_ix = rows[row_pos[sel]]
+                keep = row_ix != -1
+                if cols[c] != -1:
+                    yield cols[c], row_ix[keep], values[sel][keep]
+
+    # assign values positionally, touching changed columns only
+    @staticmethod
+    def apply(meta: dict, obj: OrderedDict, data: DataFrame) -> DataFrame:
+        for j, row_ix, values in SparsePutBlock.iter_cells(meta, obj, [data.index, data.columns]):
+            data.iloc[row_ix, j] = values
+
+        cast = {}
+        for col, dtype in zip(meta['columns'], meta['dtypes']):
+            if dtype is not None and col in data.columns:
+                cast[col] = dtype
+
+        return op.astype_columns(data, cast)
+
+    @staticmethod
+    def operations(meta: dict, obj: OrderedDict, data: DataFrame) -> List['Operation']:
+        result = SparsePutBlock.apply(meta, obj, data.copy())
+        mask = numpy.zeros(data.shape, dtype=bool)
+        for j, row_ix, _ in SparsePutBlock.iter_cells(meta, obj, [data.index, data.columns]):
+            mask[row_ix, j] = True
+        rows, cols = mask.any(axis=1), mask.any(axis=0)
+        y = result.iloc[rows, cols]
+        x = data.iloc[rows, cols]
+
+        return [op.Put(x, y, result.dtypes, mask[rows][:, cols])]
+
+    @staticmethod
+    def touch(meta: dict, obj: OrderedDict, axes: List[Index], digest: Digest) -> List[Index]:
+        for j, row_ix, _ in SparsePutBlock.iter_cells(meta, obj, axes):
+            digest.mark_cells([j], row_ix)
+
+        return axes
+
+    @property # block contents in parsed form
+    def content(self) -> OrderedDict:
+        return OrderedDict([('rows', self.rows), ('groups', self.groups)])
+
+    @staticmethod
+    def stringify(entry):
+        out = "PUT: {0} values (sparse)".format(entry['count'])
+        return [out]
+
 class ExtensionBlock(Block):
     __slots__ = ['cols', 'rows', 'meta']
     def __init__(self, cols: DataFrame, rows: DataFrame):
@@ -208,33 +498,62 @@ class ExtensionBlock(Block):
         shape.append(self.rows.shape if rows is not None else None)
         self.meta = {
             'class': 'extend',
-            'shape': shape
+            'shape': shape,
+            'columns': label_list(cols.columns) if cols is not None else [],
+            'bounds': index_bounds(rows.index) if rows is not None else None
         }
     
     def write(self, writer: DeltaWriter) -> None:
-        chunks = []
+        codec = choose_frame_codec(self.cols, self.rows)
 
         if self.cols is not None:
-            fastparquet.write('null', self.cols, open_with=lambda *ignore: writer)
+            codec.write(self.cols, writer)
             writer.next()
 
         if self.rows is not None:
-            fastparquet.write('null', self.rows, open_with=lambda *ignore: writer)
+            codec.write(self.rows, writer)
             writer.next()
 
+        self.meta['codec'] = codec.name
         self.meta['chunk'] = writer.push()
     
     @staticmethod
-    def parse(meta: dict, reader: DeltaReader) -> Tuple[DataFrame, None]:
+    def parse(meta: dict, reader: PartitionReader, columns: set = None) -> Tuple[DataFrame, None]:
         cols, rows = None, None
         if meta['shape'][0] is not None:
-            cols = Block.parse(meta, reader)[0]
+            cols = Block.parse(meta, reader, columns)[0]
+            if cols.shape[1] == 0:
+                cols = None
             reader.next()
         if meta['shape'][1] is not None:
-            rows = Block.parse(meta, reader)[0]
+            rows = Block.parse(meta, reader, columns)[0]
 
         return cols, rows
 
+    # column extensions without requested columns and row extensions
+    # without requested rows are skipped
+    @staticmethod
+    def skip(meta: dict, columns: set = None, rows: 'RowSlice' = None) -> bool:
+        if meta['shape'][0] is None:
+            return rows is not None and not rows.overlaps(meta.get('bounds'))
+        if meta['shape'][1] is not None or meta.get('columns') is None:
+            return False
+
+        return columns is not None and not any(col in columns for col in meta['columns'])
+
+    # (extended columns are kept even if none of their rows are resolved)
+    @staticmethod
+    def select(meta: dict, obj: Tuple[DataFrame, None], rows: 'RowSlice') -> Tuple[DataFrame, None]:
+        cols, rows_obj = obj
+        if cols is not None:
+            cols = rows.select(cols)
+        if rows_obj is not None:
+            rows_obj = rows.select(rows_obj)
+            if rows_obj.shape[0] == 0:
+                rows_obj = None
+
+        return cols, rows_obj
+
     @staticmethod
     def apply(meta: dict, obj: Tuple[DataFrame, None], data: DataFrame) -> DataFrame:
         cols, rows = obj
@@ -244,6 +563,36 @@ class ExtensionBlock(Block):
             data = pandas.concat([data, rows], axis=0)
 
         return data
+
+    @staticmethod
+    def operations(meta: dict, obj: Tuple[DataFrame, None], data: DataFrame) -> List['Operation']:
+        cols, rows = obj
+        opers = []
+        if cols is not None:
+            opers.append(op.Extend(cols, axis=1))
+        if rows is not None:
+            opers.append(op.Extend(rows, axis=0))
+
+        return opers
+
+    # appended rows and columns are hashed when the digest is refreshed
+    # (empty leaves keep column positions of digest aligned with axes)
+    @staticmethod
+    def touch(meta: dict, obj: Tuple[DataFrame, None], axes: List[Index], digest: Digest) -> List[Index]:
+        cols, rows = obj
+        axes = list(axes)
+        if cols is not None:
+            digest.add_columns(cols.shape[1])
+            axes[1] = axes[1].append(cols.columns)
+        if rows is not None:
+            digest.add_rows(len(axes[0]))
+            axes[0] = axes[0].append(rows.index)
+
+        return axes
+
+    @property # block contents in parsed form
+    def content(self) -> Tuple[DataFrame, None]:
+        return self.cols, self.rows
     
     @staticmethod
     def stringify(entry):
@@ -260,6 +609,7 @@ class ExtensionBlock(Block):
 block_map = {
     'axis': AxisBlock,
     'put': PutBlock,
+    'sparse': SparsePutBlock,
     'extend': ExtensionBlock
 }
 
@@ -0,0 +1,118 @@
+import pandas
+import threading
+from collections import OrderedDict
+from typing import Union, Tuple
+import deltaflow
+from deltaflow.hash import Digest
+
+DataFrame = pandas.DataFrame
+
+# In-process LRU cache of resolved DataFrames keyed by node_id (safe to
+# use from several threads)
+class FrameCache:
+    def __init__(self, budget: int = None):
+        self._budget = budget
+        self._frames = OrderedDict()
+        self._lock = threading.RLock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property # memory budget in bytes (defaults to 'cache_size' option)
+    def budget(self) -> int:
+        if self._budget is None:
+            return deltaflow.get_option('cache_size')
+        return self._budget
+
+    @budget.setter
+    def budget(self, val: int) -> None:
+        with self._lock:
+            self._budget = val
+            self._evict()
+
+    # return copy of cached data (frames are updated in place on resolve)
+    def get(self, node_id: str) -> Union[DataFrame, None]:
+        with self._lock:
+            if node_id not in self._frames:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._frames.move_to_end(node_id)
+            data = self._frames[node_id][0]
+
+        return data.copy()
+
+    # return copy of cached scheme 2 digest of node (if any)
+    def digest(self, node_id: str) -> Union[Digest, None]:
+        with self._lock:
+            if node_id not in self._frames or self._frames[node_id][1] is None:
+                return None
+
+            return self._frames[node_id][1].copy()
+
+    # cache data of node, data must not be modified in place afterwards
+    def put(self, node_id: str, data: DataFrame, digest: Digest = None) -> None:
+        with self._lock:
+            if node_id in self._frames:
+                self._frames.move_to_end(node_id)
+                if digest is not None:
+                    entry = self._frames[node_id]
+                    self._frames[node_id] = (entry[0], digest, entry[2])
+                return
+
+        nbytes = int(data.memory_usage(index=True, deep=True).sum())
+        if nbytes > self.budget:
+            return
+
+        with self._lock:
+            if node_id in self._frames:
+                return
+            self._frames[node_id] = (data, digest, nbytes)
+            self.size += nbytes
+            self._evict()
+
+    # return (position, data, digest) of deepest cached node in timeline
+    def deepest(self, timeline: list) -> Tuple[int, Union[DataFrame, None], Union[Digest, None]]:
+        with self._lock:
+            for i in reversed(range(len(timeline))):
+                if timeline[i] in self._frames:
+                    return i, self.get(timeline[i]), self.digest(timeline[i])
+
+            self.misses += 1
+        return -1, None, None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self.size = 0
+
+    # drop least recently used frames until size is within budget
+    def _evict(self) -> None:
+        while self._frames and self.size > self.budget:
+            _, (_, _, nbytes) = self._frames.popitem(last=False)
+            self.size -= nbytes
+            self.evictions += 1
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': self.size,
+            'count': len(self._frames)
+        }
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __str__(self):
+        out = "FrameCache({0} frames, {1} of {2} bytes)"
+        return out.format(len(self._frames), self.size, self.budget)
+
+    __repr__ = __str__
@@ -0,0 +1,191 @@
+import json
+import struct
+import numpy
+import pandas
+import fastparquet
+from fastparquet.compression import compressions
+from collections import OrderedDict
+from typing import TypeVar, Dict
+import deltaflow
+
+DataFrame = pandas.DataFrame
+PartitionReader = TypeVar('PartitionReader')
+DeltaWriter = TypeVar('DeltaWriter')
+
+# Parquet file per partition, optionally compressed
+class ParquetCodec:
+    def __init__(self, name: str, compression: str = None):
+        self.name = name
+        self.compression = compression
+
+    @property
+    def available(self) -> bool:
+        return self.compression is None or self.compression in compressions
+
+    def write(self, data: DataFrame, writer: DeltaWriter) -> None:
+        fastparquet.write('null', data, compression=self.compression,
+            open_with=lambda *ignore: writer)
+
+    def read(self, reader: PartitionReader, columns: set = None) -> DataFrame:
+        # (pages are decoded from views of the mapped file, without copies)
+        reader = reader.views()
+        obj = fastparquet.ParquetFile('null', open_with=lambda *ignore: reader)
+        reader.seek(0)
+        if columns is not None:
+            names = set(str(col) for col in columns)
+            columns = [col for col in obj.columns if col in names]
+        obj = obj.to_pandas(columns=columns)
+        # convert None values back to numpy.nan
+        obj = obj.fillna(value=numpy.nan)
+        # set index name back to None if index name is default
+        if obj.index.name == 'index':
+            obj.index.name = None
+
+        return obj
+
+# Uncompressed NumPy buffers of index and columns preceded by a JSON header
+# (numeric, boolean and datetime data with JSON serializable labels only)
+class NumpyCodec:
+    name = 'numpy'
+    available = True
+
+    @staticmethod
+    def supports(data: DataFrame) -> bool:
+        if isinstance(data.index, pandas.MultiIndex):
+            return False
+        if isinstance(data.columns, pandas.MultiIndex):
+            return False
+        
+        dtypes = [data.index.dtype] + list(data.dtypes)
+        for dt in dtypes:
+            if not isinstance(dt, numpy.dtype) or dt.kind not in 'biufcmM':
+                return False
+        try:
+            json.dumps([data.index.name] + data.columns.tolist())
+        except TypeError:
+            return False
+
+        return True
+
+    def write(self, data: DataFrame, writer: DeltaWriter) -> None:
+        arrays = [data.index.to_numpy()]
+        arrays += [data.iloc[:, j].to_numpy() for j in range(data.shape[1])]
+        header = {
+            'rows': data.shape[0],
+            'name': data.index.name,
+            'columns': data.columns.tolist(),
+            'dtypes': [arr.dtype.str for arr in arrays]
+        }
+        header = json.dumps(header).encode('utf-8')
+
+        writer.write(struct.pack('q', len(header)))
+        writer.write(header)
+        for arr in arrays:
+            writer.write(numpy.ascontiguousarray(arr).tobytes())
+
+    def read(self, reader: PartitionReader, columns: set = None) -> DataFrame:
+        view = reader.view
+        size = struct.unpack('q', view[:8])[0]
+        header = json.loads(bytes(view[8:8 + size]).decode('utf-8'))
+        # index is read along with requested columns
+        labels = [None] + header['columns']
+        keep = [i == 0 or columns is None or labels[i] in columns 
+            for i in range(len(labels))]
+
+        arrays = []
+        offset = 8 + size
+        for i, dt in enumerate(header['dtypes']):
+            dt = numpy.dtype(dt)
+            if keep[i]: # copy out of mapped file so it can be closed after parsing
+                arrays.append(numpy.frombuffer(view, dt, header['rows'], offset).copy())
+            offset += dt.itemsize * header['rows']
+        view.release()
+
+        index = pandas.Index(arrays[0], name=header['name'])
+        obj = OrderedDict(zip(range(len(arrays) - 1), arrays[1:]))
+        obj = pandas.DataFrame(obj, index=index)
+        obj.columns = pandas.Index([labels[i] for i in range(1, len(labels)) if keep[i]])
+
+        return obj
+
+# Archive of named arrays, optionally zlib compressed
+class ArchiveCodec:
+    available = True
+    def __init__(self, name: str, compressed: bool):
+        self.name = name
+        self.compressed = compressed
+
+    def write(self, payload: Dict[str, numpy.ndarray], writer: DeltaWriter) -> None:
+        if self.compressed:
+            numpy.savez_compressed(writer, **payload)
+        else:
+            numpy.savez(writer, **payload)
+
+    def read(self, reader: PartitionReader) -> Dict[str, numpy.ndarray]:
+        return numpy.load(reader, allow_pickle=True)
+
+# codecs of DataFrame payloads (put & extend blocks)
+frame_codecs = {
+    'numpy': NumpyCodec(),
+    'parquet': ParquetCodec('parquet'),
+    'parquet-snappy': ParquetCodec('parquet-snappy', 'SNAPPY'),
+    'parquet-gzip': ParquetCodec('parquet-gzip', 'GZIP'),
+    'parquet-zstd': ParquetCodec('parquet-zstd', 'ZSTD'),
+    'parquet-lz4': ParquetCodec('parquet-lz4', 'LZ4'),
+    'parquet-brotli': ParquetCodec('parquet-brotli', 'BROTLI')
+}
+
+# codecs of array payloads (axis blocks)
+array_codecs = {
+    'numpy': ArchiveCodec('numpy', compressed=False),
+    'npz': ArchiveCodec('npz', compressed=True)
+}
+
+# codecs of blocks written before codecs were recorded in block meta
+legacy_codecs = {
+    'frame': 'parquet',
+    'array': 'npz'
+}
+
+def get_codec(name: str, kind: str = 'frame'):
+    codecs = frame_codecs if kind == 'frame' else array_codecs
+    if name not in codecs:
+        raise ValueError("unknown {0} codec '{1}'".format(kind, name))
+
+    codec = codecs[name]
+    if not codec.available:
+        err_msg = "codec '{0}' requires compression library for {1}"
+        raise ValueError(err_msg.format(name, codec.compression))
+    
+    return codec
+
+# return codec recorded in block meta (legacy codec if none recorded)
+def read_codec(meta: dict, kind: str = 'frame'):
+    return get_codec(meta.get('codec', legacy_codecs[kind]), kind)
+
+# pick codec of frame payload from 'codec' option or payload size
+def choose_frame_codec(*frames: DataFrame):
+    frames = [data for data in frames if data is not None]
+    name = deltaflow.get_option('codec')
+    if name is not None:
+        codec = get_codec(name, 'frame')
+        if codec is not frame_codecs['numpy'] or all(map(NumpyCodec.supports, frames)):
+            return codec
+
+    size = sum(int(data.memory_usage(index=True).sum()) for data in frames)
+    if size < deltaflow.get_option('codec_threshold'):
+        if all(map(NumpyCodec.supports, frames)):
+            return frame_codecs['numpy']
+        return frame_codecs['parquet']
+
+    if frame_codecs['parquet-snappy'].available:
+        return frame_codecs['parquet-snappy']
+    return frame_codecs['parquet']
+
+# pick codec of array payload by payload size
+def choose_array_codec(payload: Dict[str, numpy.ndarray]):
+    size = sum(arr.nbytes for arr in payload.values())
+    if size < deltaflow.get_option('codec_threshold'):
+        return array_codecs['numpy']
+    
+    return array_codecs['npz']
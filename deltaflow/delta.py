@@ -1,7 +1,9 @@
 from collections import OrderedDict
+import deltaflow
 import deltaflow.operation as op
-from deltaflow.block import AxisBlock, PutBlock, ExtensionBlock
+from deltaflow.block import AxisBlock, PutBlock, SparsePutBlock, ExtensionBlock, label_list
 import numpy
+from typing import Union
 
 # Record drops & relabels in terms of base indices
 def align(stage: 'Stage', diff: OrderedDict) -> OrderedDict:
@@ -78,24 +80,127 @@ def extract(stage: 'Stage', diff: OrderedDict) -> OrderedDict:
         if diff['relabel'][axis] is not None:
             y = y.set_axis(x._get_axis(axis), axis=axis)
     
-    # check for data type preservation
-    put_values = op.shrink(x, y)
-    y_of_put = y.loc[put_values.index, put_values.columns]
-    dt_pres = (y_of_put.dtypes != put_values.dtypes)
-    dt_pres = y_of_put[dt_pres[dt_pres].index].dtypes
-    dt_pres = dt_pres
+    return record_put(diff, x, y)
+
+# Extract and record insertions & extensions from the operation log: puts
+# are diffed over the cells touched by put operations only and extensions
+# are sliced from the tail of live data. Returns None if operations can not
+# be mapped to base labels (relabeled axes or duplicate base labels).
+def extract_incremental(stage: 'Stage', diff: OrderedDict) -> Union[OrderedDict, None]:
+    if any(diff['relabel'][axis] is not None for axis in (0, 1)):
+        return None
+
+    x, y = stage.base, stage.live
+    if not x.index.is_unique or not x.columns.is_unique:
+        return None
+
+    diff['put'] = None
+    diff['extend'] = [None, None]
+
+    # sorted positions of base labels dropped from live data
+    dropped = []
+    for axis in (0, 1):
+        if diff['drop'][axis] is not None:
+            ix = x._get_axis(axis).get_indexer(diff['drop'][axis])
+            dropped.append(numpy.sort(ix[ix != -1]))
+        else:
+            dropped.append(numpy.array([], dtype=numpy.intp))
+
+    # extract any extensions from tail of y
+    n_rows = x.shape[0] - dropped[0].shape[0]
+    n_cols = x.shape[1] - dropped[1].shape[0]
+    if y.shape[0] > n_rows:
+        diff['extend'][0] = y.iloc[n_rows:]
+    if y.shape[1] > n_cols:
+        diff['extend'][1] = y.iloc[:n_rows, n_cols:]
+
+    # labels touched by puts
+    touched = [[], []]
+    for oper in stage.iter_operations():
+        if oper.id == 'put':
+            touched[0].append(oper.y.index)
+            touched[1].append(oper.y.columns)
+    if len(touched[0]) == 0:
+        return diff
+
+    # positions of touched labels in x and (shifted by drops) in y
+    x_pos, y_pos = [], []
+    for axis in (0, 1):
+        labels = touched[axis][0].append(touched[axis][1:]).unique()
+        ix = x._get_axis(axis).get_indexer(labels)
+        ix = numpy.setdiff1d(ix[ix != -1], dropped[axis])
+        x_pos.append(ix)
+        y_pos.append(ix - numpy.searchsorted(dropped[axis], ix))
+
+    x = x.iloc[x_pos[0], x_pos[1]]
+    y = y.iloc[y_pos[0], y_pos[1]]
+    return record_put(diff, x, y)
+
+# record changed cells of aligned x and y as put values
+def record_put(diff: OrderedDict, x: 'DataFrame', y: 'DataFrame') -> OrderedDict:
+    # changed cells and their values
+    mask, _, y_of_put = op.diff(x, y)
+    # check for data type preservation (of columns which can not hold NA)
+    dt_pres = y_of_put.dtypes
+    dt_pres = dt_pres[[dtype.kind in 'iub' for dtype in dt_pres]]
     if len(dt_pres) == 0:
         dt_pres = None
-    if put_values.shape[0] != 0:
-        diff['put'] = (put_values, dt_pres)
+    if mask.any():
+        diff['put'] = (y_of_put, mask, dt_pres)
     
     return diff
 
+# whether put and extension records of two diffs are identical
+def same_diff(a: OrderedDict, b: OrderedDict) -> bool:
+    if (a['put'] is None) != (b['put'] is None):
+        return False
+    if a['put'] is not None:
+        (a_values, a_mask, _), (b_values, b_mask, _) = a['put'], b['put']
+        if not numpy.array_equal(a_mask, b_mask):
+            return False
+        if not a_values.where(a_mask).equals(b_values.where(b_mask)):
+            return False
+    for axis in (0, 1):
+        a_ext, b_ext = a['extend'][axis], b['extend'][axis]
+        if (a_ext is None) != (b_ext is None):
+            return False
+        if a_ext is not None and not a_ext.equals(b_ext):
+            return False
+
+    return True
+
+# whether changed cells of put values are stored as coordinates
+def is_sparse(values: 'DataFrame', mask: numpy.ndarray) -> bool:
+    if label_list(values.columns) is None:
+        return False
+    if not values.columns.is_unique or not values.index.is_unique:
+        return False
+    # cells set to NA are only representable as coordinates
+    if (values.isna().to_numpy() & mask).any():
+        return True
+
+    density = deltaflow.get_option('sparse_density')
+    if density is None:
+        return False
+
+    return mask.sum() <= density * mask.size
+
 # Convert diff entries into their associated blocks
 def build(stage: 'Stage') -> OrderedDict:
     diff = {}
     diff = align(stage, diff)
-    diff = extract(stage, diff)
+    mode = deltaflow.get_option('delta_build')
+    incremental = None
+    if mode != 'full':
+        incremental = extract_incremental(stage, dict(diff))
+    if incremental is None or mode == 'verify':
+        full = extract(stage, dict(diff))
+        if incremental is not None and not same_diff(incremental, full):
+            print("WARNING: incremental delta differs from full difference (using full)")
+            incremental = None
+        diff = full if incremental is None else incremental
+    else:
+        diff = incremental
 
     delta = OrderedDict()
 
@@ -107,7 +212,11 @@ def build(stage: 'Stage') -> OrderedDict:
         relabel_sec = diff['relabel'] if has_relabel else None
         delta['axis'] = AxisBlock(drop_sec, relabel_sec)
     if diff['put'] is not None:
-        delta['put'] = PutBlock(diff['put'][0], dtypes=diff['put'][1])
+        values, mask, dtypes = diff['put']
+        if is_sparse(values, mask):
+            delta['put'] = SparsePutBlock(values, mask, dtypes)
+        else:
+            delta['put'] = PutBlock(values.where(mask), dtypes=dtypes)
     if diff['extend'][0] is not None or diff['extend'][1] is not None:
         delta['extend'] = ExtensionBlock(diff['extend'][1], diff['extend'][0])
 
@@ -66,6 +66,12 @@ class IntegrityError(Error):
     def __init__(self, key, obj_type):
         self.msg = self.msg.format(key, obj_type)
 
+class ReadOnlyError(Error):
+    """raised on attempt to modify an arrow resolved for a subset of data"""
+    msg = "arrow '{0}' is read-only (resolved for a subset of columns or rows)"
+    def __init__(self, name):
+        self.msg = self.msg.format(name)
+
 class SetIndexError(Error):
     """raised on attempt to set index of incorrect length"""
     msg = "expected index of length '{0}', got '{1}'"
@@ -101,6 +107,12 @@ class InformationError(Error):
     def __init__(self, obj, obj_hash):
         self.msg = self.msg.format(obj, obj_hash)
 
+class LineageError(Error):
+    """raised when node is not an ancestor of another node"""
+    msg = "node '{0}' is not an ancestor of node '{1}'"
+    def __init__(self, node_id, descendant_id):
+        self.msg = self.msg.format(node_id, descendant_id)
+
 class IdLookupError(Error):
     """raised when node ID not found in field"""
     msg = "node with ID '{0}' not found"
@@ -143,6 +155,38 @@ class UndoError(Error):
     def __init__(self):
         self.msg = self.msg
 
+class BatchError(Error):
+    """raised when an action is not allowed while a batch is open"""
+    msg = "cannot {0} while a batch is open"
+    def __init__(self, action):
+        self.msg = self.msg.format(action)
+
+class ChunkSchemaError(Error):
+    """raised when a chunk of streamed data does not match the first chunk"""
+    msg = "column labels or data types of chunk {0} differ from first chunk"
+    def __init__(self, position):
+        self.msg = self.msg.format(position)
+
+class DuplicateLabelError(Error):
+    """raised when row labels of streamed chunks repeat"""
+    msg = "row labels of streamed chunks are not unique"
+    def __init__(self):
+        self.msg = self.msg
+
+class HeadMovedError(Error):
+    """raised when arrow head was moved since arrow was loaded"""
+    msg = "arrow '{0}' moved from {1} to {2} since it was loaded"
+    def __init__(self, name, expected, found):
+        self.msg = self.msg.format(name, expected, found)
+
+class LockError(Error):
+    """raised when a lock file could not be acquired in time"""
+    msg = ("could not acquire lock '{0}' within {1} seconds, held by {2} "
+        "(remove {3} if its holder has exited)")
+    def __init__(self, name, timeout, path, holder=None):
+        holder = 'unknown process' if holder is None else "pid {0} on '{1}'".format(*holder)
+        self.msg = self.msg.format(name, timeout, holder, path)
+
 class BlockError(Error):
     """raised on block apply method failure"""
     def __init__(self, msg):
@@ -1,80 +1,254 @@
 import os
 import json
+import mmap
+import time
+import socket
 import struct
+import itertools
+import threading
 import pandas
 import numpy
 import fastparquet
-from typing import Tuple, List, TypeVar, BinaryIO, Callable
+from typing import Tuple, List, TypeVar, BinaryIO, Callable, Union, Iterable
 from collections import OrderedDict
-from deltaflow.errors import NameExistsError
+from contextlib import contextmanager
+import deltaflow
+from deltaflow.errors import NameExistsError, ChunkSchemaError, DuplicateLabelError, LockError
 from deltaflow.block import get_block
+from deltaflow.pack import get_store
+from deltaflow.hash import Digest
 
 BlockObject = TypeVar('DeltaBlock')
 Modifier = Callable[[pandas.DataFrame], pandas.DataFrame]
 
-# Chunk writer for delta files
-class DeltaIO: # masks each block as a seperate file
-    def __init__(self, obj: BinaryIO, chunks: List[Tuple[int]]):
-        self.obj = obj
-        self.chunks = chunks
-        self._cursor = 0
+_tmp_counter = itertools.count()
+
+# name unique to this process, thread and call
+def temp_name() -> str:
+    return '{0}-{1}-{2}'.format(os.getpid(), threading.get_ident(), next(_tmp_counter))
+
+# Return unique path of a temporary file in tmp directory of field
+def temp_path(path: str) -> str:
+    tmp_dir = os.path.join(path, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    return os.path.join(tmp_dir, temp_name())
+
+# Atomically write to target: func writes a temporary file given its path,
+# which is flushed to disk and renamed over target
+def replace_with(path: str, target: str, func: Callable[[str], None]) -> None:
+    tmp_path = temp_path(path)
+    try:
+        func(tmp_path)
+        with open(tmp_path, 'rb+') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, target)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+# atomically write string or bytes content to target
+def write_atomic(path: str, target: str, content: Union[str, bytes]) -> None:
+    def write(tmp_path):
+        with open(tmp_path, 'wb' if isinstance(content, bytes) else 'w') as f:
+            f.write(content)
+
+    replace_with(path, target, write)
+
+# Hold lock file of given name in locks directory of field. The file is
+# created exclusively, waiting up to 'lock_timeout' seconds for its holder
+# (in this or another process) to release it. Lock files record pid and host
+# of their holder; those left by exited processes of this host are broken.
+# Lock files of other hosts are not, and are removed by hand if stale.
+#
+# Shared holders each add an entry to the '<name>.shared' directory instead,
+# then back off while the lock file exists; an exclusive holder creates the
+# lock file, then waits for the shared directory to empty.
+@contextmanager
+def lock(path: str, name: str, shared: bool = False):
+    lock_dir = os.path.join(path, 'locks')
+    shared_dir = os.path.join(lock_dir, name + '.shared')
+    os.makedirs(shared_dir if shared else lock_dir, exist_ok=True)
+    lock_path = os.path.join(lock_dir, name + '.lock')
+    timeout = deltaflow.get_option('lock_timeout')
+    deadline = time.time() + timeout
+    content = '{0} {1}'.format(os.getpid(), socket.gethostname()).encode('utf-8')
+    if shared:
+        entry = os.path.join(shared_dir, socket.gethostname() + '-' + temp_name())
+        while True:
+            with open(entry, 'wb') as f:
+                f.write(content)
+            if not os.path.exists(lock_path):
+                break
+            os.remove(entry)
+            holder = lock_holder(lock_path)
+            if is_stale(lock_path, holder, timeout):
+                break_lock(lock_path, holder)
+                continue
+            if time.time() >= deadline:
+                raise LockError(name, timeout, lock_path, holder)
+            time.sleep(0.005)
+
+        try:
+            yield
+        finally:
+            os.remove(entry)
+        return
+
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            holder = lock_holder(lock_path)
+            if is_stale(lock_path, holder, timeout):
+                break_lock(lock_path, holder)
+                continue
+            if time.time() >= deadline:
+                raise LockError(name, timeout, lock_path, holder)
+            time.sleep(0.005)
+
+    try:
+        os.write(fd, content)
+        os.close(fd)
+        wait_shared(shared_dir, name, timeout, deadline)
+        yield
+    finally:
+        os.remove(lock_path)
+
+# Wait for shared holders of lock to release it, removing entries left by
+# exited processes
+def wait_shared(shared_dir: str, name: str, timeout: float, deadline: float) -> None:
+    while True:
+        try:
+            entries = [os.path.join(shared_dir, entry) for entry in os.listdir(shared_dir)]
+        except FileNotFoundError: # (never shared)
+            return
+        if not entries:
+            return
+        for entry in entries:
+            holder = lock_holder(entry)
+            if is_stale(entry, holder, timeout):
+                try:
+                    os.remove(entry)
+                except FileNotFoundError:
+                    pass
+            elif time.time() >= deadline:
+                raise LockError(name, timeout, entry, holder)
+        time.sleep(0.005)
+
+# Return (pid, host) recorded in lock file (None if missing or not yet written)
+def lock_holder(lock_path: str) -> Union[Tuple[int, str], None]:
+    try:
+        with open(lock_path, 'r') as f:
+            pid, _, host = f.read().partition(' ')
+        return int(pid), host
+    except (FileNotFoundError, ValueError):
+        return None
+
+# Whether lock file was left by an exited process of this host (or was left
+# empty for longer than timeout)
+def is_stale(lock_path: str, holder: Union[Tuple[int, str], None], timeout: float) -> bool:
+    if holder is None:
+        try:
+            return time.time() - os.stat(lock_path).st_mtime > timeout
+        except FileNotFoundError:
+            return False
+
+    pid, host = holder
+    # (signal 0 only checks for the process on POSIX, it kills on Windows)
+    if host != socket.gethostname() or os.name != 'posix':
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError: # (process of another user)
+        return False
+
+    return False
+
+# Remove stale lock file if it still records holder. Waiters breaking the
+# same lock take turns through an exclusive guard file.
+def break_lock(lock_path: str, holder: Union[Tuple[int, str], None]) -> None:
+    guard = lock_path + '.break'
+    try:
+        os.close(os.open(guard, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        time.sleep(0.005)
+        return
+
+    try:
+        if os.path.isfile(lock_path) and lock_holder(lock_path) == holder:
+            os.remove(lock_path)
+    finally:
+        os.remove(guard)
+
+# File-like reader over memory-mapped partitions of a delta file block.
+# Positions are relative to the start of the block (as written), reads
+# end at the upper bound of the current partition.
+class PartitionReader:
+    def __init__(self, buffer: Union[mmap.mmap, memoryview], bounds: List[Tuple[int, int]],
+            copy: bool = True):
+        self.buffer = buffer
+        self.partitions = bounds
+        self.copy = copy
         self._part = 0
+        self._pos = 0
 
-        self.obj.seek(0)
+    @property # absolute bounds of block start to end of current partition
+    def bounds(self) -> Tuple[int, int]:
+        return self.partitions[0][0], self.partitions[self._part][1]
+
+    @property # zero-copy view of current partition's own bytes
+    def view(self) -> memoryview:
+        lower, upper = self.partitions[self._part]
+        return memoryview(self.buffer)[lower:upper]
 
-    @property # index of current chunk
-    def cursor(self) -> int:
-        return self._cursor
-    
-    @cursor.setter # set current chunk
-    def cursor(self, val) -> None:
-        self._cursor = val
-        self._part = 0
-        self.obj.seek(self.bounds[0])
-    
     def seekable(self) -> bool:
         return True
-    
-    # read within (and relative to) current chunk
-    def read(self, n: int = None) -> bytes:
-        bounds = self.bounds
-        if n is None:
-            section = bounds[1] - self.obj.tell()
-        else:
-            limit = bounds[1] - self.obj.tell()
-            section = n if n < limit else limit
-
-        res = self.obj.read(section) 
-        return res
-    
-    # seek within (and relative to) current chunk
-    def seek(self, n: int, mode: int = 0) -> int:
-        bounds = self.bounds
-        if mode == 0: # seek relative to lower bound
-            limit = bounds[1] - bounds[0]
-            mark = bounds[0] + n if n < limit else bounds[1]
-            res = n if n < limit else limit
-            self.obj.seek(mark)
-        elif mode == 1: # seek relative to current position
-            limit = bounds[1] - self.obj.tell()
-            mark = n if n < limit else limit
-            res = self.tell() + mark
-            self.obj.seek(mark, 1)
-        elif mode == 2: # seek relative to upper bound
-            limit = bounds[0] - bounds[1]
-            mark = bounds[1] + n if n > limit else bounds[0]
-            res = n if n > limit else limit
-            self.obj.seek(mark)
 
-        return res
+    # Reader of the same partitions whose reads return views of the buffer
+    # instead of copies. Views must not outlive the delta file.
+    def views(self) -> 'PartitionReader':
+        reader = PartitionReader(self.buffer, self.partitions, copy=False)
+        reader._part, reader._pos = self._part, self._pos
+        return reader
+
+    # read within (and relative to) current partition
+    def read(self, n: int = None) -> Union[bytes, memoryview]:
+        lower, upper = self.bounds
+        start = lower + self._pos
+        stop = upper if n is None or n < 0 else min(start + n, upper)
+        self._pos = stop - lower
+
+        if not self.copy:
+            return memoryview(self.buffer)[start:stop]
+        return bytes(self.buffer[start:stop])
+
+    # seek within (and relative to) current partition
+    def seek(self, n: int, mode: int = 0) -> int:
+        lower, upper = self.bounds
+        if mode == 0:
+            pos = n
+        elif mode == 1:
+            pos = self._pos + n
+        elif mode == 2:
+            pos = upper - lower + n
+        
+        self._pos = min(max(pos, 0), upper - lower)
+        return self._pos
 
-    # get file location relative to chunk bounds
     def tell(self) -> int:
-        mark = self.obj.tell() - self.bounds[0]
-        return mark
-    
-    def flush(self) -> None:
-        self.obj.flush()
+        return self._pos
+
+    # shift to next partition in current block
+    def next(self) -> None:
+        self._part += 1
+        self._pos = 0
+
+    def close(self) -> None:
+        pass
 
     # return self inside of external with statement
     def __enter__(self, *ignore): # (instead of actual file)
@@ -84,75 +258,65 @@ class DeltaIO: # masks each block as a seperate file
     def __exit__(self, *ignore):
         pass
 
-class DeltaReader(DeltaIO):
-    def __init__(self, obj: BinaryIO, chunks: List[Tuple[int]]):
-        super().__init__(obj, chunks)
-
-    # TODO: change this to cache    
-    @property
-    def bounds(self) -> Tuple[int]:
-        chunk_start = sum(sum(i) for i in self.chunks[:self._cursor])
-        block = self.chunks[self._cursor]
+# Chunk writer for delta files: masks each block as a seperate file whose
+# positions are relative to the start of the block
+class DeltaWriter:
+    def __init__(self, obj: BinaryIO):
+        self.obj = obj
+        self.chunks = []
+        self.queue = []
+        self._cursor = 0
+        self._start = 0
 
-        lower = chunk_start + sum(block[:self._part])
-        upper = lower + sum(block[:self._part + 1])
+        self.obj.seek(0)
 
-        return lower, upper
+    @property # index of current chunk
+    def cursor(self) -> int:
+        return self._cursor
+    
+    @cursor.setter # start next chunk at end of file
+    def cursor(self, val) -> None:
+        self._cursor = val
+        self.obj.seek(0, os.SEEK_END)
+        self._start = self.obj.tell()
 
-    # shift to next partition in current chunk
-    def next(self) -> None:
-        self._part += 1
-        self.obj.seek(self.bounds[0])
+    def seekable(self) -> bool:
+        return True
 
-class DeltaWriter(DeltaIO):
-    def __init__(self, obj: BinaryIO):
-        self.queue = []
-        super().__init__(obj, chunks=[])
+    def read(self, n: int = -1) -> bytes:
+        return self.obj.read(n)
 
     # override for standard write method
     def write(self, content: bytes) -> int:
         res = self.obj.write(content)
         return res
 
-    # TODO: change this to cached
-    @property # chunk bounds
-    def bounds(self) -> Tuple[int, int]:
-        chunk_start = sum(sum(i) for i in self.chunks[:self._cursor])
-
-        if self._part == len(self.queue):
-            lower = chunk_start
-            upper = None
-        else:
-            lower = chunk_start + sum(self.queue[:-1])
-            upper = lower + self.queue[-1]
-        
-        return lower, upper
-    
-    # if currently writing partition, override base class method
+    # seek relative to chunk start, current position or end of partition
     def seek(self, n: int, mode: int = 0) -> int:
-        if self._part == len(self.queue): # no upper limits
-            bounds = self.bounds
-            if mode == 0:
-                mark = bounds[0] + n
-                res = n
-                self.obj.seek(mark)
-            elif mode == 1:
-                res = self.tell() + n
-                self.obj.seek(n, 1)
-            elif mode == 2:
-                self.obj.seek(n, os.SEEK_END)
-                res = self.tell()
-                if res < 0:
-                    raise OSError('[Errno 22] Invalid argument')
-        else: # revert to DeltaIO.seek
-            res = super().seek(n, mode)
+        if mode == 0:
+            self.obj.seek(self._start + n)
+        elif mode == 1:
+            self.obj.seek(n, os.SEEK_CUR)
+        elif mode == 2:
+            self.obj.seek(n, os.SEEK_END)
+
+        res = self.tell()
+        if res < 0:
+            raise OSError('[Errno 22] Invalid argument')
 
         return res
 
-    # shift to next partition in current chunk
+    # get file location relative to chunk start
+    def tell(self) -> int:
+        return self.obj.tell() - self._start
+
+    def flush(self) -> None:
+        self.obj.flush()
+
+    # end current partition, recording its end offset within the chunk
     def next(self) -> None:
         self.obj.seek(0, os.SEEK_END)
-        offset = self.obj.tell() - self.bounds[0]
+        offset = self.obj.tell() - self._start
         self.queue.append(offset)
     
     # add queue to chunks, reset queue, return chunk
@@ -163,89 +327,300 @@ class DeltaWriter(DeltaIO):
 
         return chunk
 
+    # return self inside of external with statement
+    def __enter__(self, *ignore): # (instead of actual file)
+        return self
+
+    # prevents closing inside of external with statement
+    def __exit__(self, *ignore):
+        pass
+
 class DeltaFile:
     def __init__(self, path: str, node_id: str):
         self.path = os.path.join(path, 'deltas', node_id + '.delta')
+        self._root = path
+        self._id = node_id
+        self._buffer = None
         self.meta = self.read_meta()
+        self.bounds = self.read_bounds()
+
+    @property # loose delta file (or view of packed delta) mapped on first access
+    def buffer(self) -> Union[mmap.mmap, memoryview]:
+        if self._buffer is None:
+            try:
+                with open(self.path, 'rb') as delta_file:
+                    self._buffer = mmap.mmap(
+                        delta_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except FileNotFoundError:
+                try:
+                    self._buffer = get_store(self._root).view('delta', self._id)
+                except KeyError:
+                    raise FileNotFoundError(self.path)
+        
+        return self._buffer
 
     # Return individual block of delta file given key
     def read_block(self, i: int) -> BlockObject:
-        meta = self.meta
-        chunks = [tuple(meta[key]['chunk']) for key in meta]
-        key = list(meta)[i]
-        block = get_block(meta[key]['class'])
-        with open(self.path, 'rb') as delta_file:
-            reader = DeltaReader(delta_file, chunks)
-            reader.cursor = i
-            obj = block.parse(meta[key], reader)
+        key = list(self.meta)[i]
+        block = get_block(self.meta[key]['class'])
+        reader = PartitionReader(self.buffer, self.bounds[i])
         
-        return obj
+        return block.parse(self.meta[key], reader)
 
-    # Yields key, block pairs on each iteration given delta file
+    # Yields modifier of each block on each iteration given delta file
     def iter_blocks(self) -> Modifier:
-        meta = self.meta
-        chunks = [meta[key]['chunk'] for key in meta]
-        with open(self.path, 'rb') as delta_file:
-            reader = DeltaReader(delta_file, chunks)
-            # block generator
-            i = 0
-            for key in meta:
-                reader.cursor = i
-                block = get_block(meta[key]['class'])
-                obj = block.parse(meta[key], reader)
-                
-                modifier = lambda df: block.apply(meta[key], obj, df)
-                yield modifier
-
-                i += 1
+        for block, meta, obj in self.parse_blocks():
+            modifier = lambda df: block.apply(meta, obj, df)
+            yield modifier
+
+    # Yields block class, meta and parsed object of each block (blocks not
+    # touching any of given columns or rows are skipped)
+    def parse_blocks(self, columns: set = None, 
+            rows: 'RowSlice' = None) -> Tuple[BlockObject, dict, object]:
+        for i, key in enumerate(self.meta):
+            block = get_block(self.meta[key]['class'])
+            if block.skip(self.meta[key], columns, rows):
+                continue
+            reader = PartitionReader(self.buffer, self.bounds[i])
+            obj = block.parse(self.meta[key], reader, columns)
+            if rows is not None:
+                obj = block.select(self.meta[key], obj, rows)
+
+            yield block, self.meta[key], obj
 
     # Read chunk meta data of a delta file
     def read_meta(self) -> OrderedDict:
-        with open(self.path, 'rb') as delta_file:
-            # seek to last 8 bytes to read tail (size of meta in bytes)
-            delta_file.seek(-8, os.SEEK_END) 
-            tail = struct.unpack('q', delta_file.read())[0]
-            # decode meta from (-tail - 8, -8) bytes of deltafile
-            delta_file.seek(-tail - 8, os.SEEK_END)
-            meta = delta_file.read(tail).decode('utf-8')
-            meta = json.loads(meta, object_pairs_hook=OrderedDict)
+        buffer = self.buffer
+        # read tail from last 8 bytes (size of meta in bytes)
+        tail = struct.unpack('q', buffer[-8:])[0]
+        # decode meta from (-tail - 8, -8) bytes of deltafile
+        meta = bytes(buffer[-tail - 8:-8]).decode('utf-8')
+        meta = json.loads(meta, object_pairs_hook=OrderedDict)
 
         return meta
 
+    # Compute absolute (lower, upper) bounds of partitions of each block.
+    # Chunk entries are partition end offsets relative to the start of
+    # their block.
+    def read_bounds(self) -> List[List[Tuple[int, int]]]:
+        bounds = []
+        start = 0
+        for key in self.meta:
+            ends = [start + end for end in self.meta[key]['chunk']]
+            bounds.append(list(zip([start] + ends[:-1], ends)))
+            start = ends[-1]
+
+        return bounds
+
+    def close(self) -> None:
+        if isinstance(self._buffer, memoryview):
+            self._buffer.release()
+        elif self._buffer is not None:
+            self._buffer.close()
+        self._buffer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *ignore):
+        self.close()
+
 # Iterates through delta blocks, write delta file
 def write_delta(path: str, node_id: str, delta: OrderedDict):
     fpath = os.path.join(path, 'deltas', node_id + '.delta')
-    meta = OrderedDict()
-    with open(fpath, 'wb') as delta_file:
-        writer = DeltaWriter(delta_file)
-        for key in delta:
-            # call write method of each block -> writes partitions to queue
-            block = delta[key]
-            block.write(writer)
-            # write block meta to meta list
-            meta[key] = delta[key].meta
-
-            writer.cursor += 1
-
-        # convert meta to utf-8 encoded JSON string
-        meta = json.dumps(meta).encode('utf-8')
-        # write encoded meta size into 8-byte long long struct
-        tail = struct.pack('q', len(meta))
-        # write meta followed by tail
-        writer.write(meta)
-        writer.write(tail)
+    def write(tmp_path):
+        meta = OrderedDict()
+        with open(tmp_path, 'wb') as delta_file:
+            writer = DeltaWriter(delta_file)
+            for key in delta:
+                # call write method of each block -> writes partitions to queue
+                block = delta[key]
+                block.write(writer)
+                # write block meta to meta list
+                meta[key] = delta[key].meta
+
+                writer.cursor += 1
+
+            # convert meta to utf-8 encoded JSON string
+            meta = json.dumps(meta).encode('utf-8')
+            # write encoded meta size into 8-byte long long struct
+            tail = struct.pack('q', len(meta))
+            # write meta followed by tail
+            writer.write(meta)
+            writer.write(tail)
+
+    replace_with(path, fpath, write)
 
 def write_origin(path: str, name: str, data: pandas.DataFrame):
     origin_path = os.path.join(path, name + '.origin')
     if os.path.isfile(origin_path):
         raise NameExistsError('origin', name)
     
-    fastparquet.write(origin_path, data)
+    replace_with(os.path.join(path, '.deltaflow'), origin_path, 
+        lambda tmp_path: fastparquet.write(tmp_path, data, 
+            row_group_offsets=deltaflow.get_option('row_group_size')))
+
+# Write origin from consecutive chunks of rows to a temporary file (moved
+# into place by the caller) as row groups of at most 'row_group_size' rows.
+# Each chunk is passed to func before it is written, which returns False if
+# the chunk does not match the preceding ones. A range index is stored as
+# start and step of the first chunk, so range indexes of later chunks are
+# relabeled to continue it; other row labels must be unique across chunks.
+def write_origin_stream(path: str, name: str, chunks: Iterable[pandas.DataFrame], 
+        func: Callable) -> str:
+    origin_path = os.path.join(path, name + '.origin')
+    if os.path.isfile(origin_path):
+        raise NameExistsError('origin', name)
+
+    tmp_path = temp_path(os.path.join(path, '.deltaflow'))
+    size = deltaflow.get_option('row_group_size')
+    range_index = None # (start, step) of range index of first chunk
+    labels = []
+    nrows = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            if i == 0 and isinstance(chunk.index, pandas.RangeIndex):
+                range_index = (chunk.index.start, chunk.index.step)
+            if range_index is not None:
+                if not isinstance(chunk.index, pandas.RangeIndex):
+                    raise ChunkSchemaError(i)
+                chunk = continue_range(chunk, range_index, nrows)
+            else:
+                labels.append(chunk.index)
+            if not func(chunk):
+                raise ChunkSchemaError(i)
+            fastparquet.write(tmp_path, chunk, row_group_offsets=size, append=i > 0)
+            nrows += chunk.shape[0]
+
+        if len(labels) > 0 and not labels[0].append(labels[1:]).is_unique:
+            raise DuplicateLabelError()
+    except:
+        if os.path.isfile(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if not os.path.isfile(tmp_path):
+        raise ValueError('no chunks of data to write')
+
+    return tmp_path
+
+# Return chunk (without copying its data) with range index continuing range
+# of given (start, step) after nrows rows
+def continue_range(chunk: pandas.DataFrame, range_index: Tuple[int, int], 
+        nrows: int) -> pandas.DataFrame:
+    start, step = range_index
+    index = pandas.RangeIndex(start + nrows * step, 
+        start + (nrows + chunk.shape[0]) * step, step, name=chunk.index.name)
+    if index.equals(chunk.index):
+        return chunk
 
-def load_origin(path: str, name: str) -> pandas.DataFrame:
+    chunk = chunk.copy(deep=False)
+    chunk.index = index
+    return chunk
+
+# Iterate chunks of rows of a CSV file (by 'chunksize' rows) or of a parquet
+# file (by row group). Row groups of a parquet file stored with a range index
+# are read with ranges starting at 0, which are relabeled by row position.
+def iter_file_chunks(path: str, chunksize: int, **kwargs) -> Iterable[pandas.DataFrame]:
+    if path.lower().endswith('.csv'):
+        for chunk in pandas.read_csv(path, chunksize=chunksize, **kwargs):
+            yield chunk
+        return
+
+    obj = fastparquet.ParquetFile(path)
+    pandas_meta = json.loads(obj.key_value_metadata.get('pandas', '{}'))
+    index_columns = pandas_meta.get('index_columns', [])
+    range_index = None
+    if len(index_columns) == 1 and isinstance(index_columns[0], dict):
+        range_index = (index_columns[0]['start'], index_columns[0]['step'])
+    nrows = 0
+    for chunk in obj.iter_row_groups(**kwargs):
+        if range_index is not None:
+            chunk = continue_range(chunk, range_index, nrows)
+        elif chunk.index.name == 'index':
+            chunk.index.name = None
+        nrows += chunk.shape[0]
+        yield chunk
+
+def load_origin(path: str, name: str, columns: set = None, 
+        rows: 'RowSlice' = None) -> pandas.DataFrame:
     origin_path = os.path.join(
         os.path.dirname(path), name + '.origin')
-    data = fastparquet.ParquetFile(origin_path).to_pandas()
+
+    return read_parquet(origin_path, columns, rows)
+
+# Write materialized snapshot of node data to checkpoints directory
+def write_checkpoint(path: str, node_id: str, data: pandas.DataFrame):
+    checkpoint_dir = os.path.join(path, 'checkpoints')
+    os.makedirs(checkpoint_dir, exist_ok=True)
+
+    replace_with(path, os.path.join(checkpoint_dir, node_id), 
+        lambda tmp_path: fastparquet.write(tmp_path, data, 
+            row_group_offsets=deltaflow.get_option('row_group_size')))
+
+def load_checkpoint(path: str, node_id: str, columns: set = None, 
+        rows: 'RowSlice' = None) -> pandas.DataFrame:
+    checkpoint_path = os.path.join(path, 'checkpoints', node_id)
+    return read_parquet(checkpoint_path, columns, rows)
+
+# Return node ids of checkpoints ordered from oldest to newest
+def list_checkpoints(path: str) -> List[str]:
+    checkpoint_dir = os.path.join(path, 'checkpoints')
+    if not os.path.isdir(checkpoint_dir):
+        return []
+
+    entries = os.scandir(checkpoint_dir)
+    entries = sorted(entries, key=lambda entry: entry.stat().st_mtime)
+    return [entry.name for entry in entries]
+
+# Remove oldest checkpoints until at most 'retain' remain
+def prune_checkpoints(path: str, retain: int) -> List[str]:
+    checkpoints = list_checkpoints(path)
+    removed = checkpoints[:max(len(checkpoints) - retain, 0)]
+    for node_id in removed:
+        os.remove(os.path.join(path, 'checkpoints', node_id))
+
+    return removed
+
+# Write scheme 2 index and column roots of node data to digests directory
+def write_digest(path: str, node_id: str, digest: Digest, columns: pandas.Index):
+    digest_dir = os.path.join(path, 'digests')
+    os.makedirs(digest_dir, exist_ok=True)
+
+    roots = {
+        'labels': digest.labels.decode('utf-8'),
+        'index': digest.index_root().hex(),
+        'columns': [[str(col), digest.column_root(j).hex()] 
+            for j, col in enumerate(columns)]
+    }
+    write_atomic(path, os.path.join(digest_dir, node_id), json.dumps(roots))
+
+# Return stored roots of node data (None if node has none)
+def load_digest(path: str, node_id: str) -> Union[dict, None]:
+    try:
+        with open(os.path.join(path, 'digests', node_id), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+# Read parquet file (only given columns and row groups whose index
+# statistics may hold given rows). Range indexes are stored as metadata
+# rather than as a column, so they have no statistics: all row groups of
+# such files are read and rows are selected by the caller.
+def read_parquet(path: str, columns: set = None, 
+        rows: 'RowSlice' = None) -> pandas.DataFrame:
+    obj = fastparquet.ParquetFile(path)
+    if columns is not None:
+        # (parquet column names are strings)
+        names = set(str(col) for col in columns)
+        columns = [col for col in obj.columns if col in names]
+    filters = []
+    if rows is not None:
+        pandas_meta = json.loads(obj.key_value_metadata.get('pandas', '{}'))
+        index_columns = pandas_meta.get('index_columns', [])
+        if len(index_columns) == 1 and isinstance(index_columns[0], str):
+            filters = rows.filters(index_columns[0])
+    data = obj.to_pandas(columns=columns, filters=filters)
     if data.index.name == 'index':
         data.index.name = None
     data = data.fillna(value=numpy.nan)
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import shutil
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+import deltaflow.fs as fs
+from deltaflow.pack import get_store, write_pack
+
+# Mark node ids reachable from given roots through node lineages. A walk
+# stops at the first marked ancestor (whose lineage is already marked),
+# so each node is visited once.
+def mark(tree: 'Tree', roots: Iterable[str]) -> set:
+    reachable = set()
+    for node_id in roots:
+        if node_id in reachable or node_id not in tree.nodes:
+            continue
+
+        lineage = [node_id] + tree.nodes[node_id].get('lineage', [])
+        for ancestor in lineage:
+            if ancestor in reachable:
+                break
+            reachable.add(ancestor)
+
+    return reachable
+
+# Collect objects of tree not reachable from its arrows. Objects modified
+# within 'grace' seconds (and their ancestors) are kept. Garbage is moved
+# to 'archive' directory if given, otherwise deleted. Returns counts of
+# garbage objects per kind and total bytes reclaimed (or reclaimable if
+# dry_run). The objects lock of the field is held exclusively throughout;
+# commits and other writers of nodes, deltas and arrow heads share it.
+def collect(tree: 'Tree', dry_run: bool = False, grace: float = None,
+        archive: str = None) -> OrderedDict:
+    with fs.lock(tree.path, 'objects'):
+        return sweep(tree, dry_run, grace, archive)
+
+def sweep(tree: 'Tree', dry_run: bool = False, grace: float = None,
+        archive: str = None) -> OrderedDict:
+    now = time.time()
+    recent = lambda path: grace is not None and now - os.stat(path).st_mtime < grace
+    store = get_store(tree.path)
+    store.refresh()
+    nodes_dir = os.path.join(tree.path, 'nodes')
+    deltas_dir = os.path.join(tree.path, 'deltas')
+
+    # recently written nodes are roots along with arrow heads
+    roots = [node_id for _, node_id in tree.arrows.items()]
+    roots += [key for key in os.listdir(nodes_dir)
+        if recent(os.path.join(nodes_dir, key))]
+    recent_packs = set(pack.path for pack in store.packs if recent(pack.path + '.pack'))
+    for pack in store.packs:
+        if pack.path in recent_packs:
+            roots += list(pack.keys('node'))
+    reachable = mark(tree, roots)
+
+    squashes = tree._read_squashes()
+    dead_squashes = [key for key, (from_id, to_id) in squashes.items()
+        if from_id not in reachable or to_id not in reachable]
+    live_deltas = reachable.union(set(squashes).difference(dead_squashes))
+
+    # loose garbage files as (kind, path)
+    garbage = []
+    for key in os.listdir(nodes_dir):
+        if key not in reachable:
+            garbage.append(('nodes', os.path.join(nodes_dir, key)))
+    for fname in os.listdir(deltas_dir):
+        path = os.path.join(deltas_dir, fname)
+        if fname.endswith('.delta') and fname[:-6] not in live_deltas and not recent(path):
+            garbage.append(('deltas', path))
+    for node_id in fs.list_checkpoints(tree.path):
+        path = os.path.join(tree.path, 'checkpoints', node_id)
+        if node_id not in reachable and not recent(path):
+            garbage.append(('checkpoints', path))
+    digest_dir = os.path.join(tree.path, 'digests')
+    if os.path.isdir(digest_dir):
+        for node_id in os.listdir(digest_dir):
+            if node_id not in reachable:
+                garbage.append(('digests', os.path.join(digest_dir, node_id)))
+
+    origins = tree.origins
+    dead_origins = []
+    for name, node_id in origins.items():
+        path = os.path.join(os.path.dirname(tree.path), name + '.origin')
+        if node_id not in reachable and not (os.path.isfile(path) and recent(path)):
+            dead_origins.append(name)
+            if os.path.isfile(path):
+                garbage.append(('origins', path))
+
+    # packed garbage as (pack, kind, key)
+    live = {'node': reachable, 'delta': live_deltas}
+    packed = []
+    for pack in store.packs:
+        if pack.path not in recent_packs:
+            for kind in ('node', 'delta'):
+                packed += [(pack, kind, key) for key in pack.keys(kind)
+                    if key not in live[kind]]
+
+    report = OrderedDict((kind, 0) for kind in
+        ('nodes', 'deltas', 'origins', 'checkpoints', 'digests'))
+    report['bytes'] = 0
+    for kind, path in garbage:
+        report[kind] += 1
+        report['bytes'] += os.path.getsize(path)
+    for pack, kind, key in packed:
+        report[kind + 's'] += 1
+        report['bytes'] += pack.size(kind, key)
+
+    if dry_run:
+        return report
+
+    if archive is not None:
+        archive_objects(tree, archive, garbage, packed,
+            OrderedDict((name, origins[name]) for name in dead_origins))
+    rewrite_packs(tree, packed)
+    for _, path in garbage:
+        os.remove(path)
+
+    with fs.lock(tree.path, 'origins'):
+        origins = tree.origins
+        for name in dead_origins:
+            origins.pop(name, None)
+        tree.write_origins(origins)
+    tree.remove_squashes(dead_squashes)
+
+    store.refresh()
+    tree.nodes.rebuild()
+    tree.cache.clear()
+
+    return report
+
+# Rewrite packs holding garbage without it
+def rewrite_packs(tree: 'Tree', packed: List[Tuple['Pack', str, str]]) -> None:
+    dead = {}
+    for pack, kind, key in packed:
+        dead.setdefault(pack.path, set()).add((kind, key))
+
+    store = get_store(tree.path)
+    for pack in list(store.packs):
+        if pack.path not in dead:
+            continue
+
+        objects = [(kind, key, pack.read(kind, key)) for kind in ('node', 'delta')
+            for key in pack.keys(kind) if (kind, key) not in dead[pack.path]]
+        if len(objects) > 0:
+            write_pack(tree.path, objects)
+        os.remove(pack.path + '.idx')
+        os.remove(pack.path + '.pack')
+
+# Move garbage into archive directory (laid out like the field directory)
+def archive_objects(tree: 'Tree', archive: str, garbage: List[Tuple[str, str]],
+        packed: List[Tuple['Pack', str, str]], origins: OrderedDict) -> None:
+    for kind in ('nodes', 'deltas', 'checkpoints', 'digests'):
+        os.makedirs(os.path.join(archive, kind), exist_ok=True)
+
+    for kind, path in garbage:
+        folder = archive if kind == 'origins' else os.path.join(archive, kind)
+        shutil.copy2(path, os.path.join(folder, os.path.basename(path)))
+    for pack, kind, key in packed:
+        fname = key + '.delta' if kind == 'delta' else key
+        with open(os.path.join(archive, kind + 's', fname), 'wb') as f:
+            f.write(pack.read(kind, key))
+
+    # archived origins are added to map of previously archived ones
+    path = os.path.join(archive, 'origins')
+    obj = {}
+    if os.path.isfile(path):
+        with open(path, 'r') as f:
+            obj = json.load(f)
+    obj.update(origins)
+    with open(path, 'w') as f:
+        json.dump(obj, f)
@@ -1,6 +1,12 @@
 import hashlib
 import pandas
 import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Callable
+import deltaflow
+
+# rows per leaf of a scheme 2 digest
+CHUNK_ROWS = 2**16
 
 # Return UTF-8 encode name or dataframe column values object
 def colencode(data):
@@ -9,14 +15,30 @@ def colencode(data):
     else:
         return str(data.columns.values).encode('utf-8')
 
+# Map func over items on a pool of 'hash_workers' threads, preserving order
+def pmap(func: Callable, items: list, workers: int = None) -> Iterable:
+    if workers is None:
+        workers = deltaflow.get_option('hash_workers')
+    if workers is None or workers <= 1 or len(items) <= 1:
+        return map(func, items)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
 # Generate SHA1 hash of pandas.DataFrame object
-def hash_data(data):
+def hash_data(data, scheme: int = 1, workers: int = None):
+    if scheme == 2:
+        return Digest().refresh(data, workers).hexdigest()
+
     data_hash = hashlib.sha1()
     data_hash.update(colencode(data)) # p1: data columns
-    data_hash.update( # p2: data content
-        pandas.util.hash_pandas_object(
-            data, index=True).values
-    )
+    # p2: data content (row hashes are independent, so chunks are hashed
+    # concurrently and fed to SHA1 in order)
+    blocks = range(-(-data.shape[0] // CHUNK_ROWS))
+    chunk_hash = lambda block: pandas.util.hash_pandas_object(
+        data.iloc[block * CHUNK_ROWS:(block + 1) * CHUNK_ROWS], index=True).values
+    for values in pmap(chunk_hash, list(blocks), workers):
+        data_hash.update(values)
 
     return data_hash.hexdigest()
 
@@ -33,4 +55,241 @@ def hash_pair(node_hash, data_hash):
     node_id.update(node_hash.encode('utf-8'))
     node_id.update(data_hash.encode('utf-8'))
     
-    return node_id.hexdigest()
\ No newline at end of file
+    return node_id.hexdigest()
+
+# Return hash scheme of a node (nodes without one predate scheme 2)
+def node_scheme(node: dict) -> int:
+    return node.get('scheme', 1)
+
+# SHA1 digest of a slice of rows of a pandas Series or Index
+def hash_leaf(obj, block: int) -> bytes:
+    rows = slice(block * CHUNK_ROWS, (block + 1) * CHUNK_ROWS)
+    part = obj[rows] if isinstance(obj, pandas.Index) else obj.iloc[rows]
+    values = pandas.util.hash_pandas_object(part, index=False).values
+    return hashlib.sha1(values).digest()
+
+# Merkle tree of per-column, per-row-block digests (hash scheme 2)
+class Digest:
+    def __init__(self, data: pandas.DataFrame = None):
+        self.labels = b''
+        self.nrows = 0
+        self.dtypes = []
+        self.index = []
+        self.leaves = []
+        self._dirty = {} # column position -> stale row blocks
+        self._shift = None # first row block stale in every column
+        self._index_dirty = False
+
+        if data is not None:
+            self.refresh(data)
+
+    # mark leaves of cells at given column/row positions as stale
+    def mark_cells(self, columns: Iterable[int], rows: Iterable[int]) -> None:
+        blocks = set(int(row) // CHUNK_ROWS for row in rows if row >= 0)
+        for j in columns:
+            if j >= 0:
+                self._dirty.setdefault(int(j), set()).update(blocks)
+
+    # mark every leaf from the first dropped row onwards as stale
+    def drop_rows(self, rows: Iterable[int]) -> None:
+        rows = [int(row) for row in rows if row >= 0]
+        if len(rows) == 0:
+            return
+
+        block = min(rows) // CHUNK_ROWS
+        if self._shift is None or block < self._shift:
+            self._shift = block
+
+    # add empty leaves of columns appended to data (hashed on refresh)
+    def add_columns(self, count: int) -> None:
+        self.leaves += [[] for _ in range(count)]
+        self.dtypes += [None] * count
+
+    # mark every leaf from position of rows appended to data onwards as stale
+    def add_rows(self, start: int) -> None:
+        self.drop_rows([start])
+
+    # remove leaves of columns at given positions
+    def drop_columns(self, columns: Iterable[int]) -> None:
+        columns = sorted(set(int(j) for j in columns if j >= 0))
+        for j in reversed(columns):
+            del self.leaves[j]
+            del self.dtypes[j]
+
+        dirty = {}
+        for j, blocks in self._dirty.items():
+            if j not in columns:
+                dirty[j - sum(1 for k in columns if k < j)] = blocks
+        self._dirty = dirty
+
+    # mark every index leaf as stale
+    def mark_index(self) -> None:
+        self._index_dirty = True
+
+    # recompute stale and missing leaves from data
+    def refresh(self, data: pandas.DataFrame, workers: int = None) -> 'Digest':
+        nrows, ncols = data.shape
+        nblocks = -(-nrows // CHUNK_ROWS)
+        dtypes = [str(dt) for dt in data.dtypes]
+        # leaves from a changed row count or dropped row onwards are stale
+        shift = self._shift
+        if nrows != self.nrows:
+            block = min(nrows, self.nrows) // CHUNK_ROWS
+            shift = block if shift is None else min(shift, block)
+        if shift is not None:
+            self.index = self.index[:shift]
+            self.leaves = [leaves[:shift] for leaves in self.leaves]
+        if len(self.leaves) > ncols: # untracked column drop
+            self.leaves, self.dtypes = [], []
+        # columns that are new or changed data type are rehashed entirely
+        self.leaves += [[] for _ in range(ncols - len(self.leaves))]
+        for j in range(ncols):
+            if j >= len(self.dtypes) or self.dtypes[j] != dtypes[j]:
+                self.leaves[j] = []
+        if self._index_dirty:
+            self.index = []
+
+        tasks = []
+        for block in range(len(self.index), nblocks):
+            tasks.append((None, block))
+        for j in range(ncols):
+            stale = self._dirty.get(j, set())
+            for block in sorted(stale):
+                if block < len(self.leaves[j]):
+                    tasks.append((j, block))
+            for block in range(len(self.leaves[j]), nblocks):
+                tasks.append((j, block))
+
+        self.index += [None] * (nblocks - len(self.index))
+        for j in range(ncols):
+            self.leaves[j] += [None] * (nblocks - len(self.leaves[j]))
+        # select columns up front so worker threads only read slices
+        columns = set(j for j, _ in tasks if j is not None)
+        series = {j: data.iloc[:, j] for j in columns}
+        series[None] = data.index
+        leaf = lambda task: hash_leaf(series[task[0]], task[1])
+
+        for (j, block), value in zip(tasks, pmap(leaf, tasks, workers)):
+            if j is None:
+                self.index[block] = value
+            else:
+                self.leaves[j][block] = value
+
+        self.labels = colencode(data)
+        self.nrows = nrows
+        self.dtypes = dtypes
+        self._dirty = {}
+        self._shift = None
+        self._index_dirty = False
+
+        return self
+
+    # digest of index leaves
+    def index_root(self) -> bytes:
+        return hashlib.sha1(b''.join(self.index)).digest()
+
+    # digest of a column's data type and leaves
+    def column_root(self, j: int) -> bytes:
+        root = hashlib.sha1(self.dtypes[j].encode('utf-8'))
+        root.update(b''.join(self.leaves[j]))
+        return root.digest()
+
+    # combine labels, index and column roots into data hash
+    def hexdigest(self) -> str:
+        data_hash = hashlib.sha1()
+        data_hash.update(self.labels)
+        data_hash.update(self.index_root())
+        for j in range(len(self.leaves)):
+            data_hash.update(self.column_root(j))
+
+        return data_hash.hexdigest()
+
+    # append leaves of a full or final row block
+    def add_block(self, index: bytes, leaves: Iterable[bytes]) -> None:
+        self.index.append(index)
+        for j, leaf in enumerate(leaves):
+            self.leaves[j].append(leaf)
+
+    def copy(self) -> 'Digest':
+        obj = Digest()
+        obj.labels = self.labels
+        obj.nrows = self.nrows
+        obj.dtypes = list(self.dtypes)
+        obj.index = list(self.index)
+        obj.leaves = [list(leaves) for leaves in self.leaves]
+        obj._dirty = {j: set(blocks) for j, blocks in self._dirty.items()}
+        obj._shift = self._shift
+        obj._index_dirty = self._index_dirty
+
+        return obj
+
+# Data hash of a DataFrame fed as consecutive chunks of rows, equal to
+# hash_data of the concatenated chunks in either scheme. Leaves of a scheme
+# 2 row block are hashed as the block's rows arrive (row hashes are
+# independent), so chunks need not be aligned to CHUNK_ROWS.
+class StreamHash:
+    def __init__(self, scheme: int = 1):
+        self.scheme = scheme
+        self.digest = Digest()
+        self.nrows = 0
+        self.chunks = 0
+        self.columns = None # column labels of first chunk
+        self._flat = hashlib.sha1()
+        self._open = None # SHA1 objects of index and columns of open block
+
+    # hash chunk of rows, returns False if its labels or data types differ
+    # from those of preceding chunks
+    def update(self, chunk: pandas.DataFrame) -> bool:
+        labels = colencode(chunk)
+        dtypes = [str(dt) for dt in chunk.dtypes]
+        if self.chunks == 0:
+            self.columns = chunk.columns
+            self.digest.labels = labels
+            self.digest.dtypes = dtypes
+            self.digest.leaves = [[] for _ in dtypes]
+            self._flat.update(labels)
+        elif labels != self.digest.labels or dtypes != self.digest.dtypes:
+            return False
+
+        self.chunks += 1
+        if self.scheme != 2:
+            self._flat.update(pandas.util.hash_pandas_object(chunk, index=True).values)
+            self.nrows += chunk.shape[0]
+            return True
+
+        objs = [chunk.index] + [chunk.iloc[:, j] for j in range(chunk.shape[1])]
+        values = [pandas.util.hash_pandas_object(obj, index=False).values for obj in objs]
+        pos = 0
+        while pos < chunk.shape[0]:
+            if self._open is None:
+                self._open = [hashlib.sha1() for _ in values]
+            size = min(CHUNK_ROWS - self.nrows % CHUNK_ROWS, chunk.shape[0] - pos)
+            for leaf, arr in zip(self._open, values):
+                leaf.update(arr[pos:pos + size])
+            pos += size
+            self.nrows += size
+            if self.nrows % CHUNK_ROWS == 0:
+                self._close()
+
+        return True
+
+    # add leaves of open row block to digest
+    def _close(self) -> None:
+        leaves = [leaf.digest() for leaf in self._open]
+        self.digest.add_block(leaves[0], leaves[1:])
+        self._open = None
+
+    # data hash of chunks fed so far
+    def hexdigest(self) -> str:
+        if self.scheme != 2:
+            return self._flat.hexdigest()
+
+        return self.finalize().hexdigest()
+
+    # complete digest with final (partial) row block
+    def finalize(self) -> Digest:
+        if self._open is not None:
+            self._close()
+        self.digest.nrows = self.nrows
+
+        return self.digest
@@ -34,10 +34,17 @@ class Node:
             self.__dict__[key] = val
           
 class DeltaNode(Node):
-    static = Node.static + ['delta']
+    static = Node.static + ['_delta']
     def __init__(self, path: str, node_id: str, node: dict):
         super().__init__(path, node_id, node)
-        self.delta = DeltaPointer(fs.DeltaFile(path, node_id))
+        self._delta = None
+
+    @property # blocks of delta file (read on first access)
+    def delta(self) -> 'DeltaPointer':
+        if self._delta is None:
+            self.__dict__['_delta'] = DeltaPointer(self._path, self._id)
+
+        return self._delta
 
     def __str__(self):
         node = self._node
@@ -74,17 +81,21 @@ class OriginNode(Node):
 
     __repr__ = __str__
 
+# Blocks of a delta file, which is opened for the duration of each read
 class DeltaPointer(Selection):
-    def __init__(self, delta_file: fs.DeltaFile):
-        self._file = delta_file
-        self._meta = delta_file.meta
+    def __init__(self, path: str, node_id: str):
+        self._path = path
+        self._id = node_id
+        with fs.DeltaFile(path, node_id) as delta_file:
+            self._meta = delta_file.meta
 
         values = [self._meta[key] for key in self._meta]
     
         super().__init__('blocks', values)
     
     def _get(self, i: int) -> Tuple:
-        obj = self._file.read_block(i)
+        with fs.DeltaFile(self._path, self._id) as delta_file:
+            obj = delta_file.read_block(i)
         return obj
     
     def _show(self, i: int) -> Union[str, None]:
@@ -96,21 +107,26 @@ class DeltaPointer(Selection):
         else:
             return "[{0} | {1}]".format(*block_strings)
     
-def make_node(origin_hash: str, lineage: Tuple[str]):
+def make_node(origin_hash: str, lineage: Tuple[str], scheme: int = 1):
     node = [
         ('type', 'delta'),
         ('origin', origin_hash),
         ('lineage', lineage)
     ]
+    # scheme 1 nodes omit scheme to keep their original node ids
+    if scheme != 1:
+        node.append(('scheme', scheme))
 
     node = OrderedDict(node)
     return json.dumps(node)
 
-def make_origin(origin_hash: str, data: DataFrame) -> str:
+def make_origin(origin_hash: str, data: DataFrame, scheme: int = 1) -> str:
     node = [
         ('type', 'origin'),
         ('origin', origin_hash)
     ]
+    if scheme != 1:
+        node.append(('scheme', scheme))
 
     node = OrderedDict(node)
     return json.dumps(node)
\ No newline at end of file
@@ -1,6 +1,6 @@
 import pandas
 import numpy
-from typing import Iterable, Union
+from typing import Iterable, Union, Tuple
 
 DataFrame = pandas.DataFrame
 Series = pandas.Series
@@ -20,38 +20,170 @@ def effective_axis(obj: Union[DataFrame, Series], axis=int) -> Index:
 
     return ix
 
+# return boolean array of cells of a and b which are equal (or both NA)
+def cells_equal(a: numpy.ndarray, b: numpy.ndarray) -> numpy.ndarray:
+    with numpy.errstate(invalid='ignore'):
+        equal = a == b
+    if not isinstance(equal, numpy.ndarray): # (elementwise comparison failed)
+        equal = numpy.array([[x_val == y_val for x_val, y_val in zip(x_row, y_row)]
+            for x_row, y_row in zip(a, b)], dtype=bool).reshape(a.shape)
+
+    return equal | (pandas.isna(a) & pandas.isna(b))
+
+# Compare aligned DataFrames x and y (same shape and labels) column block
+# by column block of the same data types. Returns mask of changed cells and
+# x and y values, compacted to rows and columns with changes.
+def diff(x: DataFrame, y: DataFrame) -> Tuple[numpy.ndarray, DataFrame, DataFrame]:
+    mask = numpy.zeros(y.shape, dtype=bool)
+    groups = {}
+    for j in range(y.shape[1]):
+        key = (str(x.dtypes.iat[j]), str(y.dtypes.iat[j]))
+        groups.setdefault(key, []).append(j)
+    for cols in groups.values():
+        a = x.iloc[:, cols].to_numpy()
+        b = y.iloc[:, cols].to_numpy()
+        mask[:, cols] = ~cells_equal(a, b)
+
+    rows, cols = mask.any(axis=1), mask.any(axis=0)
+    mask = mask[rows][:, cols]
+
+    return mask, x.iloc[rows, cols], y.iloc[rows, cols]
+
 # return reduced dataframe of difference from x to y
 def shrink(x: DataFrame, y: DataFrame) -> DataFrame:
-    diff = y[~y.isin(x)]
-    diff = diff.dropna(axis='columns', how='all')
-    diff = diff.dropna(axis='rows', how='all')
+    mask, _, y = diff(x, y)
+    return y.where(mask)
+
+# (major, minor) version of pandas
+PANDAS_VERSION = tuple(int(part) for part in pandas.__version__.split('.')[:2])
+
+# Return shallow view of DataFrame whose values can't be written to. pandas
+# has no public read-only frames, so blocks of the view (pandas 1.x and 2.x)
+# are replaced by read-only views; frames with extension arrays, or whose
+# columns stay writable, are copied instead.
+def readonly(data: DataFrame) -> DataFrame:
+    if not (1, 0) <= PANDAS_VERSION < (3, 0):
+        return data.copy()
+    if not all(isinstance(dtype, numpy.dtype) for dtype in data.dtypes):
+        return data.copy()
+
+    view = data.copy(deep=False)
+    manager = view._mgr if hasattr(view, '_mgr') else view._data
+    try:
+        for block in manager.blocks:
+            values = block.values.view()
+            values.flags.writeable = False
+            block.values = values
+    except (AttributeError, ValueError):
+        return data.copy()
+
+    # check one column of each data type through public API
+    checked = set()
+    for j, dtype in enumerate(view.dtypes):
+        if dtype not in checked:
+            checked.add(dtype)
+            if view.iloc[:, j].to_numpy().flags.writeable:
+                return data.copy()
+
+    return view
+
+# Return DataFrame of data with given columns copied. Other columns share
+# values of data as one block per column where pandas keeps them apart on
+# concat (older versions consolidate, copying them as well).
+def copy_columns(data: DataFrame, columns: Iterable) -> DataFrame:
+    if data.shape[1] == 0:
+        return data.copy()
+
+    copied = set(columns)
+    parts = [data.iloc[:, j].copy() if col in copied else data.iloc[:, j]
+        for j, col in enumerate(data.columns)]
+    result = pandas.concat(parts, axis=1, copy=False)
+    result.columns = data.columns
+    return result
 
-    return diff
+# cast columns of DataFrame in place (only those of different data type)
+def astype_columns(data: DataFrame, dtypes: Series) -> DataFrame:
+    for col, dtype in dtypes.items():
+        if data[col].dtype != dtype:
+            data[col] = data[col].astype(dtype)
 
-# Put non-NA values from y into DataFrame
+    return data
+
+# assign values of segment at masked cells of DataFrame
+def assign_cells(data: DataFrame, segment: DataFrame, mask: numpy.ndarray) -> DataFrame:
+    rows = data.index.get_indexer(segment.index)
+    cols = data.columns.get_indexer(segment.columns)
+    for k, j in enumerate(cols):
+        sel = mask[:, k]
+        data.iloc[rows[sel], j] = segment.iloc[:, k].to_numpy()[sel]
+
+    return data
+
+# Put values from y into DataFrame (non-NA values, or all values at
+# changed cells if mask of x/y cells is given)
 class Put:
-    __slots__ = ['id', 'x', 'y', 'dtypes']
-    def __init__(self, x: DataFrame, y: DataFrame, dtypes: Series):
+    __slots__ = ['id', 'x', 'y', 'dtypes', 'mask']
+    def __init__(self, x: DataFrame, y: DataFrame, dtypes: Series, 
+            mask: numpy.ndarray = None):
         self.id = 'put'
         self.x = x
         self.y = y
         self.dtypes = dtypes
+        self.mask = mask
 
-    def execute(self, data: DataFrame) -> DataFrame:
-        data = data.copy()
-        data.update(self.y)
-        data = data.astype(self.dtypes[self.y.columns])
+    def execute(self, data: DataFrame, copy: bool = True) -> DataFrame:
+        if copy:
+            data = data.copy()
+        if self.mask is None:
+            data.update(self.y)
+        else:
+            data = assign_cells(data, self.y, self.mask)
+        data = astype_columns(data, self.dtypes[self.y.columns])
         return data
     
     # replace segment y with original segment x
     def undo(self, data:pandas.DataFrame) -> DataFrame:
-        data.update(self.x)
-        data = data.astype(self.dtypes[self.x.columns])
+        if self.mask is None:
+            data.update(self.x)
+            data = astype_columns(data, self.dtypes[self.x.columns])
+        else:
+            data = assign_cells(data, self.x, self.mask)
+            data = astype_columns(data, self.x.dtypes)
 
         return data
     
+    # Combine with a put which followed it into one put over the union of
+    # both regions, given data after both were executed (or None if either
+    # put has no mask of changed cells)
+    def merge(self, other: 'Put', data: DataFrame) -> Union['Put', None]:
+        if self.mask is None or other.mask is None:
+            return None
+        if not data.index.is_unique or not data.columns.is_unique:
+            return None
+
+        rows = data.index[data.index.isin(self.y.index.union(other.y.index))]
+        cols = data.columns[data.columns.isin(self.y.columns.union(other.y.columns))]
+        y = data.loc[rows, cols]
+        x = y.copy()
+        mask = numpy.zeros(y.shape, dtype=bool)
+        # original values of earlier put take precedence
+        for oper in (other, self):
+            sel = numpy.ix_(rows.get_indexer(oper.y.index), cols.get_indexer(oper.y.columns))
+            mask[sel] |= oper.mask
+            x = assign_cells(x, oper.x, oper.mask)
+        dtypes = other.x.dtypes.to_dict()
+        dtypes.update(self.x.dtypes.to_dict())
+        x = astype_columns(x, Series(dtypes, dtype=object))
+
+        dtypes = self.dtypes.to_dict()
+        dtypes.update(other.dtypes.to_dict())
+        return Put(x, y, Series(dtypes, dtype=object), mask)
+
     def __str__(self):
-        total = self.y.count().sum()
+        if self.mask is None:
+            total = self.y.count().sum()
+        else:
+            total = self.mask.sum()
         return "PUT {0} VALUES".format(total)
 
     def __repr__(self):
@@ -65,7 +197,7 @@ class Extend:
         self.data = data
         self.axis = axis
     
-    def execute(self, data: DataFrame) -> DataFrame:
+    def execute(self, data: DataFrame, copy: bool = True) -> DataFrame:
         data = pandas.concat([data, self.data], axis=self.axis)
         return data
     
@@ -96,7 +228,7 @@ class Drop:
         self.ref = ref
         self.axis = axis
     
-    def execute(self, data: DataFrame) -> DataFrame:
+    def execute(self, data: DataFrame, copy: bool = True) -> DataFrame:
         data = data.drop(self.data._get_axis(self.axis), self.axis)
         return data
     
@@ -125,8 +257,16 @@ class Relabel:
         self.y = y
         self.axis = axis
 
-    def execute(self, data: DataFrame) -> DataFrame:
-        data = data.set_axis(self.y, axis=self.axis)
+    # (without copy, relabeled data shares values of data)
+    def execute(self, data: DataFrame, copy: bool = True) -> DataFrame:
+        if copy:
+            return data.set_axis(self.y, axis=self.axis)
+
+        data = data.copy(deep=False)
+        if self.axis == 0:
+            data.index = self.y
+        else:
+            data.columns = self.y
         return data
     
     # set DataFrame axis labels back to x
@@ -0,0 +1,211 @@
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from typing import Iterable, Tuple, Union
+
+PACK_MAGIC = b'DFPK'
+INDEX_MAGIC = b'DFIX'
+# index record: kind (1 byte), binary id (20 bytes), offset, length
+RECORD = struct.Struct('<B20sqq')
+HEADER = struct.Struct('<4sq')
+
+kinds = {'node': 0, 'delta': 1}
+kind_names = {val: key for key, val in kinds.items()}
+
+def record_key(kind: str, key: str) -> bytes:
+    return bytes([kinds[kind]]) + bytes.fromhex(key)
+
+# Read-only view of a packfile and its sorted offset index
+class Pack:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path + '.idx', 'rb') as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(path + '.pack', 'rb') as f:
+            self._pack = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = HEADER.unpack(self._index[:HEADER.size])
+        if magic != INDEX_MAGIC or self._pack[:4] != PACK_MAGIC:
+            raise ValueError("'{0}' is not a deltaflow pack".format(path))
+    
+    # return (kind, id) key of record i
+    def _key(self, i: int) -> bytes:
+        start = HEADER.size + i * RECORD.size
+        return self._index[start:start + 21]
+
+    def _record(self, i: int) -> Tuple[int, bytes, int, int]:
+        start = HEADER.size + i * RECORD.size
+        return RECORD.unpack(self._index[start:start + RECORD.size])
+
+    # binary search index for first record with key >= target
+    def _search(self, target: bytes) -> int:
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    # return position of record of object in index, -1 if not found
+    def find(self, kind: str, key: str) -> int:
+        try:
+            target = record_key(kind, key)
+        except ValueError: # not a hexadecimal id
+            return -1
+
+        i = self._search(target)
+        if i < self.count and self._key(i) == target:
+            return i
+
+        return -1
+
+    # zero-copy view of object bytes
+    def view(self, kind: str, key: str) -> memoryview:
+        i = self.find(kind, key)
+        if i == -1:
+            raise KeyError(key)
+
+        _, _, offset, length = self._record(i)
+        return memoryview(self._pack)[offset:offset + length]
+
+    def read(self, kind: str, key: str) -> bytes:
+        with self.view(kind, key) as view:
+            return bytes(view)
+
+    # size of object in bytes
+    def size(self, kind: str, key: str) -> int:
+        i = self.find(kind, key)
+        if i == -1:
+            raise KeyError(key)
+
+        return self._record(i)[3]
+
+    # yield ids of objects of given kind
+    def keys(self, kind: str) -> Iterable[str]:
+        for i in range(self._search(bytes([kinds[kind]])), self.count):
+            obj_kind, obj_id, _, _ = self._record(i)
+            if obj_kind != kinds[kind]:
+                break
+            yield obj_id.hex()
+
+    def __contains__(self, item: Tuple[str, str]) -> bool:
+        return self.find(*item) != -1
+
+    def close(self) -> None:
+        self._index.close()
+        try:
+            self._pack.close()
+        except BufferError: # views still exported, unmapped once released
+            pass
+
+# Collection of packs in a field's 'packs' directory
+class PackStore:
+    def __init__(self, path: str):
+        self.path = os.path.join(path, 'packs')
+        self.packs = []
+        self.refresh()
+
+    # rescan packs directory for packs added or removed by other writers
+    def refresh(self) -> None:
+        names = []
+        if os.path.isdir(self.path):
+            names = sorted(fname[:-4] for fname in os.listdir(self.path) 
+                if fname.startswith('pack-') and fname.endswith('.idx'))
+
+        current = {os.path.basename(pack.path): pack for pack in self.packs}
+        packs = []
+        for name in names:
+            if name in current:
+                packs.append(current.pop(name))
+            else:
+                packs.append(Pack(os.path.join(self.path, name)))
+        for pack in current.values():
+            pack.close()
+
+        self.packs = packs
+
+    def find(self, kind: str, key: str) -> Union[Pack, None]:
+        for pack in self.packs:
+            if (kind, key) in pack:
+                return pack
+
+        return None
+
+    # return view of packed object, rescanning packs once if not found
+    def view(self, kind: str, key: str) -> memoryview:
+        pack = self.find(kind, key)
+        if pack is None:
+            self.refresh()
+            pack = self.find(kind, key)
+            if pack is None:
+                raise KeyError(key)
+
+        return pack.view(kind, key)
+
+    def read(self, kind: str, key: str) -> bytes:
+        with self.view(kind, key) as view:
+            return bytes(view)
+
+    def keys(self, kind: str) -> Iterable[str]:
+        seen = set()
+        for pack in self.packs:
+            for key in pack.keys(kind):
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+
+    def __contains__(self, item: Tuple[str, str]) -> bool:
+        return self.find(*item) is not None
+
+# shared pack stores by field core path
+__STORES__ = {}
+
+def get_store(path: str) -> PackStore:
+    path = os.path.abspath(path)
+    if path not in __STORES__:
+        __STORES__[path] = PackStore(path)
+
+    return __STORES__[path]
+
+# Write objects (kind, id, bytes) to a new pack, return pack path
+def write_pack(path: str, objects: Iterable[Tuple[str, str, bytes]]) -> str:
+    pack_dir = os.path.join(path, 'packs')
+    os.makedirs(pack_dir, exist_ok=True)
+    # (temporary files are kept out of packs directory, which readers scan)
+    tmp_dir = os.path.join(path, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, 'pack-{0}-{1}'.format(os.getpid(), threading.get_ident()))
+
+    records = []
+    with open(tmp_path + '.pack', 'wb') as f:
+        f.write(PACK_MAGIC)
+        offset = len(PACK_MAGIC)
+        for kind, key, content in objects:
+            f.write(content)
+            records.append((record_key(kind, key), offset, len(content)))
+            offset += len(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+    records.sort()
+    index = [HEADER.pack(INDEX_MAGIC, len(records))]
+    for key, offset, length in records:
+        index.append(RECORD.pack(key[0], key[1:], offset, length))
+    index = b''.join(index)
+
+    name = 'pack-' + hashlib.sha1(index).hexdigest()
+    pack_path = os.path.join(pack_dir, name)
+    os.replace(tmp_path + '.pack', pack_path + '.pack')
+    # index is written last so readers never see a pack without its data
+    with open(tmp_path + '.idx', 'wb') as f:
+        f.write(index)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path + '.idx', pack_path + '.idx')
+
+    return pack_path
@@ -0,0 +1,458 @@
+import hashlib
+import numpy
+import pandas
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Tuple, Union, Iterable, Iterator, Callable, List
+import deltaflow
+import deltaflow.fs as fs
+from deltaflow.hash import hash_data, hash_pair, node_scheme, Digest
+from deltaflow.errors import IntegrityError
+
+DataFrame = pandas.DataFrame
+
+# raise or warn on integrity failure depending on field options
+def integrity_failure(key: str, obj_type: str, strict: bool = False) -> None:
+    if strict or deltaflow.get_option('raise_integrity_error'):
+        raise IntegrityError(key, obj_type)
+    else:
+        print('WARNING:', IntegrityError(key, obj_type))
+
+# determine whether node at position i of a timeline ending at head is verified
+def must_verify(i: int, head: int, mode: str = None) -> bool:
+    if mode is None:
+        mode = deltaflow.get_option('verify')
+
+    if mode == 'every':
+        return True
+    elif mode == 'off':
+        return False
+    elif i == head: # 'head-only' and 'sampled' always verify head
+        return True
+    elif mode == 'sampled':
+        return i % deltaflow.get_option('verify_sample') == 0
+
+    return False
+
+# hash data with given scheme, refreshing scheme 2 digest incrementally
+def hash_scheme(data: DataFrame, scheme: int, 
+        digest: Digest = None) -> Tuple[str, Union[Digest, None]]:
+    if scheme == 1:
+        return hash_data(data), digest
+
+    if digest is None:
+        digest = Digest(data)
+    else:
+        digest.refresh(data)
+
+    return digest.hexdigest(), digest
+
+# assure reconstructed node_id matches true node_id
+def verify_node(data: DataFrame, node_id: str, node_hash: str, scheme: int = 1,
+        digest: Digest = None, obj_type: str = 'delta', strict: bool = False) -> Digest:
+    data_hash, digest = hash_scheme(data, scheme, digest)
+    if hash_pair(node_hash, data_hash) != node_id:
+        integrity_failure(node_id, obj_type, strict)
+
+    return digest
+
+def origin_id(node: 'Node') -> str:
+    if node.type == 'delta':
+        return node.lineage[-1]
+    else:
+        return node.id
+
+def load_origin(tree: 'Tree', node: 'Node') -> DataFrame:
+    origin_name = tree.name_origin(origin_id(node))
+    return fs.load_origin(tree.path, origin_name)
+
+# verify hash of origin data == origin_hash
+def verify_origin(tree: 'Tree', node: 'Node', data: DataFrame, 
+        strict: bool = False) -> Union[Digest, None]:
+    node_id = origin_id(node)
+    scheme = node_scheme(tree.nodes[node_id])
+    data_hash, digest = hash_scheme(data, scheme)
+    if data_hash != node.origin:
+        integrity_failure(tree.name_origin(node_id), 'origin', strict)
+
+    return digest
+
+# return position of nearest checkpointed ancestor in timeline (0 if none)
+def nearest_checkpoint(tree: 'Tree', timeline: list) -> int:
+    checkpoints = tree.checkpoints
+    for i in reversed(range(1, len(timeline))):
+        if timeline[i] in checkpoints:
+            return i
+
+    return 0
+
+# apply parsed blocks to data, marking changed leaves of digest
+def apply_blocks(blocks: Iterable[tuple], data: DataFrame, 
+        digest: Digest = None) -> DataFrame:
+    for block, meta, obj in blocks:
+        if digest is not None:
+            block.touch(meta, obj, [data.index, data.columns], digest)
+        data = block.apply(meta, obj, data)
+
+    return data
+
+# apply blocks of delta file to data, marking changed leaves of digest
+def apply_delta(tree: 'Tree', node_id: str, data: DataFrame, 
+        digest: Digest = None, columns: set = None, rows: 'RowSlice' = None) -> DataFrame:
+    with fs.DeltaFile(tree.path, node_id) as delta_file:
+        return apply_blocks(delta_file.parse_blocks(columns, rows), data, digest)
+
+# read and parse blocks of delta file
+def read_delta(tree: 'Tree', node_id: str, columns: set = None, 
+        rows: 'RowSlice' = None) -> List[tuple]:
+    with fs.DeltaFile(tree.path, node_id) as delta_file:
+        return list(delta_file.parse_blocks(columns, rows))
+
+# Yield (timeline position, delta key, parsed blocks) of steps. Deltas of
+# the next 'prefetch' steps are read and parsed on a pool of as many threads
+# while the current one is applied, so at most 'prefetch' + 1 parsed deltas
+# are held at once.
+def prefetch_steps(tree: 'Tree', steps: Iterable[Tuple[int, str]], columns: set = None,
+        rows: 'RowSlice' = None) -> Iterator[Tuple[int, str, List[tuple]]]:
+    depth = deltaflow.get_option('prefetch')
+    parse = lambda key: read_delta(tree, key, columns, rows)
+    if not depth:
+        for i, key in steps:
+            yield i, key, parse(key)
+        return
+
+    steps = iter(steps)
+    with ThreadPoolExecutor(max_workers=depth) as pool:
+        pending = deque((i, key, pool.submit(parse, key)) 
+            for i, key in islice(steps, depth))
+        while len(pending) > 0:
+            i, key, future = pending.popleft()
+            blocks = future.result()
+            step = next(steps, None)
+            if step is not None:
+                pending.append((step[0], step[1], pool.submit(parse, step[1])))
+            yield i, key, blocks
+
+# Yield (timeline position, delta key) of each step replaying timeline
+# from start, jumping through the farthest squash delta where one exists
+def iter_steps(tree: 'Tree', timeline: list, start: int) -> Iterator[Tuple[int, str]]:
+    squashes = tree.squashes
+    position = {node_id: i for i, node_id in enumerate(timeline)}
+    i = start
+    while i < len(timeline) - 1:
+        targets = squashes.get(timeline[i], {})
+        jumps = [position[to_id] for to_id in targets if position.get(to_id, -1) > i]
+        if len(jumps) > 0:
+            j = max(jumps)
+            key = targets[timeline[j]]
+        else:
+            j = i + 1
+            key = timeline[j]
+
+        yield j, key
+        i = j
+
+# reconstruct data and digest of node from nearest cached or materialized ancestor
+def replay(tree: 'Tree', node: 'Node', 
+        outline: OrderedDict = None) -> Tuple[DataFrame, Union[Digest, None]]:
+    if outline is None:
+        outline = tree.outline(node)
+
+    timeline = list(outline)
+    head = len(timeline) - 1
+    # start from deepest cached or checkpointed node in timeline
+    start, data, digest = tree.cache.deepest(timeline)
+    checkpoint = nearest_checkpoint(tree, timeline)
+    if checkpoint > max(start, 0):
+        start = checkpoint
+        node_id = timeline[start]
+        data = fs.load_checkpoint(tree.path, node_id)
+        digest = None
+        if must_verify(start, head):
+            scheme = node_scheme(tree.nodes[node_id])
+            digest = verify_node(data, node_id, outline[node_id], 
+                scheme, obj_type='checkpoint')
+    elif start == -1:
+        start = 0
+        data = load_origin(tree, node)
+        if must_verify(0, head):
+            digest = verify_origin(tree, node, data)
+    # apply remaining deltas in timeline
+    for i, key, blocks in prefetch_steps(tree, iter_steps(tree, timeline, start)):
+        node_id = timeline[i]
+        data = apply_blocks(blocks, data, digest)
+        if must_verify(i, head):
+            scheme = node_scheme(tree.nodes[node_id])
+            digest = verify_node(data, node_id, outline[node_id], scheme, digest)
+
+    tree.cache.put(node.id, data, digest)
+    return data, digest
+
+def resolve(tree: 'Tree', node: 'Node', outline: OrderedDict = None) -> DataFrame:
+    return replay(tree, node, outline)[0]
+
+# Merge outlines into a trie of node ids. Returns root (origin) ids, map of
+# node id to child node ids and map of node id to node hash.
+def outline_trie(outlines: Iterable[OrderedDict]) -> Tuple[list, OrderedDict, dict]:
+    roots, children, hashes = [], OrderedDict(), {}
+    for outline in outlines:
+        parent = None
+        for node_id, node_hash in outline.items():
+            if node_id not in children:
+                children[node_id] = []
+                hashes[node_id] = node_hash
+                if parent is None:
+                    roots.append(node_id)
+                else:
+                    children[parent].append(node_id)
+            parent = node_id
+
+    return roots, children, hashes
+
+# apply delta of node at timeline position i to data of its parent
+def advance(tree: 'Tree', node_id: str, i: int, node_hash: str, data: DataFrame, 
+        digest: Union[Digest, None], is_head: bool) -> Tuple[DataFrame, Union[Digest, None]]:
+    data = apply_delta(tree, node_id, data, digest)
+    if must_verify(i, i if is_head else -1):
+        scheme = node_scheme(tree.nodes[node_id])
+        digest = verify_node(data, node_id, node_hash, scheme, digest)
+
+    return data, digest
+
+# Resolve trie nodes below resolved node 'start' at timeline position i.
+# Each delta is applied once and data is copied only where the trie forks.
+# Returns map of names of targets (node id -> names) to their data.
+def replay_trie(tree: 'Tree', start: str, i: int, data: DataFrame, 
+        digest: Union[Digest, None], children: dict, hashes: dict, 
+        targets: dict) -> dict:
+    frames = {}
+    stack = [(start, i, data, digest)]
+    while len(stack) > 0:
+        node_id, i, data, digest = stack.pop()
+        kids = children.get(node_id, [])
+        for k, name in enumerate(targets.get(node_id, [])):
+            # (data of leaves is handed out as is)
+            frames[name] = data if k == 0 and len(kids) == 0 else data.copy()
+        for k, child in enumerate(kids):
+            fork = k < len(kids) - 1
+            child_data = data.copy() if fork else data
+            child_digest = digest.copy() if fork and digest is not None else digest
+            child_data, child_digest = advance(tree, child, i + 1, hashes[child], 
+                child_data, child_digest, child in targets)
+            stack.append((child, i + 1, child_data, child_digest))
+
+    return frames
+
+# replay_trie of subtree below a child of a resolved node in a worker process
+def replay_branch(path: str, options: dict, child: str, i: int, data: DataFrame,
+        digest: Union[Digest, None], children: dict, hashes: dict, 
+        targets: dict) -> dict:
+    from deltaflow.tree import Tree
+    deltaflow.api.__OPTIONS__.update(options)
+    tree = Tree(path)
+    data, digest = advance(tree, child, i, hashes[child], data, digest, child in targets)
+
+    return replay_trie(tree, child, i, data, digest, children, hashes, targets)
+
+# return node ids of subtree of trie rooted at node_id (inclusive)
+def subtree(children: dict, node_id: str) -> list:
+    nodes, stack = [], [node_id]
+    while len(stack) > 0:
+        node_id = stack.pop()
+        nodes.append(node_id)
+        stack.extend(children.get(node_id, []))
+
+    return nodes
+
+# replay lineage of node from its origin, verifying every node on the way
+def verify(tree: 'Tree', node: 'Node') -> bool:
+    outline = tree.outline(node)
+    data = load_origin(tree, node)
+    digest = verify_origin(tree, node, data, strict=True)
+    steps = list(enumerate(outline))[1:]
+    for _, node_id, blocks in prefetch_steps(tree, steps):
+        data = apply_blocks(blocks, data, digest)
+        scheme = node_scheme(tree.nodes[node_id])
+        digest = verify_node(data, node_id, outline[node_id], 
+            scheme, digest, strict=True)
+    # checkpoints in lineage must match the nodes they stand in for
+    checkpoints = tree.checkpoints
+    for node_id in list(outline)[1:]:
+        if node_id in checkpoints:
+            checkpoint = fs.load_checkpoint(tree.path, node_id)
+            scheme = node_scheme(tree.nodes[node_id])
+            verify_node(checkpoint, node_id, outline[node_id], 
+                scheme, obj_type='checkpoint', strict=True)
+
+    return True
+
+# Row selection of a sliced resolve: inclusive (lower, upper) index label
+# range (either end may be None) or predicate mapping an index to a mask
+class RowSlice:
+    def __init__(self, rows: Union[tuple, Callable]):
+        if callable(rows):
+            self.predicate = rows
+            self.bounds = None
+        else:
+            if len(rows) != 2:
+                err_msg = "rows must be a (lower, upper) tuple or callable, got {0}"
+                raise TypeError(err_msg.format(rows))
+            self.predicate = None
+            self.bounds = tuple(rows)
+
+    # boolean mask of selected labels of index
+    def mask(self, index: pandas.Index) -> numpy.ndarray:
+        if self.predicate is not None:
+            return numpy.asarray(self.predicate(index), dtype=bool)
+
+        lower, upper = self.bounds
+        mask = numpy.ones(len(index), dtype=bool)
+        if lower is not None:
+            mask &= numpy.asarray(index >= lower)
+        if upper is not None:
+            mask &= numpy.asarray(index <= upper)
+
+        return mask
+
+    # whether labels within (min, max) index statistics may be selected
+    def overlaps(self, bounds: Union[list, None]) -> bool:
+        if self.bounds is None or bounds is None:
+            return True
+
+        lower, upper = self.bounds
+        try:
+            if lower is not None and bounds[1] < lower:
+                return False
+            if upper is not None and bounds[0] > upper:
+                return False
+        except TypeError: # (statistics not comparable with range)
+            return True
+
+        return True
+
+    # parquet row group filters on given index column
+    def filters(self, name: str) -> list:
+        if self.bounds is None:
+            return []
+
+        lower, upper = self.bounds
+        filters = []
+        if lower is not None:
+            filters.append((name, '>=', lower))
+        if upper is not None:
+            filters.append((name, '<=', upper))
+
+        return filters
+
+    def select(self, data: DataFrame) -> DataFrame:
+        return data[self.mask(data.index)]
+
+# position of last delta in timeline after start relabeling any of given axes (-1 if none)
+def last_relabel(tree: 'Tree', timeline: list, start: int, axes: Iterable[int]) -> int:
+    for i in reversed(range(start + 1, len(timeline))):
+        with fs.DeltaFile(tree.path, timeline[i]) as delta_file:
+            for meta in delta_file.meta.values():
+                if meta['class'] == 'axis' and 'relabel' in meta['structure']:
+                    relabel = meta['structure']['relabel']
+                    if any(relabel[axis] is not None for axis in axes):
+                        return i
+
+    return -1
+
+# Assure index and column roots of projected data match stored roots of node.
+# Stored roots are authenticated against node_id (or origin hash) first;
+# returns False if node has no stored roots.
+def verify_projected(tree: 'Tree', data: DataFrame, digest: Digest, node_id: str,
+        node_hash: str = None, obj_type: str = 'delta', strict: bool = False) -> bool:
+    roots = fs.load_digest(tree.path, node_id)
+    if roots is None:
+        return False
+
+    data_hash = hashlib.sha1(roots['labels'].encode('utf-8'))
+    data_hash.update(bytes.fromhex(roots['index']))
+    for _, root in roots['columns']:
+        data_hash.update(bytes.fromhex(root))
+    data_hash = data_hash.hexdigest()
+
+    if node_hash is None: # origin
+        valid = data_hash == tree.nodes[node_id]['origin']
+        key = tree.name_origin(node_id)
+    else:
+        valid = hash_pair(node_hash, data_hash) == node_id
+        key = node_id
+
+    if valid:
+        stored = dict(roots['columns'])
+        valid = digest.index_root().hex() == roots['index']
+        for j, col in enumerate(data.columns):
+            valid = valid and stored.get(str(col)) == digest.column_root(j).hex()
+    if not valid:
+        integrity_failure(key, obj_type, strict)
+
+    return True
+
+# Reconstruct given columns and/or rows of node data, skipping blocks that
+# touch neither. Projected data is verified against stored column roots,
+# row slices are not verified.
+def replay_slice(tree: 'Tree', node: 'Node', columns: Iterable = None, 
+        rows: RowSlice = None, outline: OrderedDict = None) -> DataFrame:
+    if outline is None:
+        outline = tree.outline(node)
+
+    subset = set(columns) if columns is not None else None
+    timeline = list(outline)
+    head = len(timeline) - 1
+    # start from deepest cached or checkpointed node in timeline
+    start, data, _ = tree.cache.deepest(timeline)
+    checkpoint = nearest_checkpoint(tree, timeline)
+    loaded = checkpoint > max(start, 0) or start == -1
+    start = checkpoint if loaded else start
+    # sliced labels are only known after last relabel of a sliced axis
+    axes = [axis for axis, obj in enumerate((rows, columns)) if obj is not None]
+    relabel = last_relabel(tree, timeline, start, axes)
+    if relabel != -1:
+        start = relabel
+        data = resolve(tree, tree.node(timeline[start]))
+        loaded = False
+    elif loaded and start > 0:
+        data = fs.load_checkpoint(tree.path, timeline[start], subset, rows)
+    elif loaded:
+        data = fs.load_origin(tree.path, 
+            tree.name_origin(origin_id(node)), subset, rows)
+    if subset is not None:
+        data = data[[col for col in data.columns if col in subset]]
+    if rows is not None:
+        data = rows.select(data)
+
+    verified = rows is None
+    digest = None
+    unverified = 0
+    if verified and loaded and must_verify(start, head):
+        node_id = timeline[start]
+        digest = Digest(data)
+        if start == 0:
+            found = verify_projected(tree, data, digest, node_id, obj_type='origin')
+        else:
+            found = verify_projected(tree, data, digest, node_id, 
+                outline[node_id], obj_type='checkpoint')
+        unverified += not found
+    # apply remaining deltas in timeline
+    steps = iter_steps(tree, timeline, start)
+    for i, key, blocks in prefetch_steps(tree, steps, subset, rows):
+        node_id = timeline[i]
+        data = apply_blocks(blocks, data, digest)
+        if verified and must_verify(i, head):
+            digest = Digest(data) if digest is None else digest.refresh(data)
+            unverified += not verify_projected(tree, data, digest, 
+                node_id, outline[node_id])
+    if unverified:
+        msg = "WARNING: {0} node(s) resolved without integrity check (no column digests stored)"
+        print(msg.format(unverified))
+    elif not verified and deltaflow.get_option('verify') != 'off':
+        print("WARNING: row slice of '{0}' resolved without integrity check".format(node.id))
+
+    if columns is not None:
+        data = data[list(columns)]
+
+    return data
@@ -2,10 +2,14 @@ import os
 import json
 import pandas
 from collections import OrderedDict
+from typing import Iterable
+import deltaflow.fs as fs
 from deltaflow.errors import NameLookupError, IdLookupError
 from deltaflow.hash import hash_node
 from deltaflow.node import DeltaNode, OriginNode
 from deltaflow.abstract import DirectoryMap
+from deltaflow.cache import FrameCache
+from deltaflow.pack import get_store
 
 class NodeLink:
     def __init__(self, node_id: str):
@@ -41,55 +45,216 @@ class ArrowsIndex(DirectoryMap):
     def _show(self, key: str, obj: object) -> str:
         return "{0} -> {1}".format(key, obj)
 
+# Nodes stored as loose files or in packs, listed in a persistent index
+# file of '<node_id> <node_json>' lines which is parsed on first access
 class NodesIndex(DirectoryMap):
     def __init__(self, tree):
-        super().__init__(
-            os.path.join(tree.path, 'nodes'),
-            'nodes'
-        )
+        self._dir = os.path.join(tree.path, 'nodes')
+        super().__init__(self._dir, 'nodes')
         self._tree = tree
+        self._packs = get_store(tree.path)
+        self._index_path = os.path.join(tree.path, 'index')
+        self._text = {}
         self._cache = {}
-        self._cache = dict(self.items())
+        self.load()
 
     def _parse(self, text: str) -> dict:
         return json.loads(text)
 
-    def __getitem__(self, key: str) -> dict:
-        if key in self._cache:
-            return self._cache[key]
-        else:
+    @property # index is stale if nodes were written or packed after its update
+    def stale(self) -> bool:
+        try:
+            mtime = os.stat(self._index_path).st_mtime_ns
+        except FileNotFoundError:
+            return True
+
+        for path in (self._dir, self._packs.path):
+            if os.path.isdir(path) and os.stat(path).st_mtime_ns > mtime:
+                return True
+
+        return False
+
+    # read index file in one pass (rebuilding it if stale, in memory only if
+    # field is not writable)
+    def load(self) -> None:
+        if self.stale:
+            self.rebuild(persist=os.access(self._tree.path, os.W_OK))
+            return
+
+        with open(self._index_path, 'r') as f:
+            lines = f.read().splitlines()
+
+        self._text = {}
+        for line in lines:
+            key, _, text = line.partition(' ')
+            self._text[key] = text
+        self._cache = {}
+
+    # Scan loose and packed nodes and rewrite index file. The scan is done
+    # holding lock of index, so nodes appended by other fields meanwhile are
+    # not lost by the rewrite.
+    def rebuild(self, persist: bool = True) -> None:
+        if not persist:
+            self._text = self._scan()
+            self._cache = {}
+            return
+
+        with fs.lock(self._tree.path, 'index'):
+            text = self._scan()
+            lines = ["{0} {1}\n".format(key, text[key]) for key in text]
+            fs.write_atomic(self._tree.path, self._index_path, ''.join(lines))
+
+        self._text = text
+        self._cache = {}
+
+    # return node JSON strings of loose and packed nodes
+    def _scan(self) -> dict:
+        self._packs.refresh()
+        text = {}
+        for key in os.listdir(self._dir):
+            text[key] = self._read(key)
+        for key in self._packs.keys('node'):
+            if key not in text:
+                text[key] = self._packs.read('node', key).decode('utf-8')
+
+        return text
+
+    # record node written by this field in index (appended holding lock of
+    # index, as other fields append to or rewrite it concurrently)
+    def add(self, key: str, text: str) -> None:
+        if key in self._text:
+            return
+
+        self._text[key] = text
+        with fs.lock(self._tree.path, 'index'):
+            with open(self._index_path, 'a') as f:
+                f.write("{0} {1}\n".format(key, text))
+
+    # return node JSON string as written
+    def text(self, key: str) -> str:
+        if key not in self._text:
+            # node may have been written by another field instance
             try:
-                return super().__getitem__(key)
-            except KeyError:
-                raise IdLookupError(key)
+                self._text[key] = self._read(key)
+            except FileNotFoundError:
+                try:
+                    self._text[key] = self._packs.read('node', key).decode('utf-8')
+                except KeyError:
+                    raise IdLookupError(key)
+
+        return self._text[key]
+
+    def __getitem__(self, key: str) -> dict:
+        if key not in self._cache:
+            self._cache[key] = self._parse(self.text(key))
+
+        return self._cache[key]
+
+    def __iter__(self):
+        if self.stale:
+            self.load()
+        for key in list(self._text):
+            yield key
+
+    def __contains__(self, key):
+        try:
+            self.text(key)
+        except IdLookupError:
+            return False
+
+        return True
+
+    def __len__(self):
+        return len(self._text)
     
     def __str__(self):
-        return self._tree.__str__
-
+        return self._tree.__str__()
 
 class Tree:
     def __init__(self, path):
         self.path = os.path.join(path, '.deltaflow')
         self.arrows = ArrowsIndex(self.path)
         self.nodes = NodesIndex(self)
+        self.cache = FrameCache()
+        self._origins = {}
+        self._origin_names = {}
+        self._origins_signature = None
+
+    # reload origins map if file changed since last read (by mtime & size)
+    def _load_origins(self) -> None:
+        path = os.path.join(self.path, 'origins')
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._origins_signature:
+            with open(path, 'r') as f:
+                obj = json.load(f)
+
+            self._origins = obj
+            self._origin_names = {node_id: name for name, node_id in obj.items()}
+            self._origins_signature = signature
 
     @property
-    def origins(self):
-        with open(os.path.join(self.path, 'origins'), 'r') as f:
-            obj = json.load(f)
-        
-        return obj
+    def origins(self) -> dict:
+        self._load_origins()
+        return dict(self._origins)
+
+    # write origins map (atomically, callers hold 'origins' lock) and update cache
+    def write_origins(self, origins: dict) -> None:
+        path = os.path.join(self.path, 'origins')
+        fs.write_atomic(self.path, path, json.dumps(origins))
+
+        stat = os.stat(path)
+        self._origins = dict(origins)
+        self._origin_names = {node_id: name for name, node_id in origins.items()}
+        self._origins_signature = (stat.st_mtime_ns, stat.st_size)
+
+    # read map of squash delta keys to [from node id, to node id]
+    def _read_squashes(self) -> dict:
+        path = os.path.join(self.path, 'squashes')
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_squashes(self, obj: dict) -> None:
+        path = os.path.join(self.path, 'squashes')
+        fs.write_atomic(self.path, path, json.dumps(obj))
+
+    @property # map of squashed node ids to {squashed-to node id: squash delta key}
+    def squashes(self) -> dict:
+        squashes = {}
+        for key, (from_id, to_id) in self._read_squashes().items():
+            squashes.setdefault(from_id, {})[to_id] = key
+
+        return squashes
+
+    # record squash delta key of a range of history
+    def add_squash(self, key: str, from_id: str, to_id: str) -> None:
+        with fs.lock(self.path, 'squashes'):
+            obj = self._read_squashes()
+            obj[key] = [from_id, to_id]
+            self._write_squashes(obj)
+
+    # forget squash delta keys
+    def remove_squashes(self, keys: Iterable[str]) -> None:
+        with fs.lock(self.path, 'squashes'):
+            obj = self._read_squashes()
+            for key in keys:
+                obj.pop(key, None)
+            self._write_squashes(obj)
+
+    @property # node ids of materialized checkpoints
+    def checkpoints(self) -> set:
+        return set(fs.list_checkpoints(self.path))
 
     # get origin name from given origin id
     def name_origin(self, origin_id: str) -> str:
-        name = None
-        for key in self.origins:
-            if self.origins[key] == origin_id:
-                name = key
-        if name is None:
+        self._load_origins()
+        if origin_id not in self._origin_names:
             raise KeyError('origin not found')
 
-        return name
+        return self._origin_names[origin_id]
 
     # return Node object for a given node_id
     def node(self, node_id: str) -> DeltaNode:
@@ -104,6 +269,10 @@ class Tree:
             
         return node
 
+    # point arrow to node (atomically, callers hold lock of arrow)
+    def write_arrow_head(self, name: str, node_id: str) -> None:
+        fs.write_atomic(self.path, os.path.join(self.path, 'arrows', name), node_id)
+
     # get arrow node_id pointer by arrow name
     def arrow_head(self, name: str) -> str:
         path = os.path.join(self.path, 'arrows', name)  
@@ -119,7 +288,7 @@ class Tree:
     def outline(self, node: DeltaNode) -> OrderedDict:
         path = os.path.join(self.path, 'nodes')
         outline = []
-        node_str = json.dumps(node._node)
+        node_str = self.nodes.text(node.id)
         outline.append((node.id, hash_node(node_str)))
 
         if node.type == 'origin':
@@ -128,7 +297,7 @@ class Tree:
 
         lineage = [node.id] + node.lineage
         for node_id in lineage[1:]:
-            node_str = json.dumps(self.nodes[node_id])
+            node_str = self.nodes.text(node_id)
             outline.append((node_id, hash_node(node_str)))
 
         outline = OrderedDict(reversed(outline))
@@ -0,0 +1,44 @@
+import os
+import numpy
+import pandas
+import pytest
+import deltaflow
+import deltaflow.api
+
+@pytest.fixture(autouse=True)
+def options():
+    # options are module globals, restore them after each test
+    saved = dict(deltaflow.api.__OPTIONS__)
+    yield deltaflow.api.__OPTIONS__
+    deltaflow.api.__OPTIONS__.clear()
+    deltaflow.api.__OPTIONS__.update(saved)
+
+@pytest.fixture
+def field(tmp_path) -> deltaflow.Field:
+    deltaflow.touch(str(tmp_path))
+    return deltaflow.Field(str(tmp_path))
+
+# DataFrame of float, integer and string columns
+def make_frame(rows: int = 100, seed: int = 0) -> pandas.DataFrame:
+    state = numpy.random.RandomState(seed)
+    return pandas.DataFrame({
+        'a': state.rand(rows),
+        'b': numpy.arange(rows),
+        'c': ['s{0}'.format(i) for i in range(rows)]
+    })
+
+# arrow 'w' with k commits
+def history(field, k: int):
+    field.add_origin(make_frame(40), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    for i in range(k):
+        data = arrow.proxy()
+        data.loc[i, 'a'] = -1.0 - i
+        data.loc[i + 1, 'c'] = 'x{0}'.format(i)
+        arrow.put(data)
+        if i == 4:
+            arrow.drop(data.loc[[30, 31]])
+        arrow.commit()
+
+    return arrow
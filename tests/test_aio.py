@@ -0,0 +1,45 @@
+import asyncio
+import warnings
+import pandas
+import deltaflow.aio as aio
+from deltaflow.aio import AsyncField
+from conftest import make_frame
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+def test_async_commit_and_shared_open(field, monkeypatch):
+    calls = []
+    replay = aio.replay
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return replay(*args, **kwargs)
+    monkeypatch.setattr(aio, 'replay', counting)
+
+    async def main():
+        afield = AsyncField(field.path)
+        await afield.add_origin(make_frame(50), 'o')
+        await afield.add_arrow(afield.tree.arrow_head('.o'), 'w')
+        arrow = await afield.open_arrow('w')
+        for i in range(3):
+            data = arrow.proxy()
+            data.loc[i, 'a'] = -1.0
+            arrow.put(data)
+            await arrow.commit()
+
+        afield.field.cache.clear()
+        calls.clear()
+        arrows = await asyncio.gather(*[afield.open_arrow('w') for _ in range(4)])
+        return arrow, arrows
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        arrow, arrows = run(main())
+    assert len(calls) == 1
+    for other in arrows:
+        assert other.head.id == arrow.head.id
+        pandas.testing.assert_frame_equal(other.proxy(), arrow.proxy())
@@ -0,0 +1,47 @@
+import pandas
+from deltaflow.cache import FrameCache
+from conftest import make_frame, history
+
+def test_cached_resolution_equals_replay(field):
+    arrow = history(field, 5)
+    field.tree.cache.clear()
+    full = field.arrow('w').proxy()
+    assert arrow.head.id in field.tree.cache
+
+    hits = field.tree.cache.hits
+    cached = field.arrow('w').proxy()
+    assert field.tree.cache.hits > hits
+    pandas.testing.assert_frame_equal(cached, full)
+    pandas.testing.assert_frame_equal(cached, arrow.proxy())
+
+def test_resolution_from_cached_ancestor(field):
+    arrow = history(field, 5)
+    parent = arrow.head.lineage[0]
+    field.tree.cache.clear()
+    field.add_arrow(parent, 'p')
+    field.arrow('p')
+    assert parent in field.tree.cache and arrow.head.id not in field.tree.cache
+
+    data = field.arrow('w').proxy()
+    field.tree.cache.clear()
+    pandas.testing.assert_frame_equal(data, field.arrow('w').proxy())
+
+def test_cached_frames_not_modified(field):
+    arrow = history(field, 2)
+    data = field.arrow('w').proxy()
+    other = field.arrow('w')
+    edit = other.proxy()
+    edit.loc[20, 'a'] = -5.0
+    other.put(edit)
+    pandas.testing.assert_frame_equal(field.arrow('w').proxy(), data)
+
+def test_eviction_by_budget():
+    cache = FrameCache(budget=10**9)
+    frames = [make_frame(100, seed) for seed in range(3)]
+    for i, data in enumerate(frames):
+        cache.put(str(i), data)
+    nbytes = cache.size // 3
+    cache.budget = 2 * nbytes
+    assert len(cache) == 2 and '0' not in cache
+    pandas.testing.assert_frame_equal(cache.get('2'), frames[2])
+    assert cache.stats['evictions'] == 1
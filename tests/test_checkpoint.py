@@ -0,0 +1,46 @@
+import os
+import pandas
+import deltaflow.fs as fs
+from conftest import history
+
+# resolve arrow without cache or checkpoints
+def full_replay(field, name: str, **kwargs) -> pandas.DataFrame:
+    checkpoints = os.path.join(field.tree.path, 'checkpoints')
+    moved = checkpoints + '.moved'
+    os.rename(checkpoints, moved)
+    try:
+        field.tree.cache.clear()
+        return field.arrow(name, **kwargs).proxy()
+    finally:
+        os.rename(moved, checkpoints)
+
+def test_automatic_checkpoints(field, options):
+    options['checkpoint_interval'] = 3
+    arrow = history(field, 8)
+    lineage = [arrow.head.id] + arrow.head.lineage
+    assert len(field.tree.checkpoints) == 2
+    assert field.tree.checkpoints <= set(lineage)
+
+    field.tree.cache.clear()
+    data = field.arrow('w').proxy()
+    pandas.testing.assert_frame_equal(data, full_replay(field, 'w'))
+    pandas.testing.assert_frame_equal(data, arrow.proxy())
+
+def test_checkpoint_resolution(field):
+    arrow = history(field, 6)
+    field.checkpoint(arrow.head.lineage[1])
+    field.tree.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('w').proxy(), full_replay(field, 'w'))
+
+    field.tree.cache.clear()
+    data = field.arrow('w', columns=['a', 'c']).proxy()
+    pandas.testing.assert_frame_equal(data, full_replay(field, 'w', columns=['a', 'c']))
+    assert field.verify(arrow.head.id)
+
+def test_checkpoint_retention(field, options):
+    options['checkpoint_interval'] = 2
+    options['checkpoint_retention'] = 2
+    arrow = history(field, 8)
+    checkpoints = fs.list_checkpoints(field.tree.path)
+    assert len(checkpoints) == 2
+    assert checkpoints[-1] == arrow.head.id
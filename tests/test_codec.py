@@ -0,0 +1,73 @@
+import os
+import numpy
+import pandas
+import pytest
+import deltaflow
+import deltaflow.fs as fs
+from deltaflow.codec import frame_codecs
+
+# numeric frame (any codec applies) or frame with a string column
+def codec_frame(numeric: bool) -> pandas.DataFrame:
+    state = numpy.random.RandomState(0)
+    data = pandas.DataFrame({'a': state.rand(40), 'b': numpy.arange(40)})
+    if not numeric:
+        data['c'] = ['s{0}'.format(i) for i in range(40)]
+    return data
+
+# Commit puts (dense and sparse), a row drop and a column extension with
+# given codec to a new field at path. Returns the field, data of arrow 'w'
+# and codecs recorded in put and extension blocks (sparse blocks store
+# arrays).
+def codec_history(path: str, codec: str, numeric: bool) -> tuple:
+    os.makedirs(path, exist_ok=True)
+    deltaflow.touch(path)
+    field = deltaflow.Field(path)
+    deltaflow.set_option('codec', codec)
+    field.add_origin(codec_frame(numeric), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    codecs = set()
+
+    data = arrow.proxy().copy()
+    data.loc[0:20, 'a'] = -1.0
+    if not numeric:
+        data.loc[0:20, 'c'] = 'y'
+    arrow.put(data)
+    arrow.commit()
+    data = arrow.proxy().copy()
+    data.loc[3, 'a'] = numpy.nan
+    data.loc[7, 'b'] = -7
+    arrow.put(data)
+    arrow.commit()
+    arrow.drop(arrow.proxy().loc[[5, 6]])
+    arrow.commit()
+    index = arrow.proxy().index
+    arrow.extend(pandas.DataFrame({'x': numpy.arange(len(index)) * 0.5}, index=index), axis=1)
+    arrow.commit()
+
+    for node_id in reversed([arrow.head.id] + arrow.head.lineage[:-1]):
+        with fs.DeltaFile(field.tree.path, node_id) as delta_file:
+            codecs.update(meta['codec'] for meta in delta_file.meta.values()
+                if meta['class'] in ('put', 'extend'))
+    return field, arrow.proxy(), codecs
+
+@pytest.mark.parametrize('numeric', [True, False])
+@pytest.mark.parametrize('name', sorted(frame_codecs))
+def test_codec_round_trip(tmp_path, name, numeric):
+    if not frame_codecs[name].available:
+        pytest.skip("compression library of codec '{0}' not installed".format(name))
+    plain, expected, _ = codec_history(str(tmp_path / 'plain'), None, numeric)
+    field, data, codecs = codec_history(str(tmp_path / name), name, numeric)
+    if name != 'numpy' or numeric:
+        assert codecs == {name}
+    else: # (put of strings falls back to a parquet codec)
+        assert len(codecs - {'numpy'}) == 1
+
+    for arrow_name in ('w', '.o'):
+        plain.cache.clear()
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(field.arrow(arrow_name).proxy(), 
+            plain.arrow(arrow_name).proxy())
+    pandas.testing.assert_frame_equal(data, expected)
+    field.cache.clear()
+    assert field.verify(field.arrow('w').head.id)
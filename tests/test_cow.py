@@ -0,0 +1,82 @@
+import numpy
+import pandas
+import pytest
+from deltaflow.operation import readonly
+from conftest import make_frame
+
+@pytest.fixture
+def arrow(field, options):
+    options['copy_on_write'] = True
+    field.add_origin(make_frame(20), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    return field.arrow('w')
+
+def test_readonly_view():
+    data = make_frame(20)
+    view = readonly(data)
+    pandas.testing.assert_frame_equal(view, data)
+    assert numpy.shares_memory(view['a'].to_numpy(), data['a'].to_numpy())
+    for col in data.columns:
+        assert not view[col].to_numpy().flags.writeable
+    with pytest.raises(ValueError):
+        view.loc[0, 'a'] = -1.0
+    assert data.loc[0, 'a'] != -1.0
+
+def test_readonly_extension_copies():
+    data = make_frame(20)
+    data['d'] = data['c'].astype('category')
+    view = readonly(data)
+    pandas.testing.assert_frame_equal(view, data)
+    assert not numpy.shares_memory(view['a'].to_numpy(), data['a'].to_numpy())
+
+def test_proxy_is_snapshot(arrow):
+    data = arrow.proxy().copy()
+    data.loc[0, 'a'] = 111.0
+    p1 = arrow.put(data)
+    data.loc[0, 'a'] = 222.0
+    p2 = arrow.put(data)
+    assert p1.loc[0, 'a'] == 111.0
+    assert p2.loc[0, 'a'] == 222.0
+
+    p3 = arrow.undo()
+    assert p3.loc[0, 'a'] == 111.0
+    assert p2.loc[0, 'a'] == 222.0
+    arrow.undo()
+    assert p1.loc[0, 'a'] == 111.0
+
+def test_batch_puts_in_place(arrow):
+    with arrow.batch() as batch:
+        for i in range(5):
+            data = arrow.stage.live.copy()
+            data.loc[i, 'a'] = -i - 1.0
+            arrow.put(data)
+    assert len(arrow.stage.stack) == 1
+    assert list(batch.data['a'][:5]) == [-1.0, -2.0, -3.0, -4.0, -5.0]
+    assert arrow.stage.base.loc[0, 'a'] != -1.0
+
+def test_put_copies_only_written_columns(arrow):
+    base = arrow.stage.base
+    p1 = arrow.proxy()
+    data = p1.copy()
+    data.loc[0, 'a'] = -1.0
+    p2 = arrow.put(data)
+    assert p2.loc[0, 'a'] == -1.0
+    assert p1.loc[0, 'a'] == base.loc[0, 'a'] != -1.0
+    for col in ('b', 'c'):
+        assert numpy.shares_memory(p2[col].to_numpy(), base[col].to_numpy())
+        assert numpy.shares_memory(p2[col].to_numpy(), p1[col].to_numpy())
+    assert not numpy.shares_memory(p2['a'].to_numpy(), base['a'].to_numpy())
+
+    data = p2.copy()
+    data.loc[1, 'b'] = -2
+    p3 = arrow.put(data)
+    assert p2.loc[1, 'b'] == base.loc[1, 'b']
+    assert numpy.shares_memory(p3['c'].to_numpy(), base['c'].to_numpy())
+    assert numpy.shares_memory(p3['a'].to_numpy(), p2['a'].to_numpy())
+
+    p4 = arrow.undo()
+    pandas.testing.assert_frame_equal(p4, p2)
+    assert p3.loc[1, 'b'] == -2
+    assert numpy.shares_memory(p4['c'].to_numpy(), base['c'].to_numpy())
+    arrow.undo()
+    pandas.testing.assert_frame_equal(arrow.proxy(), base)
@@ -0,0 +1,95 @@
+import os
+import numpy
+import pandas
+import pytest
+import deltaflow
+from deltaflow.delta import align, extract, extract_incremental
+from conftest import make_frame
+
+def change_dtype(arrow):
+    data = arrow.proxy().copy()
+    data.loc[3, 'b'] = 0.5
+    data.loc[4, 'a'] = -1.0
+    arrow.put(data)
+
+def set_nan(arrow):
+    data = arrow.proxy().copy()
+    data.loc[[2, 7], 'a'] = numpy.nan
+    data.loc[5, 'c'] = None
+    arrow.put(data)
+
+def drop_rows(arrow):
+    data = arrow.proxy().copy()
+    data.loc[1:4, 'a'] = -1.0
+    arrow.put(data)
+    arrow.drop(arrow.proxy().loc[[2, 10]])
+    data = arrow.proxy().copy()
+    data.loc[11, 'b'] = -11
+    arrow.put(data)
+
+def drop_columns(arrow):
+    data = arrow.proxy().copy()
+    data.loc[0:5, ['a', 'b']] = [-1.0, -2]
+    arrow.put(data)
+    arrow.drop('a', axis=1)
+
+def extend(arrow):
+    data = arrow.proxy()
+    arrow.extend(pandas.DataFrame({'x': numpy.arange(20.0)}, index=data.index), axis=1)
+    arrow.extend(make_frame(25).iloc[20:].assign(x=-1.0), axis=0)
+    data = arrow.proxy().copy()
+    data.loc[0, 'x'] = 100.0
+    data.loc[21, 'a'] = 100.0
+    data.loc[6, 'c'] = 'y'
+    arrow.put(data)
+
+EDITS = [change_dtype, set_nan, drop_rows, drop_columns, extend]
+
+def staged_arrow(path: str, edit):
+    os.makedirs(path, exist_ok=True)
+    deltaflow.touch(path)
+    field = deltaflow.Field(path)
+    field.add_origin(make_frame(20), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    edit(arrow)
+    return field, arrow
+
+def assert_same_diff(a, b):
+    assert (a['put'] is None) == (b['put'] is None)
+    if a['put'] is not None:
+        (a_values, a_mask, a_dtypes), (b_values, b_mask, b_dtypes) = a['put'], b['put']
+        numpy.testing.assert_array_equal(a_mask, b_mask)
+        pandas.testing.assert_frame_equal(a_values.where(a_mask), b_values.where(b_mask))
+        assert (a_dtypes is None) == (b_dtypes is None)
+        if a_dtypes is not None:
+            pandas.testing.assert_series_equal(a_dtypes, b_dtypes)
+    for axis in (0, 1):
+        a_ext, b_ext = a['extend'][axis], b['extend'][axis]
+        assert (a_ext is None) == (b_ext is None)
+        if a_ext is not None:
+            pandas.testing.assert_frame_equal(a_ext, b_ext)
+
+@pytest.mark.parametrize('edit', EDITS)
+def test_incremental_equals_full_diff(tmp_path, edit):
+    _, arrow = staged_arrow(str(tmp_path), edit)
+    diff = align(arrow.stage, {})
+    incremental = extract_incremental(arrow.stage, dict(diff))
+    assert incremental is not None
+    assert_same_diff(incremental, extract(arrow.stage, dict(diff)))
+
+@pytest.mark.parametrize('edit', EDITS)
+def test_incremental_equals_full_delta(tmp_path, options, edit):
+    contents, frames = [], []
+    for mode in ('incremental', 'full'):
+        options['delta_build'] = mode
+        field, arrow = staged_arrow(str(tmp_path / mode), edit)
+        frames.append(arrow.proxy())
+        arrow.commit()
+        with open(os.path.join(field.tree.path, 'deltas', arrow.head.id + '.delta'), 'rb') as f:
+            contents.append(f.read())
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(field.arrow('w').proxy(), frames[-1])
+
+    assert contents[0] == contents[1]
+    pandas.testing.assert_frame_equal(frames[0], frames[1])
@@ -0,0 +1,55 @@
+import os
+import mmap
+import pandas
+import pytest
+import deltaflow
+from deltaflow.fs import PartitionReader
+from conftest import history
+
+# paths of files mapped into this process
+def mapped_paths() -> set:
+    with open('/proc/self/maps', 'r') as f:
+        return set(line.split()[-1] for line in f if line.count(' ') >= 5)
+
+@pytest.mark.skipif(not os.path.isfile('/proc/self/maps'), reason='requires /proc')
+def test_nodes_leave_no_mapped_delta(field):
+    arrow = history(field, 3)
+    path = os.path.join(field.tree.path, 'deltas', arrow.head.id + '.delta')
+    nodes = [field.tree.node(arrow.head.id) for _ in range(3)]
+    assert path not in mapped_paths()
+
+    block = nodes[0].delta[1]
+    assert block is not None
+    assert 'BLOCKS' in str(nodes[0].delta)
+    assert path not in mapped_paths()
+
+def test_views_share_buffer(tmp_path):
+    path = str(tmp_path / 'data')
+    with open(path, 'wb') as f:
+        f.write(bytes(range(100)))
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    reader = PartitionReader(buffer, [(10, 50)])
+    reader.seek(5)
+    assert reader.read(5) == bytes(range(15, 20))
+    views = reader.views()
+    view = views.read(5)
+    assert isinstance(view, memoryview) and view == bytes(range(20, 25))
+    assert reader.tell() == 10 and views.tell() == 15
+    view.release()
+    buffer.close()
+
+def test_parquet_blocks_read_from_views(field, options, monkeypatch):
+    options['codec'] = 'parquet'
+    arrow = history(field, 2)
+    reads = []
+    read = PartitionReader.read
+    def record(self, n=None):
+        out = read(self, n)
+        reads.append(type(out))
+        return out
+    monkeypatch.setattr(PartitionReader, 'read', record)
+    field.cache.clear()
+    data = deltaflow.Field(field.path).arrow('w').proxy()
+    pandas.testing.assert_frame_equal(data, arrow.proxy())
+    assert memoryview in reads and bytes not in reads
@@ -0,0 +1,71 @@
+import os
+import time
+import pytest
+import deltaflow.fs as fs
+from deltaflow.errors import LockError
+from conftest import make_frame
+
+# commit k puts of values from start on arrow
+def work(arrow, k: int, start: float):
+    for i in range(k):
+        data = arrow.proxy()
+        data.loc[data.index[i], 'a'] = start + i
+        arrow.put(data)
+        arrow.commit()
+
+    return arrow
+
+@pytest.fixture
+def arrows(field):
+    field.add_origin(make_frame(30), 'o')
+    field.add_origin(make_frame(30, seed=1), 'p')
+    for name, origin in (('w', 'o'), ('x', 'o'), ('y', 'p')):
+        field.add_arrow(field.tree.origins[origin], name)
+
+    return {name: work(field.arrow(name), 3, 1000.0 * k) 
+        for k, name in enumerate(('w', 'x', 'y'))}
+
+def test_gc_keeps_reachable(field, arrows):
+    report = field.gc()
+    assert report['nodes'] == 0 and report['deltas'] == 0
+
+def test_gc_collects_unreachable(field, arrows):
+    w = arrows['w']
+    field.remove_arrow('x')
+    report = field.gc(dry_run=True)
+    assert report['nodes'] == 3 and report['deltas'] == 3
+    assert os.path.isfile(os.path.join(field.tree.path, 'nodes', arrows['x'].head.id))
+
+    field.gc()
+    assert arrows['x'].head.id not in field.tree.nodes
+    field.tree.cache.clear()
+    assert field.verify(w.head.id)
+    assert field.arrow('w').proxy().equals(w.proxy())
+
+def test_gc_collects_origins(field, arrows):
+    for name in ('y', '.p'):
+        field.remove_arrow(name)
+    report = field.gc()
+    assert report['origins'] == 1 and report['nodes'] == 4
+    assert 'p' not in field.tree.origins
+    assert not os.path.exists(os.path.join(field.path, 'p.origin'))
+
+def test_gc_grace(field, arrows):
+    field.remove_arrow('x')
+    report = field.gc(grace=3600)
+    assert report['nodes'] == 0 and report['deltas'] == 0
+    assert arrows['x'].head.id in field.tree.nodes
+
+def test_gc_archive(field, arrows, tmp_path):
+    archive = str(tmp_path / 'archive')
+    head = arrows['x'].head.id
+    field.remove_arrow('x')
+    field.gc(archive=archive)
+    assert os.path.isfile(os.path.join(archive, 'nodes', head))
+    assert os.path.isfile(os.path.join(archive, 'deltas', head + '.delta'))
+
+def test_gc_waits_for_objects_lock(field, arrows, options):
+    options['lock_timeout'] = 0.1
+    with fs.lock(field.tree.path, 'objects'):
+        with pytest.raises(LockError):
+            field.gc()
@@ -0,0 +1,109 @@
+import numpy
+import pytest
+import pandas
+from deltaflow.hash import Digest, CHUNK_ROWS, hash_data
+from deltaflow.resolve import apply_delta
+from conftest import make_frame
+
+# commit random extensions, drops and puts of columns on arrow 'w'
+def random_history(field, seed: int, commits: int = 12):
+    state = numpy.random.RandomState(seed)
+    field.add_origin(make_frame(50, seed), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    for k in range(commits):
+        data = arrow.proxy()
+        action = state.randint(3)
+        if action == 0 or data.shape[1] < 2:
+            ext = pandas.DataFrame({'x{0}'.format(k): state.rand(data.shape[0])}, 
+                index=data.index)
+            arrow.extend(ext, axis=1)
+        elif action == 1:
+            arrow.drop(str(data.columns[state.randint(data.shape[1])]), axis=1)
+        else:
+            col = data.columns[state.randint(data.shape[1])]
+            if data[col].dtype == object:
+                data[col] = data[col] + 'y'
+            else:
+                data[col] = data[col] + 1
+            arrow.put(data)
+        arrow.commit()
+
+    return arrow
+
+@pytest.mark.parametrize('seed', range(6))
+def test_carried_digest_equals_fresh(field, seed):
+    arrow = random_history(field, seed)
+    data = field.arrow('.o').proxy()
+    digest = Digest(data)
+    # apply every delta to one digest without refreshing it in between
+    for node_id in reversed([arrow.head.id] + arrow.head.lineage[:-1]):
+        data = apply_delta(field.tree, node_id, data, digest)
+    pandas.testing.assert_frame_equal(data, arrow.proxy())
+    assert digest.refresh(data).hexdigest() == Digest(data).hexdigest()
+
+def test_extend_then_drop_column(field):
+    field.add_origin(make_frame(50), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    data = arrow.proxy()
+    arrow.extend(pandas.DataFrame({'x': numpy.ones(50)}, index=data.index), axis=1)
+    arrow.commit()
+    arrow.drop('x', axis=1)
+    arrow.drop('a', axis=1)
+    arrow.commit()
+
+    data = field.arrow('.o').proxy()
+    digest = Digest(data)
+    for node_id in reversed([arrow.head.id] + arrow.head.lineage[:-1]):
+        data = apply_delta(field.tree, node_id, data, digest)
+    assert list(data.columns) == ['b', 'c']
+    assert digest.refresh(data).hexdigest() == Digest(data).hexdigest()
+
+# node ids of history below as computed by the original flat hash
+BASELINE_IDS = [
+    '0a28f3d6c7b20bcf555ca16d42089f379dffe081',
+    '482aa03262db2fa0e609f96f385a9e22bd3ee59a',
+    '8df1dc226630452be9e05c54346bde7310fa0839',
+    '72578e28bb5643067e00b111a926789a6559b414'
+]
+
+def test_scheme_1_ids_unchanged(field, options):
+    options['hash_scheme'] = 1
+    data = pandas.DataFrame({
+        'a': numpy.arange(20) / 4.0,
+        'b': numpy.arange(20),
+        'c': ['s{0}'.format(i) for i in range(20)]
+    })
+    field.add_origin(data, 'o')
+    ids = [field.tree.origins['o']]
+    field.add_arrow(ids[0], 'w')
+    arrow = field.arrow('w')
+    data = arrow.proxy()
+    data.loc[3, 'a'] = -1.0
+    data.loc[5, 'c'] = 'z'
+    arrow.put(data)
+    arrow.commit()
+    ids.append(arrow.head.id)
+    arrow.drop(data.loc[[7, 8]])
+    arrow.commit()
+    ids.append(arrow.head.id)
+    arrow.extend(pandas.Series(numpy.arange(18), index=arrow.proxy().index, name='d'), axis=1)
+    arrow.commit()
+    ids.append(arrow.head.id)
+    assert ids == BASELINE_IDS
+
+@pytest.mark.parametrize('seed', range(3))
+def test_commit_digest_equals_fresh(field, seed):
+    arrow = random_history(field, seed)
+    assert arrow._digest.hexdigest() == Digest(arrow.proxy()).hexdigest()
+
+def test_multi_block_digest(options):
+    data = make_frame(2 * CHUNK_ROWS + 10)
+    digest = Digest(data)
+    assert len(digest.index) == 3
+    data.iloc[CHUNK_ROWS + 1, 0] = -1.0
+    digest.mark_cells([0], [CHUNK_ROWS + 1])
+    assert digest.refresh(data).hexdigest() == Digest(data).hexdigest()
+    assert hash_data(data, 2, workers=4) == hash_data(data, 2, workers=1)
+    assert hash_data(data, 1, workers=4) == hash_data(data, 1, workers=1)
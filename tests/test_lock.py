@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import socket
+import threading
+import multiprocessing
+import pytest
+import deltaflow
+import deltaflow.fs as fs
+import deltaflow.tree as tree_module
+from deltaflow.tree import NodesIndex
+from deltaflow.errors import HeadMovedError, LockError
+from conftest import make_frame
+
+fork = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(),
+    reason='requires fork start method')
+
+# add large nodes to index of field at path
+def add_nodes(args):
+    path, k = args
+    field = deltaflow.Field(path)
+    for i in range(10):
+        key = '{0:040x}'.format(k * 100 + i)
+        field.tree.nodes.add(key, json.dumps({'type': 'delta', 'pad': 'x' * 2**17}))
+
+@fork
+def test_concurrent_index_appends(field):
+    with multiprocessing.get_context('fork').Pool(4) as pool:
+        pool.map(add_nodes, [(field.path, k) for k in range(4)])
+
+    with open(os.path.join(field.tree.path, 'index'), 'r') as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 40
+    for line in lines:
+        key, _, text = line.partition(' ')
+        assert json.loads(text)['type'] == 'delta'
+
+def test_head_moved(field):
+    field.add_origin(make_frame(20), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    a, b = field.arrow('w'), field.arrow('w')
+    for arrow, value in ((a, -1.0), (b, -2.0)):
+        data = arrow.proxy()
+        data.loc[0, 'a'] = value
+        arrow.put(data)
+    a.commit()
+    with pytest.raises(HeadMovedError):
+        b.commit()
+    assert field.tree.arrow_head('w') == a.head.id
+    assert [f for f in os.listdir(os.path.join(field.tree.path, 'locks'))
+        if f.endswith('.lock')] == []
+
+def test_parallel_commits(field, options, monkeypatch):
+    options['lock_timeout'] = 5
+    field.add_origin(make_frame(20), 'o')
+    for name in ('w', 'v'):
+        field.add_arrow(field.tree.origins['o'], name)
+    w, v = field.arrow('w'), field.arrow('v')
+    for arrow, value in ((w, -1.0), (v, -2.0)):
+        data = arrow.proxy()
+        data.loc[0, 'a'] = value
+        arrow.put(data)
+
+    # commit of 'w' stalls while writing its delta, holding its locks
+    entered, release = threading.Event(), threading.Event()
+    write_delta = fs.write_delta
+    def stalled(path, node_id, delta):
+        if threading.current_thread() is not threading.main_thread():
+            entered.set()
+            assert release.wait(5)
+        write_delta(path, node_id, delta)
+    monkeypatch.setattr(fs, 'write_delta', stalled)
+
+    thread = threading.Thread(target=w.commit)
+    thread.start()
+    try:
+        assert entered.wait(5)
+        start = time.time()
+        v.commit()
+        assert time.time() - start < 1
+        assert thread.is_alive()
+        # (exclusive holders wait for the stalled commit)
+        options['lock_timeout'] = 0.1
+        with pytest.raises(LockError):
+            field.gc()
+    finally:
+        release.set()
+        thread.join()
+
+    assert field.tree.arrow_head('w') == w.head.id
+    assert field.tree.arrow_head('v') == v.head.id
+    assert w.head.id != v.head.id
+    assert os.listdir(os.path.join(field.tree.path, 'locks', 'objects.shared')) == []
+
+def test_shared_lock_waits_for_exclusive(field, options):
+    options['lock_timeout'] = 0.1
+    with fs.lock(field.tree.path, 'objects'):
+        with pytest.raises(LockError):
+            with fs.lock(field.tree.path, 'objects', shared=True):
+                pass
+    with fs.lock(field.tree.path, 'objects', shared=True):
+        with fs.lock(field.tree.path, 'objects', shared=True):
+            pass
+
+# write lock file of given name as if held by pid on host
+def plant_lock(field, name: str, content: str) -> str:
+    lock_path = os.path.join(field.tree.path, 'locks', name + '.lock')
+    with open(lock_path, 'w') as f:
+        f.write(content)
+
+    return lock_path
+
+def exited_pid() -> int:
+    proc = multiprocessing.Process(target=int)
+    proc.start()
+    proc.join()
+    return proc.pid
+
+@pytest.mark.skipif(os.name != 'posix', reason='requires POSIX process checks')
+def test_stale_lock_is_broken(field, options):
+    options['lock_timeout'] = 5
+    lock_path = plant_lock(field, 'objects', '{0} {1}'.format(exited_pid(), socket.gethostname()))
+    start = time.time()
+    with fs.lock(field.tree.path, 'objects'):
+        assert fs.lock_holder(lock_path) == (os.getpid(), socket.gethostname())
+    assert time.time() - start < 1
+    assert [f for f in os.listdir(os.path.join(field.tree.path, 'locks'))
+        if f.endswith('.lock')] == []
+
+def test_empty_lock_is_broken_after_timeout(field, options):
+    options['lock_timeout'] = 0.2
+    lock_path = plant_lock(field, 'objects', '')
+    past = time.time() - 1
+    os.utime(lock_path, (past, past))
+    with fs.lock(field.tree.path, 'objects'):
+        pass
+
+def test_live_lock_of_other_host(field, options):
+    options['lock_timeout'] = 0.1
+    plant_lock(field, 'objects', '{0} other-host'.format(exited_pid()))
+    with pytest.raises(LockError) as info:
+        with fs.lock(field.tree.path, 'objects'):
+            pass
+    assert "on 'other-host'" in str(info.value)
+
+def test_live_lock_of_this_host(field, options):
+    options['lock_timeout'] = 0.1
+    plant_lock(field, 'objects', '{0} {1}'.format(os.getpid(), socket.gethostname()))
+    with pytest.raises(LockError):
+        with fs.lock(field.tree.path, 'objects'):
+            pass
+
+@pytest.mark.skipif(os.name != 'posix', reason='requires POSIX process checks')
+def test_stale_shared_entry_is_removed(field, options):
+    options['lock_timeout'] = 5
+    shared_dir = os.path.join(field.tree.path, 'locks', 'objects.shared')
+    os.makedirs(shared_dir, exist_ok=True)
+    with open(os.path.join(shared_dir, 'entry'), 'w') as f:
+        f.write('{0} {1}'.format(exited_pid(), socket.gethostname()))
+    start = time.time()
+    with fs.lock(field.tree.path, 'objects'):
+        assert os.listdir(shared_dir) == []
+    assert time.time() - start < 1
+
+def test_append_during_index_rebuild(field, monkeypatch):
+    field.add_origin(make_frame(20), 'o')
+    other = deltaflow.Field(field.path)
+    scanned, done = threading.Event(), threading.Event()
+    scan = NodesIndex._scan
+    def slow_scan(self):
+        text = scan(self)
+        scanned.set()
+        time.sleep(0.2)
+        return text
+    monkeypatch.setattr(NodesIndex, '_scan', slow_scan)
+
+    thread = threading.Thread(target=lambda: (field.tree.nodes.rebuild(), done.set()))
+    thread.start()
+    assert scanned.wait(5)
+    # (waits for the rebuild holding the index lock, then appends)
+    other.tree.nodes.add('{0:040x}'.format(1), json.dumps({'type': 'delta'}))
+    assert done.is_set()
+    thread.join()
+
+    with open(os.path.join(field.tree.path, 'index'), 'r') as f:
+        keys = [line.partition(' ')[0] for line in f.read().splitlines()]
+    assert '{0:040x}'.format(1) in keys
+    assert field.tree.origins['o'] in keys
+
+def test_read_only_field_index_not_written(field, monkeypatch):
+    field.add_origin(make_frame(20), 'o')
+    index_path = os.path.join(field.tree.path, 'index')
+    os.remove(index_path)
+    monkeypatch.setattr(tree_module.os, 'access', lambda path, mode: False)
+    other = deltaflow.Field(field.path)
+    assert not os.path.exists(index_path)
+    assert list(other.tree.nodes) == [field.tree.origins['o']]
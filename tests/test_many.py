@@ -0,0 +1,56 @@
+import pandas
+import pytest
+from conftest import make_frame
+
+# Arrows 't' (trunk), 'b0'..'b3' branching off it, 'c1' off 'b1', 'same'
+# sharing head of 't' and 'orig' at the origin. Returns names.
+def forked_arrows(field) -> list:
+    field.add_origin(make_frame(60), 'o')
+    origin = field.tree.origins['o']
+    field.add_arrow(origin, 't')
+    trunk = field.arrow('t')
+    for i in range(4):
+        data = trunk.proxy().copy()
+        data.loc[i, 'a'] = -1.0 - i
+        trunk.put(data)
+        trunk.commit()
+
+    names = ['t']
+    for k in range(4):
+        name = 'b{0}'.format(k)
+        field.add_arrow(trunk.head.id, name)
+        names.append(name)
+        arrow = field.arrow(name)
+        for j in range(k % 2 + 1):
+            data = arrow.proxy().copy()
+            data.loc[10 + j, 'b'] = 1000 * k + j
+            arrow.put(data)
+            arrow.commit()
+        if k == 1:
+            field.add_arrow(arrow.head.id, 'c1')
+            names.append('c1')
+            child = field.arrow('c1')
+            child.drop(child.proxy().loc[[50]])
+            child.commit()
+
+    field.add_arrow(origin, 'orig')
+    field.add_arrow(trunk.head.id, 'same')
+    return names + ['orig', 'same']
+
+@pytest.mark.parametrize('processes', [None, 2])
+def test_resolve_many_equals_resolve(field, processes):
+    names = forked_arrows(field)
+    expected = {}
+    for name in names:
+        field.cache.clear()
+        expected[name] = field.arrow(name).proxy()
+
+    field.cache.clear()
+    frames = field.resolve_many(names, processes=processes)
+    assert list(frames) == names
+    for name in names:
+        pandas.testing.assert_frame_equal(frames[name], expected[name])
+    # (arrows at the same node get frames of their own)
+    assert frames['t'] is not frames['same']
+    frames['t'].loc[0, 'a'] = 0.0
+    assert frames['same'].loc[0, 'a'] == -1.0
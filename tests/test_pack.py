@@ -0,0 +1,76 @@
+import os
+import hashlib
+import pytest
+import deltaflow
+import deltaflow.fs as fs
+from deltaflow.pack import Pack, write_pack, get_store
+from deltaflow.errors import LockError
+from conftest import history
+
+def key(i: int) -> str:
+    return hashlib.sha1(str(i).encode('utf-8')).hexdigest()
+
+def test_pack_round_trip(field):
+    objects = [('node', key(i), 'node {0}'.format(i).encode('utf-8')) for i in range(20)]
+    objects += [('delta', key(i), bytes(range(i % 256)) * 10) for i in range(30)]
+    path = write_pack(field.tree.path, iter(objects))
+    pack = Pack(path)
+    for kind, k, content in objects:
+        assert (kind, k) in pack
+        assert pack.read(kind, k) == content
+        assert pack.size(kind, k) == len(content)
+    assert sorted(pack.keys('node')) == sorted(k for kind, k, _ in objects if kind == 'node')
+    assert ('node', key(99)) not in pack
+    pack.close()
+
+def test_pack_hidden_while_written(field):
+    store = get_store(field.tree.path)
+    def objects():
+        for i in range(5):
+            # (readers scanning packs meanwhile find no partial pack)
+            store.refresh()
+            assert store.packs == []
+            assert os.listdir(os.path.join(field.tree.path, 'packs')) == []
+            yield 'node', key(i), b'x' * i
+
+    path = write_pack(field.tree.path, objects())
+    store.refresh()
+    assert [pack.path for pack in store.packs] == [path]
+    assert os.listdir(os.path.join(field.tree.path, 'tmp')) == []
+
+def test_repack(field):
+    arrow = history(field, 4)
+    path = field.repack()
+    assert os.path.isfile(path + '.pack')
+    assert os.listdir(os.path.join(field.tree.path, 'nodes')) == []
+    assert [f for f in os.listdir(os.path.join(field.tree.path, 'deltas'))] == []
+
+    other = deltaflow.Field(field.path)
+    assert other.verify(arrow.head.id)
+    assert other.arrow('w').proxy().equals(arrow.proxy())
+
+def test_repack_consolidate(field):
+    arrow = history(field, 2)
+    first = field.repack()
+    data = arrow.proxy()
+    data.loc[10, 'a'] = 5.0
+    arrow.put(data)
+    arrow.commit()
+    second = field.repack(consolidate=True)
+    packs = os.listdir(os.path.join(field.tree.path, 'packs'))
+    assert sorted(packs) == sorted(os.path.basename(second) + ext for ext in ('.idx', '.pack'))
+    assert first != second
+
+    other = deltaflow.Field(field.path)
+    assert len(list(other.tree.nodes)) == 4
+    assert other.arrow('w').proxy().equals(arrow.proxy())
+
+def test_repack_nothing(field):
+    assert field.repack() is None
+
+def test_repack_waits_for_objects_lock(field, options):
+    history(field, 1)
+    options['lock_timeout'] = 0.1
+    with fs.lock(field.tree.path, 'objects'):
+        with pytest.raises(LockError):
+            field.repack()
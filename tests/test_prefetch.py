@@ -0,0 +1,56 @@
+import threading
+import numpy
+import pandas
+import pytest
+import deltaflow.resolve
+from conftest import make_frame
+
+# arrow 'w' with puts, drops and extensions over k commits
+def long_history(field, k: int):
+    field.add_origin(make_frame(50), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    for i in range(k):
+        data = arrow.proxy().copy()
+        data.iloc[i, 0] = -1.0 - i
+        data.iloc[i + 1, 2] = 'x{0}'.format(i)
+        arrow.put(data)
+        if i % 4 == 1:
+            arrow.drop(arrow.proxy().iloc[[-1]])
+        if i == 6:
+            index = arrow.proxy().index
+            arrow.extend(pandas.Series(numpy.arange(len(index)), index=index, name='d'), axis=1)
+        arrow.commit()
+
+    return arrow
+
+def resolve_all(field) -> list:
+    frames = []
+    for kwargs in ({}, {'columns': ['a', 'c']}, {'rows': (5, 30)}):
+        field.cache.clear()
+        frames.append(field.arrow('w', **kwargs).proxy())
+    field.cache.clear()
+    assert field.verify(field.arrow('w').head.id)
+
+    return frames
+
+@pytest.mark.parametrize('depth', [1, 3, 20])
+def test_prefetch_equals_sequential(field, options, monkeypatch, depth):
+    arrow = long_history(field, 12)
+    options['prefetch'] = 0
+    expected = resolve_all(field)
+    pandas.testing.assert_frame_equal(expected[0], arrow.proxy())
+
+    options['prefetch'] = depth
+    for data, other in zip(resolve_all(field), expected):
+        pandas.testing.assert_frame_equal(data, other)
+
+    # (deltas were parsed by the prefetch threads)
+    threads = set()
+    read_delta = deltaflow.resolve.read_delta
+    def record(*args):
+        threads.add(threading.current_thread())
+        return read_delta(*args)
+    monkeypatch.setattr(deltaflow.resolve, 'read_delta', record)
+    resolve_all(field)
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,34 @@
+import numpy
+import pandas
+import pytest
+from conftest import make_frame
+
+# arrow 'w' with a column extended and later dropped between sampled nodes
+def extend_drop_history(field):
+    field.add_origin(make_frame(50), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    data = arrow.proxy()
+    arrow.extend(pandas.DataFrame({'x': numpy.ones(50)}, index=data.index), axis=1)
+    arrow.commit() # 1
+    data = arrow.proxy()
+    data['x'] = 2.0
+    arrow.put(data)
+    arrow.commit() # 2
+    arrow.drop('x', axis=1)
+    arrow.commit() # 3
+    data = arrow.proxy()
+    data['b'] = data['b'] * 2
+    arrow.put(data)
+    arrow.commit() # 4
+
+    return arrow
+
+@pytest.mark.parametrize('mode,sample', [('sampled', 2), ('sampled', 3), ('sampled', 4),
+    ('head-only', 10)])
+def test_verify_mode_carries_digest(field, options, mode, sample):
+    expected = extend_drop_history(field).proxy()
+    options['verify'] = mode
+    options['verify_sample'] = sample
+    field.tree.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('w').proxy(), expected)
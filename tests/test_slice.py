@@ -0,0 +1,76 @@
+import os
+import numpy
+import pandas
+import pytest
+import deltaflow.fs as fs
+from deltaflow.resolve import RowSlice
+from conftest import make_frame
+
+SLICES = [(10, 40), (None, 25), (33, None), (200, 300), lambda index: index % 2 == 0]
+
+# expected rows of data for slice
+def select(data, rows):
+    if callable(rows):
+        return data[rows(data.index)]
+    return data.loc[rows[0]:rows[1]]
+
+# arrow 'w' of origin with given index, with puts, a row drop, a column
+# extension and a checkpoint
+def slice_history(field, index):
+    data = make_frame(60).set_index(index)
+    field.add_origin(data, 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    for i in range(6):
+        data = arrow.proxy().copy()
+        data.iloc[i * 7, 0] = -1.0 - i
+        arrow.put(data)
+        if i == 1:
+            arrow.drop(arrow.proxy().iloc[[12, 13]])
+        if i == 3:
+            index = arrow.proxy().index
+            arrow.extend(pandas.Series(numpy.arange(len(index)), index=index, name='d'), axis=1)
+        arrow.commit()
+        if i == 2:
+            field.checkpoint(arrow.head.id)
+
+    return arrow
+
+@pytest.fixture(params=['range', 'labels'])
+def index(request):
+    if request.param == 'range':
+        return pandas.RangeIndex(60)
+    return pandas.Index(numpy.arange(60) * 2, dtype='int64')
+
+@pytest.mark.parametrize('rows', SLICES)
+def test_slice_equals_full_replay(field, options, index, rows):
+    options['row_group_size'] = 10
+    arrow = slice_history(field, index)
+    lineage = [arrow.head.id] + arrow.head.lineage
+    for k, node_id in enumerate(lineage):
+        field.add_arrow(node_id, 'at{0}'.format(k))
+        field.cache.clear()
+        full = field.arrow('at{0}'.format(k)).proxy()
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(
+            field.arrow('at{0}'.format(k), rows=rows).proxy(), select(full, rows))
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(
+            field.arrow('at{0}'.format(k), columns=['a'], rows=rows).proxy(),
+            select(full, rows)[['a']])
+
+def test_row_groups_pushdown(field, options):
+    options['row_group_size'] = 10
+    data = make_frame(60).set_index(pandas.Index(numpy.arange(60) * 2, dtype='int64'))
+    field.add_origin(data, 'o')
+    path = os.path.join(field.path, 'o.origin')
+    part = fs.read_parquet(path, rows=RowSlice((20, 39)))
+    assert part.shape[0] == 10
+    pandas.testing.assert_frame_equal(part, data.iloc[10:20])
+
+# range indexes are not stored as a column, so row groups are not pruned
+def test_range_index_reads_all_row_groups(field, options):
+    options['row_group_size'] = 10
+    field.add_origin(make_frame(60), 'o')
+    path = os.path.join(field.path, 'o.origin')
+    assert fs.read_parquet(path, rows=RowSlice((20, 29))).shape[0] == 60
@@ -0,0 +1,59 @@
+import os
+import numpy
+import pandas
+import pytest
+import deltaflow
+import deltaflow.fs as fs
+from conftest import make_frame
+
+# diagonal of 3 cells (a third of their 3x3 region)
+def few_cells(data):
+    data.loc[0, 'a'] = -1.0
+    data.loc[5, 'b'] = -2
+    data.loc[9, 'c'] = 'x'
+
+# full 10x2 region
+def many_cells(data):
+    data.loc[0:9, 'a'] = -1.0
+    data.loc[0:9, 'b'] = -2
+
+# commit edit to arrow 'w' of new field at path given sparse density,
+# return block kinds of the delta and resolved data
+def commit_edit(path: str, edit, density) -> tuple:
+    os.makedirs(path, exist_ok=True)
+    deltaflow.touch(path)
+    field = deltaflow.Field(path)
+    deltaflow.set_option('sparse_density', density)
+    field.add_origin(make_frame(20), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    data = arrow.proxy().copy()
+    edit(data)
+    arrow.put(data)
+    arrow.commit()
+    with fs.DeltaFile(field.tree.path, arrow.head.id) as delta_file:
+        kinds = [meta['class'] for meta in delta_file.meta.values()]
+
+    field.cache.clear()
+    return kinds, field.arrow('w').proxy()
+
+@pytest.mark.parametrize('edit, kind', [(few_cells, 'sparse'), (many_cells, 'put')])
+def test_sparse_threshold(tmp_path, edit, kind):
+    kinds, data = commit_edit(str(tmp_path / 'sparse'), edit, 0.4)
+    assert kinds == [kind]
+    dense_kinds, dense = commit_edit(str(tmp_path / 'dense'), edit, None)
+    assert dense_kinds == ['put']
+    pandas.testing.assert_frame_equal(data, dense)
+
+    expected = make_frame(20)
+    edit(expected)
+    pandas.testing.assert_frame_equal(data, expected)
+
+def test_na_cells_are_sparse(tmp_path):
+    def edit(data):
+        many_cells(data)
+        data.loc[3, 'a'] = numpy.nan
+    kinds, data = commit_edit(str(tmp_path), edit, None)
+    assert kinds == ['sparse']
+    assert numpy.isnan(data.loc[3, 'a'])
+    assert data.loc[4, 'a'] == -1.0
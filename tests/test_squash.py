@@ -0,0 +1,82 @@
+import numpy
+import pandas
+from conftest import make_frame
+
+# arrow 'w' with puts, row and column drops and a column extension
+def squash_history(field):
+    field.add_origin(make_frame(30), 'o')
+    field.add_arrow(field.tree.origins['o'], 'w')
+    arrow = field.arrow('w')
+    for i in range(8):
+        data = arrow.proxy()
+        data.loc[data.index[i], 'a'] = 1000.0 + i
+        arrow.put(data)
+        if i == 2:
+            arrow.drop(data.loc[[17]])
+        if i == 3:
+            index = arrow.proxy().index
+            arrow.extend(pandas.Series(numpy.arange(len(index)), index=index, name='d'), axis=1)
+        if i == 5:
+            arrow.drop(arrow.proxy()[['b']], axis=1)
+        arrow.commit()
+
+    return arrow
+
+# data of every node of arrow 'w' by full replay, before squashing
+def replay_timeline(field) -> tuple:
+    timeline = list(field.tree.outline(field.arrow('w').head))
+    frames = []
+    for node_id in timeline:
+        field.add_arrow(node_id, 'at')
+        field.cache.clear()
+        frames.append(field.arrow('at').proxy())
+        field.remove_arrow('at')
+
+    return timeline, frames
+
+def check_timeline(field, timeline: list, frames: list):
+    for node_id, expected in zip(timeline, frames):
+        field.add_arrow(node_id, 'at')
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(field.arrow('at').proxy(), expected)
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(
+            field.arrow('at', columns=['a']).proxy(), expected[['a']])
+        field.cache.clear()
+        pandas.testing.assert_frame_equal(
+            field.arrow('at', rows=(5, 20)).proxy(), expected.loc[5:20])
+        assert field.verify(node_id)
+        field.remove_arrow('at')
+
+def test_squash_matches_full_replay(field):
+    squash_history(field)
+    timeline, frames = replay_timeline(field)
+    field.squash('w', timeline[2], timeline[7])
+    check_timeline(field, timeline, frames)
+    field.squash('w')
+    check_timeline(field, timeline, frames)
+
+def test_rebase_and_gc(field):
+    squash_history(field)
+    timeline, frames = replay_timeline(field)
+    field.squash('w', timeline[1], timeline[6])
+    field.add_arrow(timeline[4], 'mid')
+    node_id = field.rebase('w', 'o2')
+    assert field.tree.arrow_head('w') == node_id
+
+    # squashed and unsquashed nodes after 'mid' are garbage now
+    field.gc(grace=0)
+    check_timeline(field, timeline[:5], frames[:5])
+    field.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('w').proxy(), frames[-1])
+    assert field.verify(node_id)
+    assert timeline[-1] not in field.tree.nodes
+
+    arrow = field.arrow('w')
+    data = arrow.proxy()
+    data.loc[data.index[0], 'a'] = -5.0
+    arrow.put(data)
+    arrow.commit()
+    assert arrow.head.lineage == [node_id]
+    field.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('w').proxy(), arrow.proxy())
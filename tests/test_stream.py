@@ -0,0 +1,54 @@
+import os
+import fastparquet
+import pandas
+import pytest
+import numpy
+import deltaflow
+from deltaflow.errors import DuplicateLabelError
+from conftest import make_frame
+
+def test_stream_equals_add_origin(field, options, tmp_path):
+    options['row_group_size'] = 64
+    data = make_frame(1000)
+    field.add_origin(data, 'full')
+
+    os.mkdir(str(tmp_path / 'other'))
+    deltaflow.touch(str(tmp_path / 'other'))
+    other = deltaflow.Field(str(tmp_path / 'other'))
+    other.add_origin_stream((data.iloc[lo:lo + 70] for lo in range(0, 1000, 70)), 'full')
+    assert other.tree.origins['full'] == field.tree.origins['full']
+    pandas.testing.assert_frame_equal(other.arrow('.full').proxy(), data)
+
+def test_stream_parquet_row_groups(field, tmp_path):
+    data = make_frame(300)
+    path = str(tmp_path / 'data.parquet')
+    fastparquet.write(path, data, row_group_offsets=64)
+    assert len(fastparquet.ParquetFile(path).row_groups) > 1
+
+    field.add_origin_stream(path, 'pq')
+    field.tree.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('.pq').proxy(), data)
+
+def test_stream_parquet_range_start(field, tmp_path):
+    data = make_frame(300).set_axis(pandas.RangeIndex(10, 310), axis=0)
+    path = str(tmp_path / 'data.parquet')
+    fastparquet.write(path, data, row_group_offsets=64)
+
+    field.add_origin_stream(path, 'pq')
+    field.tree.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('.pq').proxy(), data)
+
+def test_stream_restarting_range_index(field):
+    data = make_frame(200)
+    chunks = [data.iloc[:100], data.iloc[100:].reset_index(drop=True)]
+    field.add_origin_stream(iter(chunks), 'restart')
+    field.tree.cache.clear()
+    pandas.testing.assert_frame_equal(field.arrow('.restart').proxy(), data)
+
+def test_stream_duplicate_labels(field):
+    data = make_frame(200).set_axis(pandas.Index(numpy.arange(0, 400, 2)), axis=0)
+    chunks = [data.iloc[:100], data.iloc[90:]]
+    with pytest.raises(DuplicateLabelError):
+        field.add_origin_stream(iter(chunks), 'dup')
+    assert 'dup' not in field.tree.origins
+    assert not os.path.exists(os.path.join(field.path, 'dup.origin'))